@@ -1,7 +1,8 @@
 import os
 import pandas as pd
 import psycopg2
-from sqlalchemy import create_engine
+from conexion_db import DB_HOST, DB_PORT, obtener_engine
+from lector_csv import detectar_formato_archivo
 import glob
 import requests
 import logging
@@ -113,17 +114,16 @@ def descargar_csv(url, directorio_destino, nombre_archivo=None):
         logger.error(f"Error al descargar el archivo: {str(e)}")
         raise
 
-def conectar_postgresql(host, database, user, password, port=5432):
-    """Crea una conexión a PostgreSQL usando SQLAlchemy"""
+def conectar_postgresql(database=None):
+    """Obtiene el engine compartido (con pool) de conexion_db.py y prueba la conexión"""
     logger = logging.getLogger()
     
     try:
-        conn_string = f"postgresql://{user}:{password}@{host}:{port}/{database}"
-        engine = create_engine(conn_string)
+        engine = obtener_engine(database)
         # Probar la conexión
         with engine.connect() as conn:
             pass
-        logger.info(f"Conexión exitosa a PostgreSQL: {host}:{port}/{database}")
+        logger.info(f"Conexión exitosa a PostgreSQL: {DB_HOST}:{DB_PORT}/{engine.url.database}")
         return engine
     except Exception as e:
         logger.error(f"Error al conectar a PostgreSQL: {str(e)}")
@@ -174,40 +174,6 @@ def limpiar_tabla_existente(engine, nombre_tabla, schema=None):
         logger.error(f"Error al limpiar tabla {tabla_completa}: {str(e)}")
         raise
 
-def detectar_delimitador(ruta_archivo):
-    """
-    Detecta el delimitador más probable en un archivo CSV
-    
-    Args:
-        ruta_archivo: Ruta al archivo CSV
-        
-    Returns:
-        El delimitador detectado
-    """
-    logger = logging.getLogger()
-    
-    try:
-        # Leer las primeras líneas para detectar el delimitador
-        with open(ruta_archivo, 'r', encoding='utf-8', errors='ignore') as f:
-            primer_linea = f.readline().strip()
-        
-        # Comprobar posibles delimitadores
-        posibles_delimitadores = [',', ';', '|', '\t']
-        delimitador = ','  # Por defecto
-        max_campos = 0
-        
-        for delim in posibles_delimitadores:
-            campos = primer_linea.split(delim)
-            if len(campos) > max_campos:
-                max_campos = len(campos)
-                delimitador = delim
-        
-        logger.info(f"Delimitador detectado: '{delimitador}' (genera {max_campos} campos)")
-        return delimitador
-    except Exception as e:
-        logger.warning(f"Error al detectar delimitador: {str(e)}. Usando ',' por defecto.")
-        return ','
-
 def procesar_csv(ruta_archivo, engine, schema=None, nombre_tabla=None):
     """
     Procesa un archivo CSV y lo carga en PostgreSQL
@@ -228,44 +194,38 @@ def procesar_csv(ruta_archivo, engine, schema=None, nombre_tabla=None):
         logger.info(f"Procesando archivo: {ruta_archivo}")
         logger.info(f"Se usará el nombre de tabla: {nombre_tabla}")
         
-        # Detectar el delimitador
-        delimitador = detectar_delimitador(ruta_archivo)
+        # Detectar encoding y delimitador leyendo solo el inicio del archivo
+        try:
+            encoding, delimitador = detectar_formato_archivo(ruta_archivo)
+            logger.info(f"Formato detectado: delimitador '{delimitador}', encoding {encoding}")
+        except Exception as e:
+            logger.warning(f"Error al detectar el formato: {str(e)}. Usando ',' y utf-8 por defecto.")
+            encoding, delimitador = 'utf-8', ','
         
-        # Intentar leer el CSV con el delimitador detectado
+        # Leer el CSV una sola vez con el parser C
         try:
             # Informar al usuario que estamos leyendo el archivo
             logger.info(f"Leyendo el archivo CSV con delimitador '{delimitador}'...")
             
-            # Intentar primera lectura con configuración estándar
             df = pd.read_csv(
                 ruta_archivo, 
                 sep=delimitador,
+                encoding=encoding,
                 quotechar='"',
                 escapechar='\\',
                 on_bad_lines='skip',
                 low_memory=False
             )
             
-            # Si hay pocas columnas, intentar con otra configuración
-            if len(df.columns) <= 1 and delimitador == ',':
-                logger.warning("Detectadas pocas columnas, probando lectura alternativa...")
-                df = pd.read_csv(
-                    ruta_archivo,
-                    sep=None,  # Intentar detectar automáticamente
-                    engine='python',
-                    quotechar='"',
-                    on_bad_lines='skip'
-                )
-            
             logger.info(f"CSV leído exitosamente con {len(df.columns)} columnas y {len(df)} filas")
             logger.info(f"Columnas detectadas: {', '.join(df.columns.tolist())}")
             
         except Exception as e:
             logger.error(f"Error al leer CSV con configuración automática: {str(e)}")
-            logger.info("Intentando abrir el archivo como un archivo delimitado por comas simple...")
+            logger.info("Intentando abrir el archivo con encoding latin1...")
             
             # Intento con encoding alternativo
-            df = pd.read_csv(ruta_archivo, sep=';', encoding='latin1', on_bad_lines='skip')
+            df = pd.read_csv(ruta_archivo, sep=delimitador, encoding='latin1', on_bad_lines='skip')
             logger.info(f"CSV leído con configuración alternativa: {len(df.columns)} columnas y {len(df)} filas")
         
         # Limpiar la tabla existente antes de cargar los nuevos datos
@@ -358,14 +318,7 @@ def main():
     logger = setup_logging()
     
     try:
-        # Configuración de la conexión a PostgreSQL
-        config = {
-            'host': 'localhost',
-            'database': 'postgres',
-            'user': 'postgres',
-            'password': 'Dggies12345',
-            'port': 5432
-        }
+        # La conexión a PostgreSQL se configura en conexion_db.py (variables REACTIVOS_DB_*)
         
         # URL del CSV a descargar
         csv_url = "https://www.contrataciones.gov.py/t/download/SieDocumento/10"
@@ -384,7 +337,7 @@ def main():
         logger.info("=== Iniciando proceso de importación de datos ===")
         
         # Crear conexión a PostgreSQL
-        engine = conectar_postgresql(**config)
+        engine = conectar_postgresql()
         
         # Descargar CSV desde la URL
         ruta_csv = descargar_csv(csv_url, directorio_descargas, nombre_archivo_csv)
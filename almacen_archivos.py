@@ -0,0 +1,94 @@
+import hashlib
+import zlib
+from sqlalchemy import text
+
+try:
+    import zstandard
+except ImportError:  # zstandard es opcional; sin él se usa zlib
+    zstandard = None
+
+# Tabla donde se guarda una sola copia de cada archivo cargado
+TABLA_BLOBS = "reactivos_py.archivos_blob"
+
+# Tipos MIME para la descarga según la extensión del archivo original
+TIPOS_MIME = {
+    '.xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    '.xls': "application/vnd.ms-excel",
+    '.csv': "text/csv"
+}
+
+
+def calcular_sha256(contenido):
+    """Devuelve el SHA-256 en hexadecimal del contenido de un archivo"""
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def comprimir(contenido):
+    """Comprime el contenido con zstd si está disponible, si no con zlib"""
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(contenido), 'zstd'
+    return zlib.compress(contenido, 6), 'zlib'
+
+
+def descomprimir(datos, compresion):
+    """Recupera los bytes originales de un blob"""
+    datos = bytes(datos)
+    if compresion == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("El archivo está comprimido con zstd y el paquete 'zstandard' no está instalado")
+        return zstandard.ZstdDecompressor().decompress(datos)
+    if compresion == 'zlib':
+        return zlib.decompress(datos)
+    return datos
+
+
+def guardar_blob(conn, contenido, sha256=None):
+    """
+    Guarda el contenido en la tabla de blobs si todavía no existe
+
+    Si el mismo archivo ya se cargó antes, no se vuelve a comprimir ni a guardar.
+
+    Returns:
+        str: SHA-256 del contenido, que es la clave del blob
+    """
+    sha256 = sha256 or calcular_sha256(contenido)
+
+    existe = conn.execute(
+        text(f"SELECT 1 FROM {TABLA_BLOBS} WHERE sha256 = :sha256"),
+        {'sha256': sha256}
+    ).scalar()
+
+    if not existe:
+        datos, compresion = comprimir(contenido)
+        conn.execute(text(f"""
+            INSERT INTO {TABLA_BLOBS} (sha256, tamano, compresion, contenido)
+            VALUES (:sha256, :tamano, :compresion, :contenido)
+            ON CONFLICT (sha256) DO NOTHING
+        """), {
+            'sha256': sha256,
+            'tamano': len(contenido),
+            'compresion': compresion,
+            'contenido': datos
+        })
+
+    return sha256
+
+
+def leer_blob(conn, sha256):
+    """Devuelve los bytes originales de un blob, o None si no existe"""
+    row = conn.execute(
+        text(f"SELECT compresion, contenido FROM {TABLA_BLOBS} WHERE sha256 = :sha256"),
+        {'sha256': sha256}
+    ).fetchone()
+
+    if not row:
+        return None
+    return descomprimir(row[1], row[0])
+
+
+def tipo_mime(nombre_archivo):
+    """Tipo MIME para descargar un archivo según su extensión"""
+    for extension, mime in TIPOS_MIME.items():
+        if nombre_archivo.lower().endswith(extension):
+            return mime
+    return "application/octet-stream"
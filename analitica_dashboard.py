@@ -0,0 +1,169 @@
+import pandas as pd
+from sqlalchemy import text
+
+# Tablas de ejecución de cada licitación que alimentan el dashboard
+TABLAS_EJECUCION = ('ejecucion_general', 'ejecucion_por_zonas')
+
+# Columnas necesarias y sus nombres posibles: los esquemas cargados con el formato
+# original usan espacios y los cargados con el cargador nuevo usan guiones bajos
+COLUMNAS_EJECUCION = {
+    'maxima': ["REDISTRIBUCION (CANTIDAD MAXIMA)", "REDISTRIBUCION_CANTIDAD_MAXIMA"],
+    'emitida': ["CANTIDAD EMITIDA", "CANTIDAD_EMITIDA"],
+    'saldo': ["SALDO A EMITIR", "SALDO_A_EMITIR"],
+    'precio': ["PRECIO UNITARIO", "PRECIO_UNITARIO"],
+    'servicio': ["SERVICIO BENEFICIARIO", "SERVICIO_BENEFICIARIO"],
+}
+
+# Tipos de columna que se pueden castear a numeric sin riesgo
+TIPOS_NUMERICOS = {'numeric', 'integer', 'bigint', 'smallint', 'double precision', 'real'}
+
+# Formatos de número aceptados en columnas de texto (mismas reglas que parsear_decimal):
+# coma decimal con puntos de miles ("1.234,56"), solo puntos de miles ("1.234") y punto decimal ("1234.5")
+PATRON_COMA_DECIMAL = r'^[-+]?[0-9]+([.][0-9]{3})*,[0-9]+$'
+PATRON_MILES = r'^[-+]?[0-9]{1,3}([.][0-9]{3})+$'
+PATRON_PUNTO_DECIMAL = r'^[-+]?[0-9]+([.][0-9]+)?$'
+
+
+def _identificador(nombre):
+    """Cita un nombre de esquema, tabla o columna para usarlo en SQL"""
+    return '"' + nombre.replace('"', '""') + '"'
+
+
+def columnas_por_tabla(conn):
+    """
+    Columnas existentes de las tablas de ejecución de todos los esquemas, en una sola consulta
+
+    Returns:
+        dict: (esquema, tabla) -> {nombre de columna: data_type}
+    """
+    result = conn.execute(text("""
+        SELECT table_schema, table_name, column_name, data_type
+        FROM information_schema.columns
+        WHERE table_name = ANY(:tablas)
+        AND table_schema <> 'reactivos_py'
+    """), {'tablas': list(TABLAS_EJECUCION)})
+
+    columnas = {}
+    for esquema, tabla, columna, tipo in result:
+        columnas.setdefault((esquema, tabla), {})[columna] = tipo
+    return columnas
+
+
+def _columna(disponibles, campo):
+    """Nombre de la columna de un campo lógico que tiene la tabla, o None"""
+    for nombre in COLUMNAS_EJECUCION[campo]:
+        if nombre in disponibles:
+            return nombre
+    return None
+
+
+def _expresion(disponibles, campo):
+    """Expresión SQL para un campo lógico, o NULL si la tabla no tiene ninguna de sus columnas"""
+    nombre = _columna(disponibles, campo)
+    return _identificador(nombre) if nombre else "NULL"
+
+
+def _numero(disponibles, campo):
+    """
+    Expresión numeric para un campo lógico
+
+    Las columnas numéricas se castean directamente. Las de texto (esquemas antiguos
+    cargados con to_sql) solo se convierten si el valor tiene un formato de número
+    reconocido; '-', '' y cualquier otro texto quedan en NULL en lugar de hacer
+    fallar la consulta.
+    """
+    nombre = _columna(disponibles, campo)
+    if nombre is None:
+        return "NULL::numeric"
+    columna = _identificador(nombre)
+    if disponibles[nombre] in TIPOS_NUMERICOS:
+        return f"{columna}::numeric"
+
+    limpio = f"regexp_replace({columna}::text, '[[:space:]%]|Gs[.]?', '', 'g')"
+    return f"""(CASE
+        WHEN {limpio} ~ '{PATRON_COMA_DECIMAL}' THEN replace(replace({limpio}, '.', ''), ',', '.')::numeric
+        WHEN {limpio} ~ '{PATRON_MILES}' THEN replace({limpio}, '.', '')::numeric
+        WHEN {limpio} ~ '{PATRON_PUNTO_DECIMAL}' THEN ({limpio})::numeric
+    END)"""
+
+
+def sql_ejecucion(columnas):
+    """
+    Arma un único UNION ALL con los totales de ejecución de todos los esquemas
+
+    Las filas de ejecucion_general salen con nivel 'licitacion' (totales de la licitación);
+    las de ejecucion_por_zonas salen con nivel 'servicio', agrupadas por servicio beneficiario.
+
+    Returns:
+        tuple: (sql, parámetros), o (None, {}) si no hay tablas de ejecución
+    """
+    partes = []
+    parametros = {}
+
+    for i, ((esquema, tabla), disponibles) in enumerate(sorted(columnas.items())):
+        maxima = _numero(disponibles, 'maxima')
+        emitida = _numero(disponibles, 'emitida')
+        saldo = _numero(disponibles, 'saldo')
+        precio = _numero(disponibles, 'precio')
+
+        if tabla == 'ejecucion_general':
+            nivel = 'licitacion'
+            servicio = "NULL::text"
+            agrupar = ""
+        else:
+            servicio = _expresion(disponibles, 'servicio')
+            if servicio == "NULL":
+                continue
+            nivel = 'servicio'
+            servicio = f"{servicio}::text"
+            agrupar = "GROUP BY 3"
+
+        parametros[f'e{i}'] = esquema
+        partes.append(f"""
+            SELECT '{nivel}' AS nivel,
+                   CAST(:e{i} AS text) AS esquema,
+                   {servicio} AS servicio,
+                   SUM({maxima}) AS cantidad_maxima,
+                   SUM({emitida}) AS cantidad_emitida,
+                   SUM({saldo}) AS saldo,
+                   SUM({emitida} * {precio}) AS monto_emitido
+            FROM {_identificador(esquema)}.{_identificador(tabla)}
+            {agrupar}
+        """)
+
+    if not partes:
+        return None, {}
+    return "\nUNION ALL\n".join(partes), parametros
+
+
+def _agregar_porcentaje(df):
+    """Calcula el porcentaje emitido a partir de las cantidades"""
+    for columna in ('cantidad_maxima', 'cantidad_emitida', 'saldo', 'monto_emitido'):
+        df[columna] = pd.to_numeric(df[columna], errors='coerce').fillna(0).astype('float64')
+    maxima = df['cantidad_maxima'].where(df['cantidad_maxima'] != 0)
+    df['porcentaje_emitido'] = (df['cantidad_emitida'] / maxima * 100).fillna(0).round(2)
+    return df
+
+
+def consultar_ejecucion(conn):
+    """
+    Totales de ejecución por licitación y por servicio beneficiario de todos los esquemas
+
+    Returns:
+        tuple: (DataFrame por licitación, DataFrame por licitación y servicio)
+    """
+    columnas_salida = ['nivel', 'esquema', 'servicio', 'cantidad_maxima', 'cantidad_emitida', 'saldo', 'monto_emitido']
+    sql, parametros = sql_ejecucion(columnas_por_tabla(conn))
+
+    if sql:
+        df = pd.read_sql(text(sql), conn, params=parametros)
+    else:
+        df = pd.DataFrame(columns=columnas_salida)
+
+    por_licitacion = _agregar_porcentaje(
+        df[df['nivel'] == 'licitacion'].drop(columns=['nivel', 'servicio']).reset_index(drop=True)
+    )
+    por_servicio = _agregar_porcentaje(
+        df[df['nivel'] == 'servicio'].drop(columns='nivel').reset_index(drop=True)
+    )
+    return por_licitacion, por_servicio
@@ -0,0 +1,296 @@
+import argparse
+import atexit
+import gzip
+import os
+import queue
+import re
+import threading
+import time
+from datetime import date
+from sqlalchemy import text
+from carga_masiva import copiar_a_archivo
+
+# Eventos que se insertan como máximo en cada lote
+AUDITORIA_LOTE = int(os.environ.get("REACTIVOS_AUDITORIA_LOTE", "200"))
+
+# Milisegundos máximos que un evento espera en la cola antes de escribirse
+AUDITORIA_INTERVALO_MS = int(os.environ.get("REACTIVOS_AUDITORIA_INTERVALO_MS", "500"))
+
+# Eventos que puede acumular la cola; si se llena el evento se escribe directamente
+AUDITORIA_CAPACIDAD = int(os.environ.get("REACTIVOS_AUDITORIA_CAPACIDAD", "10000"))
+
+# Con 1 cada registro espera a quedar guardado en la base antes de continuar
+AUDITORIA_DURABLE = os.environ.get("REACTIVOS_AUDITORIA_DURABLE", "0") == "1"
+
+# Segundos que un registro durable espera su confirmación
+ESPERA_DURABLE = 10
+
+COLUMNAS_AUDITORIA = [
+    'usuario_id', 'usuario_nombre', 'accion', 'modulo', 'descripcion', 'detalles',
+    'esquema_afectado', 'registro_afectado_id', 'valores_anteriores', 'valores_nuevos', 'fecha_hora'
+]
+
+SQL_INSERTAR_AUDITORIA = text(f"""
+    INSERT INTO reactivos_py.auditoria ({', '.join(COLUMNAS_AUDITORIA)})
+    VALUES ({', '.join(':' + c for c in COLUMNAS_AUDITORIA)})
+""")
+
+# Conteo acumulado de eventos por usuario y módulo (estadísticas del historial)
+SQL_ACUMULAR_RESUMEN = text("""
+    INSERT INTO reactivos_py.auditoria_resumen (usuario_nombre, modulo, total)
+    VALUES (:usuario_nombre, :modulo, :total)
+    ON CONFLICT (usuario_nombre, modulo) DO UPDATE
+    SET total = auditoria_resumen.total + EXCLUDED.total
+""")
+
+# Descuenta del resumen los eventos de una partición que se archiva ({particion} es su nombre)
+SQL_DESCONTAR_RESUMEN = """
+    WITH archivados AS (
+        SELECT usuario_nombre, modulo, COUNT(*) AS total
+        FROM reactivos_py.{particion}
+        GROUP BY usuario_nombre, modulo
+    )
+    UPDATE reactivos_py.auditoria_resumen AS r
+    SET total = r.total - a.total
+    FROM archivados AS a
+    WHERE r.usuario_nombre = a.usuario_nombre AND r.modulo = a.modulo
+"""
+
+# Meses hacia adelante para los que se crean particiones por anticipado
+MESES_PARTICIONES_ADELANTE = 2
+
+# Nombre de las particiones mensuales: auditoria_AAAA_MM
+PATRON_PARTICION = re.compile(r'^auditoria_(\d{4})_(\d{2})$')
+
+# Marca que detiene el hilo escritor
+_FIN = object()
+
+
+class EscritorAuditoria:
+    """
+    Escribe los eventos de auditoría en segundo plano, en lotes
+
+    Los eventos se encolan y un hilo los inserta cada AUDITORIA_LOTE eventos o cada
+    AUDITORIA_INTERVALO_MS milisegundos, lo que ocurra primero. Al terminar el
+    proceso se escriben los eventos pendientes.
+    """
+
+    def __init__(self, engine, tamano_lote=AUDITORIA_LOTE, intervalo_ms=AUDITORIA_INTERVALO_MS,
+                 capacidad=AUDITORIA_CAPACIDAD, durable=AUDITORIA_DURABLE):
+        self.engine = engine
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo_ms / 1000
+        self.durable = durable
+        self.cola = queue.Queue(maxsize=capacidad)
+        self.escritos = 0
+        self.perdidos = 0
+        self._detenido = False
+        # Protege _detenido junto con el encolado: tras detener() nada entra a la cola
+        self._bloqueo = threading.Lock()
+        self._hilo = threading.Thread(target=self._bucle, name="escritor-auditoria", daemon=True)
+        self._hilo.start()
+        atexit.register(self.detener)
+
+    def registrar(self, evento, durable=False):
+        """
+        Encola un evento (dict con las columnas de COLUMNAS_AUDITORIA)
+
+        Con durable=True (o si el escritor es durable) espera a que el lote del evento
+        se haya guardado y devuelve si se guardó.
+        """
+        confirmacion = threading.Event() if (durable or self.durable) else None
+        with self._bloqueo:
+            encolado = False
+            if not self._detenido:
+                try:
+                    self.cola.put_nowait((evento, confirmacion))
+                    encolado = True
+                except queue.Full:
+                    pass
+
+        if not encolado:
+            # Escritor detenido o cola llena: escribir en el hilo actual antes que perder el evento
+            return self._escribir([evento])
+
+        if confirmacion is None:
+            return True
+        return confirmacion.wait(ESPERA_DURABLE) and evento.get('_guardado', False)
+
+    def _bucle(self):
+        """Junta eventos de la cola y los escribe por lotes"""
+        while True:
+            primero = self.cola.get()
+            if primero is _FIN:
+                self.cola.task_done()
+                return
+
+            lote = [primero]
+            terminar = False
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.tamano_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    siguiente = self.cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if siguiente is _FIN:
+                    self.cola.task_done()
+                    terminar = True
+                    break
+                lote.append(siguiente)
+
+            guardado = self._escribir([evento for evento, _ in lote])
+            for evento, confirmacion in lote:
+                if confirmacion is not None:
+                    evento['_guardado'] = guardado
+                    confirmacion.set()
+                self.cola.task_done()
+
+            if terminar:
+                return
+
+    def _escribir(self, eventos):
+        """Inserta un lote de eventos y actualiza el resumen por usuario y módulo en una sola transacción"""
+        filas = [{c: evento.get(c) for c in COLUMNAS_AUDITORIA} for evento in eventos]
+
+        totales = {}
+        for fila in filas:
+            clave = (fila['usuario_nombre'], fila['modulo'])
+            totales[clave] = totales.get(clave, 0) + 1
+        resumen = [
+            {'usuario_nombre': usuario, 'modulo': modulo, 'total': total}
+            for (usuario, modulo), total in sorted(totales.items())
+        ]
+
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(SQL_INSERTAR_AUDITORIA, filas)
+                conn.execute(SQL_ACUMULAR_RESUMEN, resumen)
+            self.escritos += len(filas)
+            return True
+        except Exception as e:
+            self.perdidos += len(filas)
+            print(f"Error registrando {len(filas)} eventos de auditoría: {e}")
+            return False
+
+    def vaciar(self):
+        """Espera a que se escriban todos los eventos encolados"""
+        self.cola.join()
+
+    def detener(self):
+        """Escribe los eventos pendientes y detiene el hilo"""
+        with self._bloqueo:
+            if self._detenido:
+                return
+            self._detenido = True
+            self.cola.put(_FIN)
+        self._hilo.join(timeout=ESPERA_DURABLE)
+
+    def estadisticas(self):
+        """Eventos pendientes, escritos y perdidos desde que arrancó el escritor"""
+        return {
+            'pendientes': self.cola.qsize(),
+            'escritos': self.escritos,
+            'perdidos': self.perdidos
+        }
+
+
+def _sumar_meses(anio, mes, meses):
+    """(año, mes) desplazado la cantidad de meses indicada"""
+    total = anio * 12 + (mes - 1) + meses
+    return total // 12, total % 12 + 1
+
+
+def crear_particion_mes(conn, anio, mes):
+    """Crea (si no existe) la partición de auditoría de un mes"""
+    anio_siguiente, mes_siguiente = _sumar_meses(anio, mes, 1)
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS reactivos_py.auditoria_{anio:04d}_{mes:02d}
+        PARTITION OF reactivos_py.auditoria
+        FOR VALUES FROM ('{anio:04d}-{mes:02d}-01') TO ('{anio_siguiente:04d}-{mes_siguiente:02d}-01')
+    """))
+
+
+def asegurar_particiones(conn, meses_adelante=MESES_PARTICIONES_ADELANTE):
+    """Crea las particiones del mes actual y de los próximos meses"""
+    hoy = date.today()
+    for desplazamiento in range(meses_adelante + 1):
+        crear_particion_mes(conn, *_sumar_meses(hoy.year, hoy.month, desplazamiento))
+
+
+def particiones_mensuales(conn):
+    """
+    Particiones mensuales existentes de la auditoría, de la más antigua a la más nueva
+
+    Returns:
+        list: (nombre, año, mes)
+    """
+    result = conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'reactivos_py.auditoria'::regclass
+    """))
+    particiones = []
+    for (nombre,) in result:
+        coincidencia = PATRON_PARTICION.match(nombre)
+        if coincidencia:
+            particiones.append((nombre, int(coincidencia.group(1)), int(coincidencia.group(2))))
+    return sorted(particiones, key=lambda p: (p[1], p[2]))
+
+
+def archivar_particiones(conn, meses_retencion, directorio):
+    """
+    Separa y archiva las particiones de auditoría más viejas que meses_retencion
+
+    Cada partición se exporta con COPY a un CSV comprimido (auditoria_AAAA_MM.csv.gz)
+    en el directorio indicado, sus eventos se descuentan de auditoria_resumen, y se
+    separa de la tabla y se elimina. Cada partición se procesa en su propia transacción.
+
+    Returns:
+        list: Rutas de los archivos generados
+    """
+    hoy = date.today()
+    anio_limite, mes_limite = _sumar_meses(hoy.year, hoy.month, -meses_retencion)
+    os.makedirs(directorio, exist_ok=True)
+
+    particiones = particiones_mensuales(conn)
+    conn.commit()
+
+    archivos = []
+    for nombre, anio, mes in particiones:
+        if (anio, mes) >= (anio_limite, mes_limite):
+            break
+
+        ruta = os.path.join(directorio, f"{nombre}.csv.gz")
+        with conn.begin():
+            with gzip.open(ruta, 'wb') as archivo:
+                copiar_a_archivo(
+                    conn, f"COPY reactivos_py.{nombre} TO STDOUT WITH (FORMAT csv, HEADER)", archivo
+                )
+            conn.execute(text(SQL_DESCONTAR_RESUMEN.format(particion=nombre)))
+            conn.execute(text("DELETE FROM reactivos_py.auditoria_resumen WHERE total <= 0"))
+            conn.execute(text(f"ALTER TABLE reactivos_py.auditoria DETACH PARTITION reactivos_py.{nombre}"))
+            conn.execute(text(f"DROP TABLE reactivos_py.{nombre}"))
+        archivos.append(ruta)
+        print(f"Partición {nombre} archivada en {ruta}")
+
+    return archivos
+
+
+if __name__ == "__main__":
+    from conexion_db import obtener_engine
+
+    parser = argparse.ArgumentParser(description="Mantenimiento de las particiones de auditoría")
+    parser.add_argument("--meses-retencion", type=int, default=12,
+                        help="Meses que se conservan en la base (por defecto 12)")
+    parser.add_argument("--directorio", default="archivo_auditoria",
+                        help="Carpeta donde se guardan las particiones archivadas")
+    argumentos = parser.parse_args()
+
+    with obtener_engine().connect() as conn:
+        with conn.begin():
+            asegurar_particiones(conn)
+        archivar_particiones(conn, argumentos.meses_retencion, argumentos.directorio)
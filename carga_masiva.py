@@ -0,0 +1,236 @@
+import io
+import time
+import pandas as pd
+from sqlalchemy import text
+
+# Cantidad de filas que se envían en cada sentencia COPY
+FILAS_POR_COPY = 50000
+
+
+def normalizar_nombre_columna(nombre):
+    """Convierte un encabezado de Excel al nombre de columna usado en las tablas del esquema"""
+    # 'DESCRIPCION DEL PRODUCTO // MARCA // PROCEDENCIA' -> 'DESCRIPCION_DEL_PRODUCTO_MARCA_PROCEDENCIA'
+    texto = str(nombre).strip()
+    partes = []
+    actual = ''
+    for caracter in texto:
+        if caracter.isalnum():
+            actual += caracter
+        elif actual:
+            partes.append(actual)
+            actual = ''
+    if actual:
+        partes.append(actual)
+    return '_'.join(partes)
+
+
+def _sentencia_copy(esquema, tabla, columnas):
+    """Arma la sentencia COPY ... FROM STDIN para una tabla"""
+    lista_columnas = ', '.join(f'"{c}"' for c in columnas)
+    return f'COPY "{esquema}"."{tabla}" ({lista_columnas}) FROM STDIN WITH (FORMAT csv)'
+
+
+def _ejecutar_copy(conn, sentencia, buffer):
+    """Envía un buffer CSV al servidor usando el cursor de la conexión DBAPI subyacente"""
+    cursor = conn.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            # psycopg2
+            cursor.copy_expert(sentencia, buffer)
+        else:
+            # psycopg 3
+            with cursor.copy(sentencia) as copy:
+                while True:
+                    bloque = buffer.read(1024 * 1024)
+                    if not bloque:
+                        break
+                    copy.write(bloque)
+    finally:
+        cursor.close()
+
+
+def copiar_a_archivo(conn, sentencia, archivo):
+    """Ejecuta un COPY ... TO STDOUT y escribe el resultado en un archivo binario abierto"""
+    cursor = conn.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            # psycopg2
+            cursor.copy_expert(sentencia, archivo)
+        else:
+            # psycopg 3
+            with cursor.copy(sentencia) as copy:
+                for bloque in copy:
+                    archivo.write(bloque)
+    finally:
+        cursor.close()
+
+
+def copiar_dataframe(conn, df, esquema, tabla):
+    """
+    Carga un DataFrame en una tabla existente usando COPY ... FROM STDIN
+
+    La carga se hace sobre la misma conexión, por lo que participa de la
+    transacción que esté abierta en ese momento.
+
+    Returns:
+        int: Cantidad de filas copiadas
+    """
+    columnas = list(df.columns)
+    sentencia = _sentencia_copy(esquema, tabla, columnas)
+
+    for inicio in range(0, len(df), FILAS_POR_COPY):
+        buffer = io.StringIO()
+        df.iloc[inicio:inicio + FILAS_POR_COPY].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        _ejecutar_copy(conn, sentencia, buffer)
+
+    return len(df)
+
+
+def cargar_dataframe(conn, df, esquema, tabla):
+    """
+    Carga un DataFrame en una tabla con COPY y, si falla, con INSERT multi-fila
+
+    Returns:
+        dict: Métricas de la carga (tabla, filas, segundos, filas_por_segundo, metodo)
+    """
+    df = df.rename(columns=normalizar_nombre_columna)
+    inicio = time.perf_counter()
+    metodo = 'COPY'
+
+    # El COPY se ejecuta dentro de un savepoint para poder reintentar sin perder la transacción
+    savepoint = conn.begin_nested()
+    try:
+        copiar_dataframe(conn, df, esquema, tabla)
+        savepoint.commit()
+    except Exception as e:
+        savepoint.rollback()
+        print(f"COPY falló para {esquema}.{tabla}, usando INSERT multi-fila: {e}")
+        metodo = 'INSERT'
+        df.to_sql(tabla, conn, schema=esquema, if_exists='append', index=False,
+                  method='multi', chunksize=1000)
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'tabla': tabla,
+        'filas': len(df),
+        'segundos': round(segundos, 3),
+        'filas_por_segundo': round(len(df) / segundos) if segundos > 0 else len(df),
+        'metodo': metodo
+    }
+
+
+def cargar_archivo_csv(conn, ruta, columnas, filas, esquema, tabla):
+    """
+    Carga un archivo CSV (sin encabezado) con `filas` registros en una tabla con COPY y,
+    si falla, con INSERT multi-fila
+
+    Returns:
+        dict: Métricas de la carga, con el mismo formato que cargar_dataframe
+    """
+    inicio = time.perf_counter()
+    metodo = 'COPY'
+
+    if columnas and filas:
+        savepoint = conn.begin_nested()
+        try:
+            with open(ruta, 'r', encoding='utf-8', newline='') as archivo:
+                _ejecutar_copy(conn, _sentencia_copy(esquema, tabla, columnas), archivo)
+            savepoint.commit()
+        except Exception as e:
+            savepoint.rollback()
+            print(f"COPY falló para {esquema}.{tabla}, usando INSERT multi-fila: {e}")
+            metodo = 'INSERT'
+            for lote in pd.read_csv(ruta, header=None, names=columnas, dtype=str,
+                                    keep_default_na=False, chunksize=FILAS_POR_COPY):
+                lote = lote.replace('', None)
+                lote.to_sql(tabla, conn, schema=esquema, if_exists='append', index=False,
+                            method='multi', chunksize=1000)
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'tabla': tabla,
+        'filas': filas,
+        'segundos': round(segundos, 3),
+        'filas_por_segundo': round(filas / segundos) if segundos > 0 else filas,
+        'metodo': metodo
+    }
+
+
+def _expresiones_clave(claves):
+    """Expresiones de la clave natural; los nulos se comparan como texto vacío"""
+    return [f"(COALESCE(\"{c}\"::text, ''))" for c in claves]
+
+
+def _nombre_indice_clave(tabla):
+    """Nombre del índice único de la clave natural de una tabla"""
+    return f"uq_{tabla}_clave_natural"
+
+
+def crear_indice_clave(conn, esquema, tabla, claves):
+    """Crea (si no existe) el índice único sobre la clave natural que usa ON CONFLICT"""
+    conn.execute(text(f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS "{_nombre_indice_clave(tabla)}"
+        ON "{esquema}"."{tabla}" ({', '.join(_expresiones_clave(claves))})
+    """))
+
+
+def eliminar_indice_clave(conn, esquema, tabla):
+    """
+    Elimina (si existe) el índice único de la clave natural
+
+    Solo hace falta durante la fusión; si quedara, las cargas en modo agregar con
+    claves ya existentes fallarían por violación de unicidad.
+    """
+    conn.execute(text(f'DROP INDEX IF EXISTS "{esquema}"."{_nombre_indice_clave(tabla)}"'))
+
+
+def fusionar_tabla(conn, esquema_origen, tabla_origen, esquema, tabla, columnas, claves):
+    """
+    Aplica las filas de una tabla de staging sobre la tabla destino con INSERT ... ON CONFLICT
+
+    Las filas nuevas se insertan, las existentes se actualizan solo si algún valor
+    cambió y el resto no se toca. Si el staging trae la misma clave repetida se
+    usa la última fila cargada.
+
+    Returns:
+        dict: Cantidad de filas insertadas, actualizadas y sin cambios
+    """
+    lista_columnas = ', '.join(f'"{c}"' for c in columnas)
+    lista_claves = ', '.join(f'"{c}"' for c in claves)
+    no_claves = [c for c in columnas if c not in claves]
+    conflicto = ', '.join(_expresiones_clave(claves))
+
+    if no_claves:
+        asignaciones = ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in no_claves)
+        destino = ', '.join(f'destino."{c}"' for c in no_claves)
+        excluidos = ', '.join(f'EXCLUDED."{c}"' for c in no_claves)
+        accion = f"DO UPDATE SET {asignaciones} WHERE ROW({destino}) IS DISTINCT FROM ROW({excluidos})"
+    else:
+        accion = "DO NOTHING"
+
+    resultado = conn.execute(text(f"""
+        WITH origen AS (
+            SELECT DISTINCT ON ({lista_claves}) {lista_columnas}
+            FROM "{esquema_origen}"."{tabla_origen}"
+            ORDER BY {lista_claves}, ctid DESC
+        ),
+        aplicadas AS (
+            INSERT INTO "{esquema}"."{tabla}" AS destino ({lista_columnas})
+            SELECT {lista_columnas} FROM origen
+            ON CONFLICT ({conflicto}) {accion}
+            RETURNING (xmax = 0) AS insertada
+        )
+        SELECT
+            (SELECT COUNT(*) FROM origen),
+            COUNT(*) FILTER (WHERE insertada),
+            COUNT(*) FILTER (WHERE NOT insertada)
+        FROM aplicadas
+    """)).fetchone()
+
+    total, insertadas, actualizadas = resultado
+    return {
+        'insertadas': insertadas,
+        'actualizadas': actualizadas,
+        'sin_cambios': total - insertadas - actualizadas
+    }
@@ -7,22 +7,66 @@ import os
 import io
 import json
 import hashlib
+import re
+from decimal import Decimal
 import openpyxl
-from sqlalchemy import create_engine, text
-
-# Configuración de conexión a PostgreSQL
-DB_HOST = "localhost"
-DB_PORT = "5432"
-DB_NAME = "postgres"
-DB_USER = "postgres"
-DB_PASSWORD = "Dggies12345"
+from sqlalchemy import text
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import uuid
+import gzip
+import tempfile
+from conexion_db import estadisticas_pool, obtener_engine
+from carga_masiva import (
+    cargar_archivo_csv, copiar_a_archivo, copiar_dataframe, crear_indice_clave, eliminar_indice_clave, fusionar_tabla
+)
+from esquema_tablas import CLAVES_NATURALES, sql_crear_tabla
+from almacen_archivos import calcular_sha256, guardar_blob, leer_blob, tipo_mime
+from lector_excel import abrir_libro_excel, parsear_hoja_a_csv
+from analitica_dashboard import consultar_ejecucion
+from auditoria import EscritorAuditoria, asegurar_particiones, crear_particion_mes
+from lector_csv import leer_csv
+from pdf_ordenes import generar_zip_ordenes, nombre_archivo_pdf, renderizar_orden_pdf, reportlab_disponible
 
 # Intervalo de actualización automática (en minutos)
 INTERVALO_ACTUALIZACION = 10
 
-# Crear conexión a PostgreSQL
+# Esquema donde se crean las tablas temporales de staging durante la carga de archivos
+ESQUEMA_STAGING = "reactivos_py"
+
+# Procesos usados para leer las hojas del Excel en paralelo
+PROCESOS_LECTURA = min(4, os.cpu_count() or 1)
+
+# Método informado para las hojas que no cambiaron desde la última carga
+HOJA_SIN_CAMBIOS = "SIN CAMBIOS"
+
+# Modos de carga sobre tablas existentes: agregar todas las filas o actualizar por clave natural
+MODO_AGREGAR = "agregar"
+MODO_ACTUALIZAR = "actualizar"
+
+# Segundos que las consultas de catálogos (esquemas, proveedores, etc.) permanecen en caché
+TTL_CACHE_CONSULTAS = 300
+
+# Segundos que se reutilizan los totales de ejecución del dashboard
+TTL_CACHE_EJECUCION = 600
+
+# Órdenes de compra por página en el listado
+TAMANO_PAGINA_ORDENES = 50
+
+# Detalles de órdenes de compra que se mantienen en caché
+MAX_DETALLES_ORDEN_CACHE = 200
+
+# Órdenes como máximo por ZIP de PDFs (se generan en memoria)
+MAX_ORDENES_PDF_LOTE = 500
+
+# Actividades por página en el historial
+TAMANO_PAGINA_HISTORIAL = 100
+
+# Números de orden con el formato automático: NNN/AAAA-LL/MM o NNN/AAAA-MM
+PATRON_NUMERO_OC = re.compile(r'^(\d+)/(\d{4})-(?:[^/]+/)?(\d{1,2})$')
+
+# Conexión a PostgreSQL: el engine y su pool se crean una sola vez por proceso (conexion_db.py)
 try:
-    engine = create_engine(f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+    engine = obtener_engine()
 except Exception as e:
     print(f"Error al crear conexión a PostgreSQL: {e}")
 
@@ -126,6 +170,7 @@ def configurar_tabla_usuarios():
                 conn.execute(query, {'password': password_hash})
                 print("Usuario admin creado")
                 
+            conn.commit()
             return True
     except Exception as e:
         print(f"Error configurando tabla de usuarios: {e}")
@@ -154,11 +199,235 @@ def configurar_tabla_cargas():
                     FOREIGN KEY (usuario_id) REFERENCES reactivos_py.usuarios(id)
                 );
             """))
+            conn.commit()
             return True
     except Exception as e:
         print(f"Error configurando tabla de archivos: {e}")
         return False
 
+# Función para configurar el almacén de archivos originales
+def configurar_tabla_blobs():
+    """Crea la tabla de blobs (una copia comprimida por archivo, clave SHA-256) y migra el contenido antiguo"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS reactivos_py.archivos_blob (
+                    sha256 VARCHAR(64) PRIMARY KEY,
+                    tamano BIGINT NOT NULL,
+                    compresion VARCHAR(10) NOT NULL,
+                    contenido BYTEA NOT NULL,
+                    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """))
+            
+            # El contenido ya va comprimido: que PostgreSQL lo guarde fuera de línea sin recomprimir
+            conn.execute(text("""
+                ALTER TABLE reactivos_py.archivos_blob
+                ALTER COLUMN contenido SET STORAGE EXTERNAL;
+            """))
+            
+            conn.execute(text("""
+                ALTER TABLE reactivos_py.archivos_cargados
+                ADD COLUMN IF NOT EXISTS sha256 VARCHAR(64) REFERENCES reactivos_py.archivos_blob(sha256);
+            """))
+            conn.commit()
+            
+            # Pasar al almacén los archivos guardados como texto en contenido_original.
+            # Cada archivo va en su propio savepoint: uno que falle queda como estaba
+            # (se sigue descargando desde contenido_original) y no frena a los demás
+            rechazados = []
+            ultimo_id = 0
+            while True:
+                pendientes = conn.execute(text("""
+                    SELECT id, nombre_archivo, contenido_original
+                    FROM reactivos_py.archivos_cargados
+                    WHERE sha256 IS NULL AND contenido_original IS NOT NULL
+                    AND id > :ultimo_id
+                    ORDER BY id
+                    LIMIT 20
+                """), {'ultimo_id': ultimo_id}).fetchall()
+                
+                if not pendientes:
+                    break
+                
+                for archivo_id, nombre_archivo, contenido in pendientes:
+                    ultimo_id = archivo_id
+                    try:
+                        with conn.begin_nested():
+                            # Los Excel se guardaban decodificados en latin1; los CSV como texto
+                            if nombre_archivo.lower().endswith(('.xlsx', '.xls')):
+                                contenido_bytes = contenido.encode('latin1')
+                            else:
+                                contenido_bytes = contenido.encode('utf-8')
+                            
+                            sha256 = guardar_blob(conn, contenido_bytes)
+                            conn.execute(text("""
+                                UPDATE reactivos_py.archivos_cargados
+                                SET sha256 = :sha256, contenido_original = NULL
+                                WHERE id = :id
+                            """), {'sha256': sha256, 'id': archivo_id})
+                    except Exception as e:
+                        rechazados.append((archivo_id, nombre_archivo, str(e)))
+                conn.commit()
+            
+            for archivo_id, nombre_archivo, error in rechazados:
+                print(f"No se pudo migrar el archivo {archivo_id} ({nombre_archivo}) al almacén de blobs: {error}")
+            if rechazados:
+                print(f"{len(rechazados)} archivos quedaron sin migrar; se siguen sirviendo desde contenido_original")
+            
+            return True
+    except Exception as e:
+        print(f"Error configurando tabla de blobs: {e}")
+        return False
+
+# Función para configurar las huellas de las hojas cargadas
+def configurar_tabla_huellas():
+    """Crea la tabla con la huella de la última versión cargada de cada hoja por esquema"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS reactivos_py.huellas_carga (
+                    esquema VARCHAR(100) NOT NULL,
+                    hoja VARCHAR(100) NOT NULL,
+                    huella VARCHAR(64) NOT NULL,
+                    filas INTEGER,
+                    fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (esquema, hoja)
+                );
+            """))
+            
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_archivos_cargados_esquema_sha256
+                ON reactivos_py.archivos_cargados (esquema, sha256);
+            """))
+            conn.commit()
+            return True
+    except Exception as e:
+        print(f"Error configurando tabla de huellas: {e}")
+        return False
+
+# Función para configurar el catálogo central de licitaciones
+def configurar_tabla_catalogo():
+    """Crea el catálogo de IDs de todas las licitaciones (con índice trigram) y lo llena si está vacío"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS reactivos_py.catalogo_licitaciones (
+                    esquema VARCHAR(100) NOT NULL,
+                    i_d VARCHAR(50) NOT NULL,
+                    nombre_llamado TEXT,
+                    empresa_adjudicada TEXT,
+                    numero_llamado VARCHAR(50),
+                    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (esquema, i_d)
+                );
+            """))
+            
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_catalogo_licitaciones_i_d
+                ON reactivos_py.catalogo_licitaciones (i_d);
+            """))
+            conn.commit()
+            
+            # El índice trigram acelera los ILIKE '%...%'; requiere la extensión pg_trgm
+            try:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_catalogo_licitaciones_i_d_trgm
+                    ON reactivos_py.catalogo_licitaciones USING gin (i_d gin_trgm_ops);
+                """))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"No se pudo crear el índice trigram del catálogo: {e}")
+            
+            # Llenar el catálogo con las licitaciones cargadas antes de que existiera
+            vacio = conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM reactivos_py.catalogo_licitaciones)")).scalar()
+            if vacio:
+                result = conn.execute(text("""
+                    SELECT table_schema
+                    FROM information_schema.tables
+                    WHERE table_name = 'llamado' AND table_schema <> 'reactivos_py'
+                """))
+                refrescar_catalogo_esquemas(conn, [row[0] for row in result])
+                conn.commit()
+            
+            return True
+    except Exception as e:
+        print(f"Error configurando catálogo de licitaciones: {e}")
+        return False
+
+def refrescar_catalogo_licitacion(conn, esquema):
+    """Reemplaza las entradas del catálogo de un esquema con el contenido actual de su tabla llamado"""
+    conn.execute(text("""
+        DELETE FROM reactivos_py.catalogo_licitaciones
+        WHERE esquema = :esquema
+    """), {'esquema': esquema})
+    
+    # Las tablas antiguas tienen columnas con espacios y las nuevas con guión bajo
+    conn.execute(text(f"""
+        INSERT INTO reactivos_py.catalogo_licitaciones
+        (esquema, i_d, nombre_llamado, empresa_adjudicada, numero_llamado,
+         anio_llamado, fecha_firma_contrato, numero_contrato, vigencia_contrato)
+        SELECT DISTINCT ON (datos->>'I_D')
+            :esquema,
+            datos->>'I_D',
+            COALESCE(datos->>'NOMBRE_DEL_LLAMADO', datos->>'NOMBRE DEL LLAMADO'),
+            COALESCE(datos->>'EMPRESA_ADJUDICADA', datos->>'EMPRESA ADJUDICADA'),
+            COALESCE(datos->>'NUMERO_DE_LLAMADO', datos->>'NUMERO DE LLAMADO'),
+            COALESCE(datos->>'AÑO_DEL_LLAMADO', datos->>'AÑO DEL LLAMADO'),
+            CASE WHEN COALESCE(datos->>'FECHA_FIRMA_CONTRATO', datos->>'FECHA DE FIRMA DEL CONTRATO') ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}'
+                 THEN LEFT(COALESCE(datos->>'FECHA_FIRMA_CONTRATO', datos->>'FECHA DE FIRMA DEL CONTRATO'), 10)::date
+            END,
+            COALESCE(datos->>'NUMERO_CONTRATO', datos->>'N° de Contrato / Año'),
+            COALESCE(datos->>'VIGENCIA_CONTRATO', datos->>'Vigencia del Contrato')
+        FROM (SELECT to_jsonb(l) AS datos FROM "{esquema}"."llamado" l) llamados
+        WHERE datos->>'I_D' IS NOT NULL AND datos->>'I_D' <> ''
+    """), {'esquema': esquema})
+
+def refrescar_catalogo_esquemas(conn, esquemas):
+    """
+    Refresca el catálogo de varios esquemas, cada uno en su propio savepoint
+    
+    Un esquema con la tabla llamado dañada no frena a los demás: se informa y se
+    deja como estaba en el catálogo.
+    
+    Returns:
+        list: (esquema, error) de los esquemas que no se pudieron refrescar
+    """
+    fallidos = []
+    for esquema in esquemas:
+        try:
+            with conn.begin_nested():
+                refrescar_catalogo_licitacion(conn, esquema)
+        except Exception as e:
+            fallidos.append((esquema, str(e)))
+            print(f"No se pudo refrescar el catálogo del esquema {esquema}: {e}")
+    return fallidos
+
+def configurar_catalogo_contratos():
+    """Agrega al catálogo los datos del contrato que muestra el detalle de las órdenes y los completa"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("""
+                ALTER TABLE reactivos_py.catalogo_licitaciones
+                ADD COLUMN IF NOT EXISTS anio_llamado VARCHAR(10),
+                ADD COLUMN IF NOT EXISTS fecha_firma_contrato DATE,
+                ADD COLUMN IF NOT EXISTS numero_contrato VARCHAR(100),
+                ADD COLUMN IF NOT EXISTS vigencia_contrato TEXT
+            """))
+            
+            result = conn.execute(text("""
+                SELECT DISTINCT esquema FROM reactivos_py.catalogo_licitaciones
+            """))
+            refrescar_catalogo_esquemas(conn, [row[0] for row in result])
+            
+            conn.commit()
+            return True
+    except Exception as e:
+        print(f"Error agregando datos de contrato al catálogo: {e}")
+        return False
+
 # Crear tabla para almacenar órdenes de compra
 def configurar_tabla_ordenes_compra():
     """Crea la tabla de órdenes de compra si no existe"""
@@ -202,11 +471,162 @@ def configurar_tabla_ordenes_compra():
                 );
             """))
             
+            conn.commit()
             return True
     except Exception as e:
         print(f"Error configurando tablas de órdenes de compra: {e}")
         return False
 
+# Función para configurar los contadores de números de orden
+def configurar_tabla_contadores_oc():
+    """Crea los contadores de órdenes por (esquema, año, mes) partiendo del mayor número ya emitido"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS reactivos_py.contadores_orden_compra (
+                    esquema VARCHAR(100) NOT NULL,
+                    anio INTEGER NOT NULL,
+                    mes INTEGER NOT NULL,
+                    ultimo_numero INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (esquema, anio, mes)
+                );
+            """))
+            
+            conn.execute(text("""
+                INSERT INTO reactivos_py.contadores_orden_compra (esquema, anio, mes, ultimo_numero)
+                SELECT esquema,
+                       EXTRACT(YEAR FROM fecha_emision)::int,
+                       EXTRACT(MONTH FROM fecha_emision)::int,
+                       MAX(CAST(SUBSTRING(numero_orden FROM '^\\d+') AS INTEGER))
+                FROM reactivos_py.ordenes_compra
+                GROUP BY 1, 2, 3
+                HAVING MAX(CAST(SUBSTRING(numero_orden FROM '^\\d+') AS INTEGER)) IS NOT NULL
+                ON CONFLICT (esquema, anio, mes) DO NOTHING
+            """))
+            
+            conn.commit()
+            return True
+    except Exception as e:
+        print(f"Error configurando contadores de órdenes de compra: {e}")
+        return False
+
+# Función para configurar el resumen de órdenes del dashboard
+def configurar_tabla_resumen_ordenes():
+    """Crea el resumen de órdenes por esquema, servicio, mes y estado, y lo llena con el historial"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS reactivos_py.resumen_ordenes (
+                    esquema VARCHAR(100) NOT NULL,
+                    servicio_beneficiario VARCHAR(200) NOT NULL DEFAULT '',
+                    anio INTEGER NOT NULL,
+                    mes INTEGER NOT NULL,
+                    estado VARCHAR(50) NOT NULL,
+                    cantidad_ordenes INTEGER NOT NULL DEFAULT 0,
+                    monto_total NUMERIC(18, 2) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (esquema, servicio_beneficiario, anio, mes, estado)
+                );
+            """))
+            
+            # Cargar el historial existente solo si la tabla está vacía
+            vacia = conn.execute(text(
+                "SELECT NOT EXISTS (SELECT 1 FROM reactivos_py.resumen_ordenes)"
+            )).scalar()
+            
+            if vacia:
+                conn.execute(text("""
+                    INSERT INTO reactivos_py.resumen_ordenes
+                    (esquema, servicio_beneficiario, anio, mes, estado, cantidad_ordenes, monto_total)
+                    SELECT oc.esquema,
+                           COALESCE(oc.servicio_beneficiario, ''),
+                           EXTRACT(YEAR FROM oc.fecha_emision)::int,
+                           EXTRACT(MONTH FROM oc.fecha_emision)::int,
+                           oc.estado,
+                           COUNT(*),
+                           COALESCE(SUM(i.monto), 0)
+                    FROM reactivos_py.ordenes_compra oc
+                    LEFT JOIN (
+                        SELECT orden_compra_id, SUM(monto_total) AS monto
+                        FROM reactivos_py.items_orden_compra
+                        GROUP BY orden_compra_id
+                    ) i ON i.orden_compra_id = oc.id
+                    GROUP BY 1, 2, 3, 4, 5
+                """))
+            
+            conn.commit()
+            return True
+    except Exception as e:
+        print(f"Error configurando resumen de órdenes: {e}")
+        return False
+
+# Función para crear los índices del listado de órdenes de compra
+def configurar_indices_ordenes_compra():
+    """Crea los índices que usan el listado paginado de órdenes y sus filtros"""
+    try:
+        with engine.connect() as conn:
+            # La paginación recorre (fecha_creacion, id): no puede haber fechas nulas
+            conn.execute(text("""
+                UPDATE reactivos_py.ordenes_compra
+                SET fecha_creacion = fecha_emision
+                WHERE fecha_creacion IS NULL
+            """))
+            conn.execute(text("""
+                ALTER TABLE reactivos_py.ordenes_compra
+                ALTER COLUMN fecha_creacion SET NOT NULL
+            """))
+            
+            indices = [
+                # Ítems de una orden (totales del listado y detalle)
+                "CREATE INDEX IF NOT EXISTS idx_items_orden_compra_orden ON reactivos_py.items_orden_compra (orden_compra_id)",
+                # Página sin filtros
+                "CREATE INDEX IF NOT EXISTS idx_ordenes_compra_pagina ON reactivos_py.ordenes_compra (fecha_creacion DESC, id DESC)",
+                # Filtro por licitación (y servicio dentro de la licitación)
+                "CREATE INDEX IF NOT EXISTS idx_ordenes_compra_esquema_pagina ON reactivos_py.ordenes_compra (esquema, fecha_creacion DESC, id DESC)",
+                # Filtro por estado
+                "CREATE INDEX IF NOT EXISTS idx_ordenes_compra_estado_pagina ON reactivos_py.ordenes_compra (estado, fecha_creacion DESC, id DESC)",
+                # Filtro por rango de fechas de emisión
+                "CREATE INDEX IF NOT EXISTS idx_ordenes_compra_fecha_emision ON reactivos_py.ordenes_compra (fecha_emision)"
+            ]
+            for indice in indices:
+                conn.execute(text(indice))
+            
+            conn.commit()
+            return True
+    except Exception as e:
+        print(f"Error creando índices de órdenes de compra: {e}")
+        return False
+
+# Función para configurar el libro de movimientos de saldo
+def configurar_tabla_movimientos_saldo():
+    """Crea el libro (solo inserción) de movimientos de saldo por lote/ítem/servicio"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS reactivos_py.movimientos_saldo (
+                    id BIGSERIAL PRIMARY KEY,
+                    esquema VARCHAR(100) NOT NULL,
+                    lote VARCHAR(50) NOT NULL,
+                    item VARCHAR(50) NOT NULL,
+                    servicio_beneficiario VARCHAR(200) NOT NULL,
+                    cantidad NUMERIC(15, 2) NOT NULL,
+                    emitida_anterior NUMERIC(15, 2),
+                    orden_compra_id INTEGER REFERENCES reactivos_py.ordenes_compra(id),
+                    usuario_id INTEGER,
+                    fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """))
+            
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_movimientos_saldo_clave
+                ON reactivos_py.movimientos_saldo (esquema, lote, item, servicio_beneficiario);
+            """))
+            
+            conn.commit()
+            return True
+    except Exception as e:
+        print(f"Error configurando libro de saldos: {e}")
+        return False
+
 def configurar_tabla_proveedores():
     """Crea la tabla de proveedores si no existe"""
     try:
@@ -231,6 +651,7 @@ def configurar_tabla_proveedores():
                 );
             """))
             
+            conn.commit()
             return True
     except Exception as e:
         print(f"Error configurando tabla de proveedores: {e}")
@@ -271,79 +692,309 @@ def configurar_tabla_auditoria():
                CREATE INDEX IF NOT EXISTS idx_auditoria_accion ON reactivos_py.auditoria(accion);
            """))
            
+           conn.commit()
            return True
    except Exception as e:
        print(f"Error configurando tabla de auditoría: {e}")
        return False
 
+# Función para convertir la auditoría en una tabla particionada por mes
+def configurar_auditoria_particionada():
+    """
+    Reemplaza reactivos_py.auditoria por una tabla particionada por mes de fecha_hora
+    
+    Los registros existentes se copian a sus particiones mensuales. Los índices
+    (BRIN sobre la fecha y compuestos para los filtros del historial) se definen
+    en la tabla principal y los heredan todas las particiones.
+    """
+    try:
+        with engine.connect() as conn:
+            particionada = conn.execute(text("""
+                SELECT c.relkind = 'p'
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = 'reactivos_py' AND c.relname = 'auditoria'
+            """)).scalar()
+            
+            if not particionada:
+                conn.execute(text("ALTER TABLE reactivos_py.auditoria RENAME TO auditoria_anterior"))
+                conn.execute(text("""
+                    ALTER TABLE reactivos_py.auditoria_anterior
+                    RENAME CONSTRAINT auditoria_pkey TO auditoria_anterior_pkey
+                """))
+                
+                conn.execute(text("""
+                    CREATE TABLE reactivos_py.auditoria (
+                        id BIGSERIAL,
+                        usuario_id INTEGER NOT NULL REFERENCES reactivos_py.usuarios(id),
+                        usuario_nombre VARCHAR(100) NOT NULL,
+                        accion VARCHAR(100) NOT NULL,
+                        modulo VARCHAR(50) NOT NULL,
+                        descripcion TEXT NOT NULL,
+                        detalles JSONB,
+                        ip_address VARCHAR(45),
+                        user_agent TEXT,
+                        fecha_hora TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                        esquema_afectado VARCHAR(100),
+                        registro_afectado_id INTEGER,
+                        valores_anteriores JSONB,
+                        valores_nuevos JSONB,
+                        PRIMARY KEY (id, fecha_hora)
+                    ) PARTITION BY RANGE (fecha_hora)
+                """))
+                
+                # Las fechas fuera de las particiones mensuales caen en la partición por defecto
+                conn.execute(text("""
+                    CREATE TABLE reactivos_py.auditoria_default
+                    PARTITION OF reactivos_py.auditoria DEFAULT
+                """))
+                
+                # Una partición por cada mes con registros
+                meses = conn.execute(text("""
+                    SELECT DISTINCT EXTRACT(YEAR FROM fecha_hora)::int, EXTRACT(MONTH FROM fecha_hora)::int
+                    FROM reactivos_py.auditoria_anterior
+                    WHERE fecha_hora IS NOT NULL
+                """)).fetchall()
+                for anio, mes in meses:
+                    crear_particion_mes(conn, anio, mes)
+                asegurar_particiones(conn)
+                
+                conn.execute(text("""
+                    INSERT INTO reactivos_py.auditoria
+                    (id, usuario_id, usuario_nombre, accion, modulo, descripcion, detalles, ip_address,
+                     user_agent, fecha_hora, esquema_afectado, registro_afectado_id,
+                     valores_anteriores, valores_nuevos)
+                    SELECT id, usuario_id, usuario_nombre, accion, modulo, descripcion, detalles, ip_address,
+                           user_agent, COALESCE(fecha_hora, CURRENT_TIMESTAMP), esquema_afectado,
+                           registro_afectado_id, valores_anteriores, valores_nuevos
+                    FROM reactivos_py.auditoria_anterior
+                """))
+                conn.execute(text("""
+                    SELECT setval(pg_get_serial_sequence('reactivos_py.auditoria', 'id'),
+                                  COALESCE((SELECT MAX(id) FROM reactivos_py.auditoria), 0) + 1, false)
+                """))
+                
+                conn.execute(text("DROP TABLE reactivos_py.auditoria_anterior"))
+            
+            indices = [
+                # Rango de fechas: BRIN, muy chico porque los registros llegan en orden de fecha
+                "CREATE INDEX IF NOT EXISTS idx_auditoria_fecha_brin ON reactivos_py.auditoria USING brin (fecha_hora)",
+                # Orden del historial sin filtros
+                "CREATE INDEX IF NOT EXISTS idx_auditoria_fecha_id ON reactivos_py.auditoria (fecha_hora DESC, id DESC)",
+                # Filtros del historial, ordenados por fecha
+                "CREATE INDEX IF NOT EXISTS idx_auditoria_usuario_fecha ON reactivos_py.auditoria (usuario_id, fecha_hora DESC)",
+                "CREATE INDEX IF NOT EXISTS idx_auditoria_modulo_fecha ON reactivos_py.auditoria (modulo, fecha_hora DESC)",
+                "CREATE INDEX IF NOT EXISTS idx_auditoria_accion_fecha ON reactivos_py.auditoria (accion, fecha_hora DESC)"
+            ]
+            for indice in indices:
+                conn.execute(text(indice))
+            
+            conn.commit()
+            return True
+    except Exception as e:
+        print(f"Error particionando tabla de auditoría: {e}")
+        return False
+
+# Función para configurar el resumen de actividades por usuario y módulo
+def configurar_tabla_auditoria_resumen():
+    """Crea el conteo de actividades por usuario y módulo que mantiene el escritor de auditoría"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS reactivos_py.auditoria_resumen (
+                    usuario_nombre VARCHAR(100) NOT NULL,
+                    modulo VARCHAR(50) NOT NULL,
+                    total BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (usuario_nombre, modulo)
+                );
+            """))
+            
+            # Partir de los registros existentes
+            conn.execute(text("""
+                INSERT INTO reactivos_py.auditoria_resumen (usuario_nombre, modulo, total)
+                SELECT usuario_nombre, modulo, COUNT(*)
+                FROM reactivos_py.auditoria
+                GROUP BY usuario_nombre, modulo
+                ON CONFLICT (usuario_nombre, modulo) DO NOTHING
+            """))
+            
+            conn.commit()
+            return True
+    except Exception as e:
+        print(f"Error configurando resumen de auditoría: {e}")
+        return False
+
+# Migraciones del esquema reactivos_py, en orden: (versión, descripción, funciones de configuración)
+MIGRACIONES = [
+    (1, "Tablas base", [
+        configurar_tabla_usuarios,
+        configurar_tabla_ordenes_compra,
+        configurar_tabla_cargas,
+        configurar_tabla_proveedores,
+        configurar_tabla_auditoria
+    ]),
+    (2, "Almacén de archivos originales por SHA-256", [configurar_tabla_blobs]),
+    (3, "Huellas de hojas cargadas", [configurar_tabla_huellas]),
+    (4, "Catálogo central de licitaciones", [configurar_tabla_catalogo]),
+    (5, "Contadores de números de orden de compra", [configurar_tabla_contadores_oc]),
+    (6, "Libro de movimientos de saldo", [configurar_tabla_movimientos_saldo]),
+    (7, "Resumen de órdenes para el dashboard", [configurar_tabla_resumen_ordenes]),
+    (8, "Índices del listado de órdenes de compra", [configurar_indices_ordenes_compra]),
+    (9, "Datos de contrato en el catálogo de licitaciones", [configurar_catalogo_contratos]),
+    (10, "Auditoría particionada por mes", [configurar_auditoria_particionada]),
+    (11, "Resumen de actividades por usuario y módulo", [configurar_tabla_auditoria_resumen]),
+]
+
+# Clave del advisory lock que serializa las migraciones entre procesos
+LOCK_MIGRACIONES = 728301
+
+@st.cache_resource(show_spinner=False)
+def aplicar_migraciones():
+    """
+    Aplica una sola vez por proceso las migraciones pendientes y devuelve la versión del esquema
+    
+    La versión aplicada se guarda en reactivos_py.version_esquema; un advisory lock
+    evita que dos procesos apliquen las mismas migraciones a la vez. Si una
+    migración falla se lanza una excepción (que no queda en caché) para
+    reintentar en la próxima ejecución.
+    """
+    with engine.connect() as conn:
+        conn.execute(text("CREATE SCHEMA IF NOT EXISTS reactivos_py"))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS reactivos_py.version_esquema (
+                version INTEGER PRIMARY KEY,
+                descripcion TEXT,
+                fecha_aplicacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        conn.commit()
+        
+        conn.execute(text("SELECT pg_advisory_lock(:clave)"), {'clave': LOCK_MIGRACIONES})
+        try:
+            version_actual = conn.execute(text(
+                "SELECT COALESCE(MAX(version), 0) FROM reactivos_py.version_esquema"
+            )).scalar()
+            conn.commit()
+            
+            for version, descripcion, funciones in MIGRACIONES:
+                if version <= version_actual:
+                    continue
+                
+                for funcion in funciones:
+                    if not funcion():
+                        raise Exception(f"Falló la migración {version} ({descripcion}) en {funcion.__name__}")
+                
+                conn.execute(text("""
+                    INSERT INTO reactivos_py.version_esquema (version, descripcion)
+                    VALUES (:version, :descripcion)
+                """), {'version': version, 'descripcion': descripcion})
+                conn.commit()
+                version_actual = version
+                print(f"Migración {version} aplicada: {descripcion}")
+            
+            return version_actual
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:clave)"), {'clave': LOCK_MIGRACIONES})
+            conn.commit()
+
+@st.cache_resource(ttl=24 * 3600, show_spinner=False)
+def mantener_particiones_auditoria():
+    """Crea las particiones de auditoría del mes actual y los próximos (una vez por día y proceso)"""
+    with engine.begin() as conn:
+        asegurar_particiones(conn)
+    return datetime.now()
+
+@st.cache_resource(show_spinner=False)
+def obtener_escritor_auditoria():
+    """Escritor de auditoría en segundo plano, uno por proceso"""
+    return EscritorAuditoria(engine)
+
 def registrar_actividad(accion, modulo, descripcion, detalles=None, esquema_afectado=None, 
-                      registro_afectado_id=None, valores_anteriores=None, valores_nuevos=None):
-   """Registra una actividad en el sistema de auditoría"""
+                      registro_afectado_id=None, valores_anteriores=None, valores_nuevos=None, durable=False):
+   """
+   Registra una actividad en el sistema de auditoría
+   
+   El evento se encola y se guarda en segundo plano junto con otros; con durable=True
+   se espera a que quede guardado.
+   """
    try:
        if 'user_id' not in st.session_state or 'user_name' not in st.session_state:
            return False
-           
-       with engine.connect() as conn:
-           query = text("""
-               INSERT INTO reactivos_py.auditoria 
-               (usuario_id, usuario_nombre, accion, modulo, descripcion, detalles, 
-                esquema_afectado, registro_afectado_id, valores_anteriores, valores_nuevos)
-               VALUES (:usuario_id, :usuario_nombre, :accion, :modulo, :descripcion, :detalles,
-                       :esquema_afectado, :registro_afectado_id, :valores_anteriores, :valores_nuevos)
-           """)
-           
-           conn.execute(query, {
-               'usuario_id': st.session_state.user_id,
-               'usuario_nombre': st.session_state.user_name,
-               'accion': accion,
-               'modulo': modulo,
-               'descripcion': descripcion,
-               'detalles': json.dumps(detalles) if detalles else None,
-               'esquema_afectado': esquema_afectado,
-               'registro_afectado_id': registro_afectado_id,
-               'valores_anteriores': json.dumps(valores_anteriores) if valores_anteriores else None,
-               'valores_nuevos': json.dumps(valores_nuevos) if valores_nuevos else None
-           })
-           
-           return True
+       
+       return obtener_escritor_auditoria().registrar({
+           'usuario_id': st.session_state.user_id,
+           'usuario_nombre': st.session_state.user_name,
+           'accion': accion,
+           'modulo': modulo,
+           'descripcion': descripcion,
+           'detalles': json.dumps(detalles) if detalles else None,
+           'esquema_afectado': esquema_afectado,
+           'registro_afectado_id': registro_afectado_id,
+           'valores_anteriores': json.dumps(valores_anteriores) if valores_anteriores else None,
+           'valores_nuevos': json.dumps(valores_nuevos) if valores_nuevos else None,
+           'fecha_hora': datetime.now()
+       }, durable=durable)
    except Exception as e:
        print(f"Error registrando actividad en auditoría: {e}")
        return False
 
-def obtener_historial_actividades(limite=100, usuario_id=None, modulo=None, accion=None, fecha_desde=None, fecha_hasta=None):
-    """Obtiene el historial de actividades con filtros opcionales"""
+def filtros_historial_sql(usuario_id=None, modulo=None, accion=None, fecha_desde=None, fecha_hasta=None):
+    """
+    Condiciones SQL (sobre el alias a) y parámetros de los filtros del historial de actividades
+    
+    Returns:
+        tuple: (texto con las condiciones ' AND ...', parámetros)
+    """
+    condiciones = ""
+    params = {}
+    
+    if usuario_id:
+        condiciones += " AND a.usuario_id = :usuario_id"
+        params['usuario_id'] = usuario_id
+    
+    if modulo:
+        condiciones += " AND a.modulo = :modulo"
+        params['modulo'] = modulo
+    
+    if accion:
+        condiciones += " AND a.accion = :accion"
+        params['accion'] = accion
+    
+    if fecha_desde:
+        condiciones += " AND a.fecha_hora >= :fecha_desde"
+        params['fecha_desde'] = fecha_desde
+    
+    if fecha_hasta:
+        condiciones += " AND a.fecha_hora < :fecha_hasta"
+        params['fecha_hasta'] = fecha_hasta + timedelta(days=1)
+    
+    return condiciones, params
+
+def obtener_historial_actividades(limite=TAMANO_PAGINA_HISTORIAL, usuario_id=None, modulo=None, accion=None,
+                                  fecha_desde=None, fecha_hasta=None, despues_de=None):
+    """
+    Obtiene una página del historial de actividades con filtros opcionales, de la más reciente a la más antigua
+    
+    La paginación es por clave (fecha_hora, id): para la página siguiente se pasa en
+    despues_de la clave de la última actividad recibida. Los campos JSON no se leen
+    aquí; se obtienen con obtener_detalle_actividad para la actividad seleccionada.
+    """
     try:
         with engine.connect() as conn:
-            query_base = """
+            filtros_sql, params = filtros_historial_sql(usuario_id, modulo, accion, fecha_desde, fecha_hasta)
+            query_base = f"""
                 SELECT a.id, a.usuario_nombre, a.accion, a.modulo, a.descripcion, 
-                       a.fecha_hora, a.esquema_afectado, a.detalles,
-                       a.valores_anteriores, a.valores_nuevos
+                       a.fecha_hora, a.esquema_afectado
                 FROM reactivos_py.auditoria a
-                WHERE 1=1
+                WHERE 1=1 {filtros_sql}
             """
-            params = {}
-            
-            if usuario_id:
-                query_base += " AND a.usuario_id = :usuario_id"
-                params['usuario_id'] = usuario_id
-            
-            if modulo:
-                query_base += " AND a.modulo = :modulo"
-                params['modulo'] = modulo
-            
-            if accion:
-                query_base += " AND a.accion = :accion"
-                params['accion'] = accion
             
-            if fecha_desde:
-                query_base += " AND a.fecha_hora >= :fecha_desde"
-                params['fecha_desde'] = fecha_desde
-            
-            if fecha_hasta:
-                query_base += " AND a.fecha_hora <= :fecha_hasta"
-                params['fecha_hasta'] = fecha_hasta
+            if despues_de:
+                query_base += " AND (a.fecha_hora, a.id) < (:cursor_fecha, :cursor_id)"
+                params['cursor_fecha'], params['cursor_id'] = despues_de
             
-            query_base += " ORDER BY a.fecha_hora DESC LIMIT :limite"
+            query_base += " ORDER BY a.fecha_hora DESC, a.id DESC LIMIT :limite"
             params['limite'] = limite
             
             query = text(query_base)
@@ -358,10 +1009,7 @@ def obtener_historial_actividades(limite=100, usuario_id=None, modulo=None, acci
                     'modulo': row[3],
                     'descripcion': row[4],
                     'fecha_hora': row[5],
-                    'esquema_afectado': row[6],
-                    'detalles': json.loads(row[7]) if row[7] else None,
-                    'valores_anteriores': json.loads(row[8]) if row[8] else None,
-                    'valores_nuevos': json.loads(row[9]) if row[9] else None
+                    'esquema_afectado': row[6]
                 })
             
             return actividades
@@ -369,6 +1017,89 @@ def obtener_historial_actividades(limite=100, usuario_id=None, modulo=None, acci
         st.error(f"Error obteniendo historial de actividades: {e}")
         return []
 
+def exportar_historial_csv_gz(usuario_id=None, modulo=None, accion=None, fecha_desde=None, fecha_hasta=None):
+    """
+    Exporta el historial filtrado a un CSV comprimido con gzip en un archivo temporal
+    
+    El servidor genera el CSV con COPY (SELECT ...) TO STDOUT y los bloques se van
+    comprimiendo a disco, sin armar las filas en memoria.
+    
+    Returns:
+        tuple: (ruta del archivo o None, mensaje)
+    """
+    try:
+        filtros_sql, params = filtros_historial_sql(usuario_id, modulo, accion, fecha_desde, fecha_hasta)
+        consulta = text(f"""
+            SELECT a.fecha_hora, a.usuario_nombre, a.modulo, a.accion, a.descripcion,
+                   a.esquema_afectado, a.registro_afectado_id, a.detalles,
+                   a.valores_anteriores, a.valores_nuevos
+            FROM reactivos_py.auditoria a
+            WHERE 1=1 {filtros_sql}
+            ORDER BY a.fecha_hora DESC, a.id DESC
+        """).bindparams(**params)
+        
+        # COPY no admite parámetros: los valores de los filtros se escapan como literales
+        consulta_sql = str(consulta.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+        if engine.dialect.paramstyle in ('format', 'pyformat'):
+            # El compilador duplica los '%' para el driver, pero copy_expert no los interpreta
+            consulta_sql = consulta_sql.replace('%%', '%')
+        
+        archivo_temporal = tempfile.NamedTemporaryFile(prefix="historial_", suffix=".csv.gz", delete=False)
+        archivo_temporal.close()
+        
+        with engine.connect() as conn:
+            with gzip.open(archivo_temporal.name, 'wb', compresslevel=6) as archivo:
+                copiar_a_archivo(conn, f"COPY ({consulta_sql}) TO STDOUT WITH (FORMAT csv, HEADER)", archivo)
+            conn.rollback()
+        
+        tamano_mb = os.path.getsize(archivo_temporal.name) / (1024 * 1024)
+        return archivo_temporal.name, f"Historial exportado ({tamano_mb:.1f} MB comprimido)"
+    except Exception as e:
+        return None, f"Error exportando historial: {e}"
+
+def obtener_detalle_actividad(actividad_id, fecha_hora):
+    """Lee y decodifica los campos JSON de una sola actividad (la fecha limita la búsqueda a su partición)"""
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(text("""
+                SELECT detalles::text, valores_anteriores::text, valores_nuevos::text
+                FROM reactivos_py.auditoria
+                WHERE id = :id AND fecha_hora = :fecha_hora
+            """), {'id': actividad_id, 'fecha_hora': fecha_hora}).fetchone()
+            
+            if not row:
+                return {'detalles': None, 'valores_anteriores': None, 'valores_nuevos': None}
+            
+            return {
+                'detalles': json.loads(row[0]) if row[0] else None,
+                'valores_anteriores': json.loads(row[1]) if row[1] else None,
+                'valores_nuevos': json.loads(row[2]) if row[2] else None
+            }
+    except Exception as e:
+        st.error(f"Error obteniendo detalle de actividad: {e}")
+        return {'detalles': None, 'valores_anteriores': None, 'valores_nuevos': None}
+
+@st.cache_data(ttl=TTL_CACHE_CONSULTAS, show_spinner=False)
+def obtener_estadisticas_auditoria():
+    """Totales de actividades por usuario (top 10) y por módulo, desde el resumen de auditoría"""
+    with engine.connect() as conn:
+        por_usuario = conn.execute(text("""
+            SELECT usuario_nombre, SUM(total) AS total
+            FROM reactivos_py.auditoria_resumen
+            GROUP BY usuario_nombre
+            ORDER BY total DESC
+            LIMIT 10
+        """)).fetchall()
+        
+        por_modulo = conn.execute(text("""
+            SELECT modulo, SUM(total) AS total
+            FROM reactivos_py.auditoria_resumen
+            GROUP BY modulo
+            ORDER BY total DESC
+        """)).fetchall()
+        
+        return [tuple(row) for row in por_usuario], [tuple(row) for row in por_modulo]
+
 def numero_a_letras(numero):
     """Convierte un número a su representación en letras (simplificada)"""
     millones = int(numero / 1000000)
@@ -401,28 +1132,50 @@ def iniciar_actualizacion_automatica():
         tiempo_transcurrido = (datetime.now() - st.session_state.ultima_actualizacion).total_seconds() / 60
         if tiempo_transcurrido >= INTERVALO_ACTUALIZACION:
             st.session_state.ultima_actualizacion = datetime.now()
-            st.info("Actualizando datos...")
-            # Aquí puedes poner el código para refrescar los datos
-            time.sleep(1)
-            st.rerun()
+            # El resumen se lee de nuevo en esta misma ejecución; no hace falta un rerun
+            invalidar_cache('resumen')
+
+def invalidar_cache(*consultas):
+    """
+    Descarta las consultas cacheadas afectadas por una escritura
+    
+    Args:
+        consultas: Nombres de las consultas: 'esquemas', 'archivos', 'proveedores', 'servicios',
+            'resumen', 'ejecucion', 'detalle_orden'
+    """
+    cacheadas = {
+        'esquemas': _consultar_esquemas_postgres,
+        'archivos': _consultar_archivos_cargados,
+        'proveedores': _consultar_proveedores,
+        'servicios': _consultar_servicios_beneficiarios,
+        'resumen': _consultar_resumen_ordenes,
+        'ejecucion': _consultar_ejecucion_licitaciones,
+        'detalle_orden': _consultar_detalle_orden
+    }
+    for consulta in consultas:
+        cacheadas[consulta].clear()
+
+@st.cache_data(ttl=TTL_CACHE_CONSULTAS, show_spinner=False)
+def _consultar_esquemas_postgres():
+    """Consulta (cacheada) de los esquemas de licitaciones"""
+    with engine.connect() as conn:
+        query = text("""
+            SELECT schema_name
+            FROM information_schema.schemata
+            WHERE schema_name NOT IN ('pg_catalog', 'information_schema', 'public', 'reactivos_py', 'pg_toast')
+            AND schema_name NOT LIKE 'pg_temp_%'
+            AND schema_name NOT LIKE 'pg_toast_temp_%'
+            ORDER BY schema_name
+        """)
+        
+        result = conn.execute(query)
+        
+        return [row[0] for row in result]
 
 def obtener_esquemas_postgres():
     """Obtiene la lista de esquemas existentes en PostgreSQL, excluyendo esquemas del sistema"""
     try:
-        with engine.connect() as conn:
-            query = text("""
-                SELECT schema_name
-                FROM information_schema.schemata
-                WHERE schema_name NOT IN ('pg_catalog', 'information_schema', 'public', 'reactivos_py', 'pg_toast')
-                AND schema_name NOT LIKE 'pg_temp_%'
-                AND schema_name NOT LIKE 'pg_toast_temp_%'
-                ORDER BY schema_name
-            """)
-            
-            result = conn.execute(query)
-            
-            esquemas = [row[0] for row in result]
-            return esquemas
+        return list(_consultar_esquemas_postgres())
     except Exception as e:
         st.error(f"Error obteniendo esquemas: {e}")
         return []
@@ -430,58 +1183,115 @@ def obtener_esquemas_postgres():
 import openpyxl
 import pandas as pd
 
-def cargar_archivo_a_postgres(archivo_excel, nombre_archivo, esquema):
+def cargar_archivo_a_postgres(archivo_excel, nombre_archivo, esquema, empresa=None, datos_formulario=None, modo=MODO_AGREGAR):
     """
     Carga un archivo Excel directamente a PostgreSQL creando las 4 tablas del esquema
+    
+    Las hojas se leen en paralelo en un pool de procesos; cada hoja leída se carga
+    con COPY en una tabla de staging usando su propia conexión del pool, y al final
+    una única transacción mueve las tablas de staging al esquema de la licitación,
+    de modo que la carga completa se confirma o se revierte como una sola unidad.
+    
+    Antes de leer se compara el SHA-256 del archivo con las cargas activas del
+    esquema (un archivo idéntico no se vuelve a cargar) y las hojas cuya huella
+    coincide con la última cargada se omiten.
+    
+    Args:
+        empresa (str): Empresa adjudicada, tal como la envía el formulario de carga
+        datos_formulario (dict): Datos de la licitación ingresados en el formulario
+        modo (str): MODO_AGREGAR agrega las filas a las tablas existentes;
+            MODO_ACTUALIZAR las fusiona por clave natural (inserta, actualiza o deja igual)
+    
+    Returns:
+        tuple: (success, message, metricas) donde metricas es una lista con
+        filas, segundos y filas/segundo de cada hoja cargada
     """
+    metricas = []
+    tablas_staging = {}
+    archivos_temporales = []
     try:
-        # Leer el contenido del archivo Excel
-        archivo_excel.seek(0)  # Reiniciar el puntero del archivo
-        
-        # Leer todas las hojas del Excel
-        excel_data = pd.read_excel(archivo_excel, sheet_name=None, engine='openpyxl')
-        
-        # Verificar que existan las hojas necesarias
-        hojas_requeridas = ['llamado', 'ejecucion_general', 'orden_de_compra', 'ejecucion_por_zonas']
-        hojas_encontradas = list(excel_data.keys())
+        # Abrir el Excel en modo solo lectura solo para validar las hojas
+        libro = abrir_libro_excel(archivo_excel)
+        hojas_encontradas = list(libro.sheetnames)
+        libro.close()
         
         # Validar hojas
-        for hoja in hojas_requeridas:
+        for hoja in CREADORES_TABLAS:
             if hoja not in hojas_encontradas:
-                return False, f"Error: Falta la hoja '{hoja}' en el archivo Excel. Hojas encontradas: {hojas_encontradas}"
+                return False, f"Error: Falta la hoja '{hoja}' en el archivo Excel. Hojas encontradas: {hojas_encontradas}", metricas
         
         # Formatear el nombre del esquema
         esquema_formateado = esquema.strip().lower().replace(' ', '_').replace('-', '_')
         
+        contenido_original = archivo_excel.getvalue()
+        sha256 = calcular_sha256(contenido_original)
+        
+        # Omitir de inmediato un archivo idéntico ya cargado en esta licitación
+        carga_existente, huellas_anteriores = obtener_huellas_carga(esquema_formateado, sha256)
+        if carga_existente:
+            return False, f"Este archivo ya fue cargado en el esquema '{esquema_formateado}' (ID: {carga_existente}). No se realizaron cambios.", metricas
+        
+        sufijo = uuid.uuid4().hex[:8]
+        tablas_staging = {hoja: f"stg_{sufijo}_{hoja}" for hoja in CREADORES_TABLAS}
+        
+        # 1. Leer las hojas en paralelo y cargar cada una en staging apenas está lista
+        with ProcessPoolExecutor(max_workers=PROCESOS_LECTURA) as pool_lectura, \
+             ThreadPoolExecutor(max_workers=len(CREADORES_TABLAS)) as pool_carga:
+            lecturas = [
+                pool_lectura.submit(parsear_hoja_a_csv, contenido_original, hoja)
+                for hoja in CREADORES_TABLAS
+            ]
+            cargas = []
+            huellas = {}
+            columnas_hojas = {}
+            for lectura in as_completed(lecturas):
+                parseo = lectura.result()
+                archivos_temporales.append(parseo['ruta'])
+                huellas[parseo['hoja']] = (parseo['huella'], parseo['filas'])
+                columnas_hojas[parseo['hoja']] = parseo['columnas']
+                cargas.append(pool_carga.submit(
+                    cargar_hoja_en_staging, parseo, tablas_staging[parseo['hoja']],
+                    huellas_anteriores.get(parseo['hoja'])
+                ))
+            
+            for carga in cargas:
+                metricas.append(carga.result())
+        
+        hojas_modificadas = [m['tabla'] for m in metricas if m['metodo'] != HOJA_SIN_CAMBIOS]
+        
+        # Mantener el orden de las hojas en el reporte
+        orden_hojas = list(CREADORES_TABLAS)
+        metricas.sort(key=lambda m: orden_hojas.index(m['tabla']))
+        
         with engine.connect() as conn:
             # Iniciar transacción
             trans = conn.begin()
             try:
-                # 1. Crear el esquema si no existe
+                # 2. Crear el esquema si no existe
                 conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{esquema_formateado}"'))
                 
-                # 2. Crear y cargar tabla 'llamado'
-                df_llamado = excel_data['llamado']
-                crear_tabla_llamado(conn, esquema_formateado, df_llamado)
-                
-                # 3. Crear y cargar tabla 'ejecucion_general'
-                df_ejecucion_general = excel_data['ejecucion_general']
-                crear_tabla_ejecucion_general(conn, esquema_formateado, df_ejecucion_general)
+                # 3. Pasar las tablas de staging al esquema de la licitación (solo hojas con cambios)
+                metricas_por_hoja = {m['tabla']: m for m in metricas}
+                for hoja in hojas_modificadas:
+                    conteos = publicar_tabla_staging(
+                        conn, esquema_formateado, hoja, tablas_staging[hoja], modo, columnas_hojas[hoja]
+                    )
+                    if conteos:
+                        metricas_por_hoja[hoja].update(conteos)
+                    registrar_huella_hoja(conn, esquema_formateado, hoja, *huellas[hoja])
                 
-                # 4. Crear y cargar tabla 'orden_de_compra'
-                df_orden_compra = excel_data['orden_de_compra']
-                crear_tabla_orden_compra(conn, esquema_formateado, df_orden_compra)
+                # Mantener el catálogo de IDs al día
+                if 'llamado' in hojas_modificadas:
+                    refrescar_catalogo_licitacion(conn, esquema_formateado)
                 
-                # 5. Crear y cargar tabla 'ejecucion_por_zonas'
-                df_ejecucion_zonas = excel_data['ejecucion_por_zonas']
-                crear_tabla_ejecucion_por_zonas(conn, esquema_formateado, df_ejecucion_zonas)
+                # 4. Guardar el archivo original (una sola copia por contenido)
+                guardar_blob(conn, contenido_original, sha256)
                 
-                # 6. Guardar registro del archivo en la tabla de control
-                contenido_original = archivo_excel.getvalue()
+                # 5. Guardar registro del archivo en la tabla de control
                 query = text("""
-                    INSERT INTO archivos_cargados 
-                    (nombre_archivo, esquema, usuario_id, contenido_original)
-                    VALUES (:nombre, :esquema, :usuario_id, :contenido)
+                    INSERT INTO reactivos_py.archivos_cargados 
+                    (nombre_archivo, esquema, usuario_id, sha256)
+                    VALUES (:nombre, :esquema, :usuario_id, :sha256)
                     RETURNING id
                 """)
                 
@@ -489,15 +1299,16 @@ def cargar_archivo_a_postgres(archivo_excel, nombre_archivo, esquema):
                     'nombre': nombre_archivo,
                     'esquema': esquema_formateado,
                     'usuario_id': st.session_state.user_id,
-                    'contenido': contenido_original.decode('latin1')  # Para archivos binarios
+                    'sha256': sha256
                 })
                 
                 archivo_id = result.scalar()
                 
                 # Confirmar transacción
                 trans.commit()
+                invalidar_cache('esquemas', 'archivos', 'servicios', 'ejecucion', 'detalle_orden')
                 
-                return True, f"Archivo Excel cargado correctamente en esquema '{esquema_formateado}' con ID: {archivo_id}"
+                return True, f"Archivo Excel cargado correctamente en esquema '{esquema_formateado}' con ID: {archivo_id}", metricas
                 
             except Exception as e:
                 # Revertir transacción en caso de error
@@ -505,136 +1316,212 @@ def cargar_archivo_a_postgres(archivo_excel, nombre_archivo, esquema):
                 raise e
                 
     except Exception as e:
-        return False, f"Error al cargar archivo Excel: {e}"
+        return False, f"Error al cargar archivo Excel: {e}", metricas
+    finally:
+        eliminar_tablas_staging(tablas_staging.values())
+        for ruta in archivos_temporales:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+def obtener_huellas_carga(esquema, sha256):
+    """
+    Busca si el archivo ya está cargado en el esquema y devuelve las huellas de sus hojas
+    
+    Returns:
+        tuple: (id de la carga activa con el mismo SHA-256 o None, {hoja: huella})
+    """
+    with engine.connect() as conn:
+        carga_existente = conn.execute(text("""
+            SELECT id
+            FROM reactivos_py.archivos_cargados
+            WHERE esquema = :esquema AND sha256 = :sha256 AND estado = 'Activo'
+            LIMIT 1
+        """), {'esquema': esquema, 'sha256': sha256}).scalar()
+        
+        # Solo cuentan las huellas de tablas que siguen existiendo
+        result = conn.execute(text("""
+            SELECT hoja, huella
+            FROM reactivos_py.huellas_carga
+            WHERE esquema = :esquema
+              AND to_regclass(format('%I.%I', esquema, hoja)) IS NOT NULL
+        """), {'esquema': esquema})
+        
+        return carga_existente, {row[0]: row[1] for row in result}
+
+def registrar_huella_hoja(conn, esquema, hoja, huella, filas):
+    """Guarda la huella de la última versión cargada de una hoja"""
+    conn.execute(text("""
+        INSERT INTO reactivos_py.huellas_carga (esquema, hoja, huella, filas, fecha_carga)
+        VALUES (:esquema, :hoja, :huella, :filas, CURRENT_TIMESTAMP)
+        ON CONFLICT (esquema, hoja) DO UPDATE
+        SET huella = EXCLUDED.huella, filas = EXCLUDED.filas, fecha_carga = EXCLUDED.fecha_carga
+    """), {'esquema': esquema, 'hoja': hoja, 'huella': huella, 'filas': filas})
+
+def cargar_hoja_en_staging(parseo, tabla_staging, huella_anterior=None):
+    """Crea la tabla de staging de una hoja y la llena con COPY usando una conexión propia del pool"""
+    if parseo['huella'] == huella_anterior:
+        # La hoja es idéntica a la última cargada: no hay nada que copiar
+        return {
+            'tabla': parseo['hoja'],
+            'filas': parseo['filas'],
+            'segundos': 0,
+            'filas_por_segundo': 0,
+            'metodo': HOJA_SIN_CAMBIOS,
+            'segundos_lectura': parseo['segundos_lectura'],
+            'celdas_rechazadas': parseo['celdas_rechazadas'],
+            'rechazos': parseo['rechazos']
+        }
+    
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            CREADORES_TABLAS[parseo['hoja']](conn, ESQUEMA_STAGING, tabla_staging)
+            metrica = cargar_archivo_csv(
+                conn, parseo['ruta'], parseo['columnas'], parseo['filas'],
+                ESQUEMA_STAGING, tabla_staging
+            )
+            trans.commit()
+        except Exception as e:
+            trans.rollback()
+            raise e
+    
+    metrica['tabla'] = parseo['hoja']
+    metrica['segundos_lectura'] = parseo['segundos_lectura']
+    metrica['celdas_rechazadas'] = parseo['celdas_rechazadas']
+    metrica['rechazos'] = parseo['rechazos']
+    return metrica
+
+def publicar_tabla_staging(conn, esquema, hoja, tabla_staging, modo=MODO_AGREGAR, columnas=None):
+    """
+    Mueve una tabla de staging al esquema de la licitación
+    
+    Si la tabla ya existe, en modo agregar se insertan todas las filas del staging y en
+    modo actualizar se fusionan por la clave natural de la hoja (solo las columnas
+    presentes en el Excel).
+    
+    Returns:
+        dict: Filas insertadas, actualizadas y sin cambios (None en modo agregar)
+    """
+    existe = conn.execute(
+        text("SELECT to_regclass(:tabla)"),
+        {'tabla': f'"{esquema}"."{hoja}"'}
+    ).scalar()
+    
+    if existe is None:
+        # Tabla nueva: basta con cambiarla de esquema y renombrarla
+        conn.execute(text(f'ALTER TABLE "{ESQUEMA_STAGING}"."{tabla_staging}" SET SCHEMA "{esquema}"'))
+        conn.execute(text(f'ALTER TABLE "{esquema}"."{tabla_staging}" RENAME TO "{hoja}"'))
+        return None
+    
+    if modo == MODO_ACTUALIZAR:
+        # Tabla existente: actualizar por clave natural
+        claves = CLAVES_NATURALES[hoja]
+        savepoint = conn.begin_nested()
+        try:
+            crear_indice_clave(conn, esquema, hoja, claves)
+            savepoint.commit()
+        except Exception as e:
+            savepoint.rollback()
+            raise Exception(f"La tabla '{hoja}' tiene filas repetidas para la clave {claves}; no se puede actualizar por clave: {e}")
+        
+        conteos = fusionar_tabla(conn, ESQUEMA_STAGING, tabla_staging, esquema, hoja, columnas, claves)
+        eliminar_indice_clave(conn, esquema, hoja)
+        conn.execute(text(f'DROP TABLE "{ESQUEMA_STAGING}"."{tabla_staging}"'))
+        return conteos
+    
+    # Tabla existente: agregar las filas cargadas en staging (sin el índice único que
+    # pudo dejar una fusión anterior, que rechazaría claves repetidas)
+    eliminar_indice_clave(conn, esquema, hoja)
+    
+    result = conn.execute(text("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = :esquema AND table_name = :tabla
+        ORDER BY ordinal_position
+    """), {'esquema': ESQUEMA_STAGING, 'tabla': tabla_staging})
+    columnas = ', '.join(f'"{row[0]}"' for row in result)
+    
+    conn.execute(text(f"""
+        INSERT INTO "{esquema}"."{hoja}" ({columnas})
+        SELECT {columnas} FROM "{ESQUEMA_STAGING}"."{tabla_staging}"
+    """))
+    conn.execute(text(f'DROP TABLE "{ESQUEMA_STAGING}"."{tabla_staging}"'))
+    return None
+
+def eliminar_tablas_staging(tablas_staging):
+    """Elimina las tablas de staging que hayan quedado de una carga"""
+    try:
+        with engine.connect() as conn:
+            for tabla_staging in tablas_staging:
+                conn.execute(text(f'DROP TABLE IF EXISTS "{ESQUEMA_STAGING}"."{tabla_staging}"'))
+            conn.commit()
+    except Exception as e:
+        print(f"Error eliminando tablas de staging: {e}")
 
-def crear_tabla_llamado(conn, esquema, df):
+def crear_tabla_llamado(conn, esquema, tabla='llamado'):
     """Crea la tabla llamado con su estructura específica"""
-    # Crear tabla
-    create_sql = f'''
-    CREATE TABLE IF NOT EXISTS "{esquema}".llamado (
-        "I_D" VARCHAR(50),
-        "NUMERO_DE_LLAMADO" VARCHAR(50),
-        "AÑO_DEL_LLAMADO" VARCHAR(10),
-        "NOMBRE_DEL_LLAMADO" TEXT,
-        "EMPRESA_ADJUDICADA" TEXT,
-        "RUC" VARCHAR(50),
-        "FECHA_FIRMA_CONTRATO" DATE,
-        "NUMERO_CONTRATO" VARCHAR(100),
-        "VIGENCIA_CONTRATO" TEXT,
-        "Fecha_de_Inicio_de_Poliza" DATE,
-        "Fecha_de_Finalizacion_de_Poliza" DATE
-    )
-    '''
-    conn.execute(text(create_sql))
-    
-    # Limpiar y cargar datos
-    df_clean = df.fillna('')
-    df_clean.to_sql('llamado', conn, schema=esquema, if_exists='append', index=False, method='multi')
+    conn.execute(text(sql_crear_tabla('llamado', esquema, tabla)))
 
-def crear_tabla_ejecucion_general(conn, esquema, df):
+def crear_tabla_ejecucion_general(conn, esquema, tabla='ejecucion_general'):
     """Crea la tabla ejecucion_general con su estructura específica"""
-    create_sql = f'''
-    CREATE TABLE IF NOT EXISTS "{esquema}".ejecucion_general (
-        "COMODATO_SIN_COMODATO" VARCHAR(50),
-        "ESTADO_DEL_LOTE_ITEM" TEXT,
-        "LOTE" VARCHAR(50),
-        "ITEM" VARCHAR(50),
-        "DESCRIPCION_DEL_PRODUCTO" TEXT,
-        "PRESENTACION" TEXT,
-        "MARCA" TEXT,
-        "PROCEDENCIA" TEXT,
-        "DESCRIPCION_DEL_PRODUCTO_MARCA_PROCEDENCIA" TEXT,
-        "UNIDAD_DE_MEDIDA" VARCHAR(50),
-        "PRECIO_UNITARIO" DECIMAL(15,2),
-        "CANTIDAD_MINIMA" DECIMAL(15,2),
-        "CANTIDAD_MAXIMA" DECIMAL(15,2),
-        "REDISTRIBUCION_CANTIDAD_MINIMA" DECIMAL(15,2),
-        "REDISTRIBUCION_CANTIDAD_MAXIMA" DECIMAL(15,2),
-        "ENTRADAS_20_ADENDAS_DE_AMPLIACION" DECIMAL(15,2),
-        "SALIDAS_ADENDAS_DE_DISMINUCION" DECIMAL(15,2),
-        "TOTAL_ADJUDICADO" DECIMAL(15,2),
-        "CANTIDAD_EMITIDA" DECIMAL(15,2),
-        "SALDO_A_EMITIR" DECIMAL(15,2),
-        "PORCENTAJE_EMITIDO" DECIMAL(5,2)
-    )
-    '''
-    conn.execute(text(create_sql))
-    
-    # Limpiar y cargar datos
-    df_clean = df.fillna('')
-    df_clean.to_sql('ejecucion_general', conn, schema=esquema, if_exists='append', index=False, method='multi')
+    conn.execute(text(sql_crear_tabla('ejecucion_general', esquema, tabla)))
 
-def crear_tabla_orden_compra(conn, esquema, df):
+def crear_tabla_orden_compra(conn, esquema, tabla='orden_de_compra'):
     """Crea la tabla orden_de_compra con su estructura específica"""
-    create_sql = f'''
-    CREATE TABLE IF NOT EXISTS "{esquema}".orden_de_compra (
-        "SIMESE_PEDIDO" VARCHAR(100),
-        "N_ORDEN_DE_COMPRA" VARCHAR(100),
-        "FECHA_DE_EMISION" DATE,
-        "CODIGO_DE_REACTIVOS_INSUMOS_CODIGO_DE_SERVICIO_BENEFICIARIO" TEXT,
-        "CODIGO_DE_REACTIVOS_INSUMOS" VARCHAR(100),
-        "ESTADO_SEGUN_DISTRIBUCION_INTERNA" TEXT,
-        "ESTADO_DEL_LOTE_ITEM" TEXT,
-        "SERVICIO_BENEFICIARIO" TEXT,
-        "SUBSERVICIO_BENEFICIARIO" TEXT,
-        "COMODATO_SIN_COMODATO" VARCHAR(50),
-        "LOTE" VARCHAR(50),
-        "ITEM" VARCHAR(50),
-        "CANTIDAD_SOLICITADA" DECIMAL(15,2),
-        "CANTIDAD_COMPLEMENTARIA_SOLICITADA" DECIMAL(15,2),
-        "UNIDAD_DE_MEDIDA" VARCHAR(50),
-        "DESCRIPCION_DEL_PRODUCTO_MARCA_PROCEDENCIA" TEXT,
-        "PRECIO_UNITARIO" DECIMAL(15,2),
-        "PORCENTAJE_EMITIDO_SERVICIO_BENEFICIARIO" DECIMAL(5,2),
-        "PORCENTAJE_DEL_LOTE_ITEM_GLOBAL" DECIMAL(5,2),
-        "SALDO_A_EMITIR_DEL_SERVICIO_SANITARIO" DECIMAL(15,2),
-        "MONTO_EMITIDO" DECIMAL(15,2),
-        "Porcentaje_para_emision_de_complementarios_USO_INTERNO" DECIMAL(5,2),
-        "Observaciones" TEXT
-    )
-    '''
-    conn.execute(text(create_sql))
-    
-    # Limpiar y cargar datos
-    df_clean = df.fillna('')
-    df_clean.to_sql('orden_de_compra', conn, schema=esquema, if_exists='append', index=False, method='multi')
+    conn.execute(text(sql_crear_tabla('orden_de_compra', esquema, tabla)))
 
-def crear_tabla_ejecucion_por_zonas(conn, esquema, df):
+def crear_tabla_ejecucion_por_zonas(conn, esquema, tabla='ejecucion_por_zonas'):
     """Crea la tabla ejecucion_por_zonas con su estructura específica"""
-    create_sql = f'''
-    CREATE TABLE IF NOT EXISTS "{esquema}".ejecucion_por_zonas (
-        "CODIGO_DE_REACTIVOS_INSUMOS_CODIGO_DE_SERVICIO_BENEFICIARIO" TEXT,
-        "CODIGO_PARA_SERVICIO_BENEFICIARIO" VARCHAR(100),
-        "CODIGO_DE_REACTIVOS_INSUMOS" VARCHAR(100),
-        "ESTADO_SEGUN_DISTRIBUCION_INTERNA" TEXT,
-        "SERVICIO_BENEFICIARIO" TEXT,
-        "Porcentaje_para_emision_de_complementarios_USO_INTERNO" DECIMAL(5,2),
-        "COMODATO_SIN_COMODATO" VARCHAR(50),
-        "ESTADO_DEL_LOTE_ITEM" TEXT,
-        "LOTE" VARCHAR(50),
-        "ITEM" VARCHAR(50),
-        "DESCRIPCION_DEL_PRODUCTO_MARCA_PROCEDENCIA" TEXT,
-        "UNIDAD_DE_MEDIDA" VARCHAR(50),
-        "PRECIO_UNITARIO" DECIMAL(15,2),
-        "CANTIDAD_MINIMA" DECIMAL(15,2),
-        "CANTIDAD_MAXIMA" DECIMAL(15,2),
-        "REDISTRIBUCION_CANTIDAD_MINIMA" DECIMAL(15,2),
-        "REDISTRIBUCION_CANTIDAD_MAXIMA" DECIMAL(15,2),
-        "ENTRADAS_20_ADENDAS_DE_AMPLIACION" DECIMAL(15,2),
-        "SALIDAS_ADENDAS_DE_DISMINUCION" DECIMAL(15,2),
-        "TOTAL_ADJUDICADO" DECIMAL(15,2),
-        "CANTIDAD_EMITIDA" DECIMAL(15,2),
-        "SALDO_A_EMITIR" DECIMAL(15,2),
-        "PORCENTAJE_EMITIDO_POR_SERVICIO_SANITARIO" DECIMAL(5,2),
-        "PORCENTAJE_DEL_LOTE_ITEM_GLOBAL" DECIMAL(5,2),
-        "OBSERVACION" TEXT
-    )
-    '''
-    conn.execute(text(create_sql))
+    conn.execute(text(sql_crear_tabla('ejecucion_por_zonas', esquema, tabla)))
+
+# Hojas requeridas del Excel y la función que crea la tabla de cada una
+CREADORES_TABLAS = {
+    'llamado': crear_tabla_llamado,
+    'ejecucion_general': crear_tabla_ejecucion_general,
+    'orden_de_compra': crear_tabla_orden_compra,
+    'ejecucion_por_zonas': crear_tabla_ejecucion_por_zonas
+}
+
+def resumir_metricas_carga(metricas):
+    """Devuelve las métricas de carga sin el detalle de celdas rechazadas (para auditoría)"""
+    return [{k: v for k, v in m.items() if k != 'rechazos'} for m in metricas]
+
+def mostrar_metricas_carga(metricas):
+    """Muestra las filas cargadas, la velocidad de carga y las celdas rechazadas de cada hoja"""
+    if not metricas:
+        return
     
-    # Limpiar y cargar datos
-    df_clean = df.fillna('')
-    df_clean.to_sql('ejecucion_por_zonas', conn, schema=esquema, if_exists='append', index=False, method='multi')
+    st.write("**⏱️ Métricas de carga por hoja:**")
+    df_metricas = pd.DataFrame(resumir_metricas_carga(metricas))
+    df_metricas = formatear_columnas_tabla(df_metricas, {
+        'tabla': 'Hoja',
+        'filas': 'Filas',
+        'segundos_lectura': 'Segundos Lectura',
+        'segundos': 'Segundos Carga',
+        'filas_por_segundo': 'Filas/Segundo',
+        'metodo': 'Método',
+        'insertadas': 'Insertadas',
+        'actualizadas': 'Actualizadas',
+        'sin_cambios': 'Sin Cambios',
+        'celdas_rechazadas': 'Celdas Rechazadas'
+    })
+    st.dataframe(df_metricas, use_container_width=True)
+    
+    rechazos = [r for m in metricas for r in m.get('rechazos', [])]
+    if rechazos:
+        total = sum(m.get('celdas_rechazadas', 0) for m in metricas)
+        with st.expander(f"⚠️ {total} celdas no se pudieron convertir y se cargaron vacías"):
+            if total > len(rechazos):
+                st.caption(f"Se muestran las primeras {len(rechazos)} celdas rechazadas.")
+            df_rechazos = formatear_columnas_tabla(pd.DataFrame(rechazos), {
+                'hoja': 'Hoja',
+                'fila': 'Fila Excel',
+                'columna': 'Columna',
+                'valor': 'Valor'
+            })
+            st.dataframe(df_rechazos, use_container_width=True)
 
 def pagina_cargar_archivo():
     """Página para cargar un nuevo archivo Excel (MODIFICADA)"""
@@ -683,7 +1570,7 @@ def pagina_cargar_archivo():
                 # Mostrar progreso
                 with st.spinner("Procesando archivo Excel..."):
                     # Procesar el archivo
-                    success, message = cargar_archivo_a_postgres(
+                    success, message, metricas = cargar_archivo_a_postgres(
                         archivo_excel,
                         archivo_excel.name,
                         esquema
@@ -692,38 +1579,72 @@ def pagina_cargar_archivo():
                 if success:
                     st.success(message)
                     st.balloons()
+                    mostrar_metricas_carga(metricas)
                 else:
                     st.error(message)
 
+@st.cache_data(ttl=TTL_CACHE_CONSULTAS, show_spinner=False)
+def _consultar_archivos_cargados():
+    """Consulta (cacheada) de los archivos cargados"""
+    with engine.connect() as conn:
+        query = text("""
+            SELECT ac.id, ac.nombre_archivo, ac.esquema, ac.fecha_carga, 
+                   u.username as usuario, ac.estado
+            FROM archivos_cargados ac
+            JOIN usuarios u ON ac.usuario_id = u.id
+            ORDER BY ac.fecha_carga DESC
+        """)
+        
+        result = conn.execute(query)
+        
+        archivos = []
+        for row in result:
+            archivos.append({
+                'id': row[0],
+                'nombre_archivo': row[1],
+                'esquema': row[2],
+                'fecha_carga': row[3],
+                'usuario': row[4],
+                'estado': row[5]
+            })
+        
+        return archivos
+
 def obtener_archivos_cargados():
     """Obtiene la lista de archivos cargados con su estado actual"""
+    try:
+        return [dict(a) for a in _consultar_archivos_cargados()]
+    except Exception as e:
+        st.error(f"Error obteniendo archivos cargados: {e}")
+        return []
+
+def obtener_contenido_archivo(archivo_id):
+    """Obtiene los bytes originales de un archivo cargado desde el almacén de blobs"""
     try:
         with engine.connect() as conn:
             query = text("""
-                SELECT ac.id, ac.nombre_archivo, ac.esquema, ac.fecha_carga, 
-                       u.username as usuario, ac.estado
-                FROM archivos_cargados ac
-                JOIN usuarios u ON ac.usuario_id = u.id
-                ORDER BY ac.fecha_carga DESC
+                SELECT nombre_archivo, sha256, contenido_original
+                FROM reactivos_py.archivos_cargados
+                WHERE id = :id
             """)
             
-            result = conn.execute(query)
+            row = conn.execute(query, {'id': archivo_id}).fetchone()
+            if not row:
+                return None
             
-            archivos = []
-            for row in result:
-                archivos.append({
-                    'id': row[0],
-                    'nombre_archivo': row[1],
-                    'esquema': row[2],
-                    'fecha_carga': row[3],
-                    'usuario': row[4],
-                    'estado': row[5]
-                })
+            if row[1]:
+                return leer_blob(conn, row[1])
             
-            return archivos
+            # Registros anteriores al almacén de blobs que todavía no se migraron
+            if row[2]:
+                if row[0].lower().endswith(('.xlsx', '.xls')):
+                    return row[2].encode('latin1')
+                return row[2].encode('utf-8')
+            
+            return None
     except Exception as e:
-        st.error(f"Error obteniendo archivos cargados: {e}")
-        return []
+        st.error(f"Error obteniendo contenido del archivo: {e}")
+        return None
 
 def eliminar_esquema_postgres(esquema):
     """Elimina un esquema de PostgreSQL y actualiza la tabla de cargas"""
@@ -741,12 +1662,25 @@ def eliminar_esquema_postgres(esquema):
                 
                 conn.execute(query_update, {'esquema': esquema})
                 
+                # Olvidar las huellas para que el mismo archivo se pueda volver a cargar
+                conn.execute(text("""
+                    DELETE FROM reactivos_py.huellas_carga
+                    WHERE esquema = :esquema
+                """), {'esquema': esquema})
+                
+                # Quitar la licitación del catálogo de IDs
+                conn.execute(text("""
+                    DELETE FROM reactivos_py.catalogo_licitaciones
+                    WHERE esquema = :esquema
+                """), {'esquema': esquema})
+                
                 # Eliminar el esquema
                 query = text(f'DROP SCHEMA IF EXISTS "{esquema}" CASCADE')
                 conn.execute(query)
                 
                 # Confirmar transacción
                 trans.commit()
+                invalidar_cache('esquemas', 'archivos', 'servicios', 'ejecucion', 'detalle_orden')
                 
                 return True, f"Esquema '{esquema}' eliminado correctamente."
             except Exception as e:
@@ -833,23 +1767,28 @@ def main():
         pagina_cambiar_password()
         return
 
+@st.cache_data(ttl=TTL_CACHE_CONSULTAS, show_spinner=False)
+def _consultar_proveedores():
+    """Consulta (cacheada) de los proveedores activos"""
+    with engine.connect() as conn:
+        query = text("""
+            SELECT razon_social, ruc 
+            FROM reactivos_py.proveedores 
+            WHERE activo = TRUE 
+            ORDER BY razon_social
+        """)
+        result = conn.execute(query)
+        proveedores = []
+        for row in result:
+            proveedores.append({
+                'nombre': row[0],  # razon_social
+                'ruc': row[1]      # ruc
+            })
+        return proveedores
+
 def obtener_proveedores():
     try:
-        with engine.connect() as conn:
-            query = text("""
-                SELECT razon_social, ruc 
-                FROM reactivos_py.proveedores 
-                WHERE activo = TRUE 
-                ORDER BY razon_social
-            """)
-            result = conn.execute(query)
-            proveedores = []
-            for row in result:
-                proveedores.append({
-                    'nombre': row[0],  # razon_social
-                    'ruc': row[1]      # ruc
-                })
-            return proveedores
+        return [dict(p) for p in _consultar_proveedores()]
     except Exception as e:
         st.error(f"Error al obtener proveedores: {e}")
         return []
@@ -1098,7 +2037,7 @@ def obtener_proveedores():
                 
                 # Procesar el archivo con el prefijo de empresa en las tablas
                 with st.spinner("Procesando archivo y creando tablas..."):
-                    success, message = cargar_archivo_a_postgres(
+                    success, message, metricas = cargar_archivo_a_postgres(
                         archivo,
                         archivo.name,
                         esquema,
@@ -1109,6 +2048,7 @@ def obtener_proveedores():
                 if success:
                     st.success(f"Archivo cargado correctamente en el esquema '{esquema}' con tablas de empresa '{empresa_para_tablas}'")
                     st.balloons()
+                    mostrar_metricas_carga(metricas)
                 else:
                     st.error(message)
 
@@ -1124,6 +2064,10 @@ def pagina_cargar_archivo():
     if 'datos_confirmados' not in st.session_state:
         st.session_state.datos_confirmados = False
     
+    # Métricas de la última carga realizada (se muestran una sola vez)
+    if st.session_state.get('metricas_ultima_carga'):
+        mostrar_metricas_carga(st.session_state.pop('metricas_ultima_carga'))
+    
     # BUSCADOR PEQUEÑO SOLO PARA ID - FUERA DEL FORMULARIO
     col_search1, col_search2 = st.columns([1, 3])
     with col_search1:
@@ -1131,34 +2075,25 @@ def pagina_cargar_archivo():
     with col_search2:
         id_busqueda = st.text_input("", placeholder="Escriba un ID para buscar...", key="id_search")
         if id_busqueda:
-            # Buscar en la base de datos si existe una licitación con ese ID
+            # Buscar en el catálogo central si existe una licitación con ese ID
             try:
                 with engine.connect() as conn:
-                    esquemas = obtener_esquemas_postgres()
-                    licitacion_encontrada = False
-                    
-                    for esquema in esquemas:
-                        try:
-                            query = text(f"""
-                                SELECT "I_D", "NOMBRE DEL LLAMADO"
-                                FROM "{esquema}"."llamado"
-                                WHERE "I_D" ILIKE :id_busqueda
-                                LIMIT 5
-                            """)
-                            result = conn.execute(query, {'id_busqueda': f"%{id_busqueda}%"})
-                            resultados = result.fetchall()
-                            
-                            if resultados:
-                                licitacion_encontrada = True
-                                st.success("IDs encontrados:")
-                                for r in resultados:
-                                    if st.button(f"{r[0]} - {r[1]}", key=f"btn_{r[0]}"):
-                                        st.session_state.licitacion_seleccionada = r[0]
-                                        st.rerun()
-                        except Exception:
-                            pass
+                    query = text("""
+                        SELECT esquema, i_d, nombre_llamado
+                        FROM reactivos_py.catalogo_licitaciones
+                        WHERE i_d ILIKE :id_busqueda
+                        ORDER BY i_d, esquema
+                        LIMIT 10
+                    """)
+                    resultados = conn.execute(query, {'id_busqueda': f"%{id_busqueda}%"}).fetchall()
                     
-                    if not licitacion_encontrada:
+                    if resultados:
+                        st.success("IDs encontrados:")
+                        for r in resultados:
+                            if st.button(f"{r[1]} - {r[2]}", key=f"btn_{r[0]}_{r[1]}"):
+                                st.session_state.licitacion_seleccionada = r[1]
+                                st.rerun()
+                    else:
                         st.info("No se encontraron IDs similares")
             except Exception as e:
                 st.error(f"Error al buscar: {e}")
@@ -1188,31 +2123,21 @@ def pagina_cargar_archivo():
                 if not id_licitacion or modalidad == "Seleccionar..." or not numero_anio:
                     st.error("Por favor, complete todos los campos obligatorios antes de confirmar.")
                 else:
-                    # Verificar si ya existe una combinación similar en la base de datos
+                    # Verificar en el catálogo si ya existe una licitación con ese ID
                     try:
                         with engine.connect() as conn:
-                            esquemas = obtener_esquemas_postgres()
-                            duplicado_encontrado = False
-                            
-                            for esquema in esquemas:
-                                try:
-                                    query = text(f"""
-                                        SELECT "I_D", "NOMBRE DEL LLAMADO", "EMPRESA ADJUDICADA", "NUMERO DE LLAMADO"
-                                        FROM "{esquema}"."llamado"
-                                        WHERE "I_D" = :id_licitacion
-                                    """)
-                                    result = conn.execute(query, {'id_licitacion': id_licitacion})
-                                    coincidencia = result.fetchone()
-                                    
-                                    if coincidencia:
-                                        duplicado_encontrado = True
-                                        st.warning(f"⚠️ Ya existe una licitación con ID '{id_licitacion}' en el esquema '{esquema}'.")
-                                        st.info(f"Detalles: {coincidencia[1]} - Empresa: {coincidencia[2]} - N°: {coincidencia[3]}")
-                                        break
-                                except Exception:
-                                    pass
+                            query = text("""
+                                SELECT esquema, i_d, nombre_llamado, empresa_adjudicada, numero_llamado
+                                FROM reactivos_py.catalogo_licitaciones
+                                WHERE i_d = :id_licitacion
+                                LIMIT 1
+                            """)
+                            coincidencia = conn.execute(query, {'id_licitacion': id_licitacion}).fetchone()
                             
-                            if not duplicado_encontrado:
+                            if coincidencia:
+                                st.warning(f"⚠️ Ya existe una licitación con ID '{id_licitacion}' en el esquema '{coincidencia[0]}'.")
+                                st.info(f"Detalles: {coincidencia[2]} - Empresa: {coincidencia[3]} - N°: {coincidencia[4]}")
+                            else:
                                 st.success("✅ Datos iniciales confirmados. Por favor, complete el resto del formulario.")
                                 st.session_state.datos_confirmados = True
                     except Exception as e:
@@ -1313,6 +2238,17 @@ def pagina_cargar_archivo():
         # Campo para subir archivo
         archivo = st.file_uploader("Seleccionar archivo:", type=["csv", "xlsx", "xls"])
         
+        # Cómo se aplican los datos si la licitación ya tiene tablas cargadas
+        modo_carga = st.radio(
+            "Si la licitación ya existe:",
+            options=[MODO_AGREGAR, MODO_ACTUALIZAR],
+            format_func=lambda m: {
+                MODO_AGREGAR: "Agregar todas las filas",
+                MODO_ACTUALIZAR: "Actualizar por lote/ítem (solo lo que cambió)"
+            }[m],
+            horizontal=True
+        )
+        
         # SECCIÓN DE ANÁLISIS DE DATOS (mantenemos el código original si archivo no es None)
         if archivo is not None:
             st.subheader("📊 Análisis del Archivo")
@@ -1370,12 +2306,13 @@ def pagina_cargar_archivo():
         
         # Procesar el archivo con el prefijo de empresa en las tablas
         with st.spinner("Procesando archivo y creando tablas..."):
-            success, message = cargar_archivo_a_postgres(
+            success, message, metricas = cargar_archivo_a_postgres(
                 archivo,
                 archivo.name,
                 esquema,
                 empresa_para_tablas,
-                datos_formulario
+                datos_formulario,
+                modo_carga
             )
         
         if success:
@@ -1385,9 +2322,13 @@ def pagina_cargar_archivo():
                 accion="CREATE",
                 modulo="LICITACIONES",
                 descripcion=f"Archivo cargado: {archivo.name} en esquema {esquema}",
-                esquema_afectado=esquema
+                esquema_afectado=esquema,
+                detalles={'metricas_carga': resumir_metricas_carga(metricas)}
             )
             
+            # Guardar métricas para mostrarlas después del rerun
+            st.session_state.metricas_ultima_carga = metricas
+            
             # Limpiar estado después de éxito
             st.session_state.licitacion_seleccionada = None
             st.session_state.licitacion_data = {}
@@ -1480,24 +2421,19 @@ def pagina_ver_cargas():
                 archivo_seleccionado = next((a for a in archivos_activos if f"{a['nombre_archivo']} ({a['esquema']})" == archivo_id), None)
                 
                 if archivo_seleccionado:
-                    # Obtener contenido original
-                    with engine.connect() as conn:
-                        query = text("""
-                            SELECT contenido_original
-                            FROM reactivos_py.archivos_cargados
-                            WHERE id = :id
-                        """)
-                        
-                        result = conn.execute(query, {'id': archivo_seleccionado['id']})
-                        contenido = result.scalar()
+                    # El contenido se trae de la base solo cuando se pide la descarga
+                    if st.button("Preparar descarga"):
+                        contenido = obtener_contenido_archivo(archivo_seleccionado['id'])
                         
                         if contenido:
                             st.download_button(
                                 label="Descargar archivo original",
-                                data=contenido.encode('utf-8'),
+                                data=contenido,
                                 file_name=archivo_seleccionado['nombre_archivo'],
-                                mime="text/csv"
+                                mime=tipo_mime(archivo_seleccionado['nombre_archivo'])
                             )
+                        else:
+                            st.warning("No se encontró el contenido original de este archivo.")
         else:
             st.info("No hay archivos activos para descargar.")
     else:
@@ -1534,6 +2470,99 @@ def pagina_eliminar_esquemas():
     else:
         st.info("No hay licitaciones para eliminar.")
 
+def normalizar_columna_texto(serie):
+    """Convierte una columna a texto sin espacios sobrantes; los vacíos y 'nan' quedan como ''"""
+    texto = serie.astype(str).str.strip()
+    return texto.mask(texto.str.lower().isin(['nan', 'none', 'nat']), '')
+
+def importar_proveedores(df, col_ruc, col_razon, col_direccion=None, col_correo=None):
+    """
+    Importa proveedores desde un DataFrame en una sola operación
+    
+    Las columnas se normalizan de forma vectorizada, las filas válidas se cargan con
+    COPY en una tabla temporal y se pasan a reactivos_py.proveedores con un único
+    INSERT ... ON CONFLICT (ruc) DO NOTHING. Si un RUC se repite en el archivo se
+    toma la primera fila.
+    
+    Returns:
+        tuple: (success, message, resultado) con insertados, duplicados, errores y errores_detalle
+    """
+    filas = pd.Series(range(1, len(df) + 1), index=df.index)
+    datos = pd.DataFrame({
+        'fila': filas,
+        # Los RUC leídos como número traen '.0' al final
+        'ruc': normalizar_columna_texto(df[col_ruc]).str.replace(r'\.0$', '', regex=True).str.replace(r'\s+', '', regex=True),
+        'razon_social': normalizar_columna_texto(df[col_razon]),
+        'direccion': normalizar_columna_texto(df[col_direccion]) if col_direccion else '',
+        'correo': normalizar_columna_texto(df[col_correo]) if col_correo else ''
+    })
+    
+    vacios = (datos['ruc'] == '') | (datos['razon_social'] == '')
+    largos = ~vacios & (
+        (datos['ruc'].str.len() > 50) | (datos['razon_social'].str.len() > 200) | (datos['correo'].str.len() > 100)
+    )
+    errores_detalle = (
+        ("Fila " + datos.loc[vacios, 'fila'].astype(str) + ": RUC o Razón Social vacíos").tolist() +
+        ("Fila " + datos.loc[largos, 'fila'].astype(str) + ": RUC, Razón Social o Correo demasiado largos").tolist()
+    )
+    
+    validos = datos[~vacios & ~largos]
+    resultado = {
+        'insertados': 0,
+        'duplicados': 0,
+        'errores': int(vacios.sum() + largos.sum()),
+        'errores_detalle': errores_detalle
+    }
+    if validos.empty:
+        return False, "No hay filas válidas para importar", resultado
+    
+    try:
+        with engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                conn.execute(text("""
+                    CREATE TEMP TABLE proveedores_importacion (
+                        fila INTEGER,
+                        ruc VARCHAR(50),
+                        razon_social VARCHAR(200),
+                        direccion TEXT,
+                        correo VARCHAR(100)
+                    ) ON COMMIT DROP
+                """))
+                copiar_dataframe(conn, validos, 'pg_temp', 'proveedores_importacion')
+                
+                insertados = conn.execute(text("""
+                    INSERT INTO reactivos_py.proveedores (ruc, razon_social, direccion, correo_electronico)
+                    SELECT DISTINCT ON (ruc) ruc, razon_social, NULLIF(direccion, ''), NULLIF(correo, '')
+                    FROM pg_temp.proveedores_importacion
+                    ORDER BY ruc, fila
+                    ON CONFLICT (ruc) DO NOTHING
+                    RETURNING ruc
+                """)).fetchall()
+                
+                trans.commit()
+            except Exception as e:
+                trans.rollback()
+                raise e
+    except Exception as e:
+        return False, f"Error durante la importación: {e}", resultado
+    
+    # Insertada es la primera fila de cada RUC nuevo; las demás son duplicados
+    rucs_insertados = {row[0] for row in insertados}
+    primera_fila = ~validos['ruc'].duplicated()
+    duplicadas = validos[~(primera_fila & validos['ruc'].isin(rucs_insertados))]
+    
+    resultado['insertados'] = len(rucs_insertados)
+    resultado['duplicados'] = len(duplicadas)
+    resultado['errores_detalle'] += (
+        "Fila " + duplicadas['fila'].astype(str) + ": RUC " + duplicadas['ruc'] + " ya existe"
+    ).tolist()
+    
+    if resultado['insertados'] > 0:
+        invalidar_cache('proveedores')
+    
+    return True, f"Importación completada: {resultado['insertados']} nuevos registros", resultado
+
 def pagina_gestionar_proveedores():
     """Página para gestionar proveedores"""
     st.header("Gestión de Proveedores")
@@ -1715,6 +2744,7 @@ def pagina_gestionar_proveedores():
                                             
                                             # Hacer commit explícito
                                             conn.commit()
+                                            invalidar_cache('proveedores')
                                             
                                             st.success(f"✅ Proveedor {nueva_razon} actualizado correctamente")
                                             time.sleep(5)  # Esperar más tiempo
@@ -1743,6 +2773,7 @@ def pagina_gestionar_proveedores():
                                                 
                                                 # Hacer commit explícito
                                                 conn.commit()
+                                                invalidar_cache('proveedores')
                                                 
                                                 st.success(f"✅ Proveedor {proveedor['razon_social']} marcado como {estado_texto}")
                                                 # Esperar más tiempo para que la BD procese el cambio
@@ -1775,6 +2806,7 @@ def pagina_gestionar_proveedores():
                                             query_delete = text("DELETE FROM reactivos_py.proveedores WHERE id = :id")
                                             conn.execute(query_delete, {'id': st.session_state.proveedor_a_eliminar})
                                             conn.commit()  # Hacer commit explícito
+                                            invalidar_cache('proveedores')
                                             
                                             # Registrar actividad de eliminación
                                             registrar_actividad(
@@ -1884,6 +2916,7 @@ def pagina_gestionar_proveedores():
                                 
                                 # Hacer commit explícito
                                 conn.commit()
+                                invalidar_cache('proveedores')
                                 
                                 st.success(f"Proveedor '{razon_social}' registrado exitosamente")
                                 time.sleep(5)  # Esperar más tiempo
@@ -1911,58 +2944,21 @@ def pagina_gestionar_proveedores():
             # Botón para analizar archivo
             if st.button("🔍 Analizar Archivo"):
                 try:
-                    # Función mejorada para leer CSV completo
-                    def leer_csv_robusto(archivo):
-                        """Lee un archivo CSV de forma robusta con múltiples intentos"""
-                        delimitadores = [',', ';', '\t', '|']
-                        encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-                        
-                        mejor_df = None
-                        mejor_config = None
-                        max_filas = 0
-                        
-                        # Probar todas las combinaciones y quedarse con la que lee más filas
-                        for encoding in encodings:
-                            for delimiter in delimitadores:
-                                try:
-                                    archivo.seek(0)
-                                    
-                                    # Leer TODO el archivo (sin límite de filas)
-                                    df_temp = pd.read_csv(
-                                        archivo, 
-                                        delimiter=delimiter,
-                                        encoding=encoding,
-                                        quotechar='"',
-                                        skipinitialspace=True,
-                                        on_bad_lines='skip',
-                                        engine='python'
-                                    )
-                                    
-                                    # Verificar que el DataFrame tenga contenido válido
-                                    if len(df_temp) > max_filas and len(df_temp.columns) >= 2:
-                                        # Verificar que no todas las celdas estén vacías
-                                        celdas_no_vacias = df_temp.notna().sum().sum()
-                                        if celdas_no_vacias > 0:
-                                            mejor_df = df_temp.copy()
-                                            mejor_config = (delimiter, encoding)
-                                            max_filas = len(df_temp)
-                                    
-                                except Exception:
-                                    continue
-                        
-                        return mejor_df, mejor_config
-                    
-                    # Intentar leer el archivo completo
+                    # Detectar encoding y delimitador con una muestra y leer el archivo una sola vez
                     st.write("**🔄 Analizando archivo completo...**")
                     
                     with st.spinner("Procesando archivo CSV..."):
-                        df, config = leer_csv_robusto(archivo_csv)
+                        try:
+                            df, encoding_usado, delimiter_usado = leer_csv(archivo_csv)
+                        except Exception as e:
+                            st.error(f"❌ No se pudo leer el archivo: {e}")
+                            return
                     
-                    if df is None:
-                        st.error("❌ No se pudo leer el archivo con ningún formato estándar.")
+                    if len(df.columns) < 2 or df.notna().sum().sum() == 0:
+                        st.error(f"❌ No se pudo leer el archivo: se detectó el delimitador '{delimiter_usado}' "
+                                 f"pero no hay al menos dos columnas con datos.")
                         return
                     
-                    delimiter_usado, encoding_usado = config
                     st.success(f"✅ Archivo leído correctamente (Delimitador: '{delimiter_usado}', Encoding: {encoding_usado})")
                     
                     # Limpiar DataFrame
@@ -2047,68 +3043,16 @@ def pagina_gestionar_proveedores():
                 if confirmar_importacion:
                     if st.button("🚀 Importar Proveedores", type="primary"):
                         try:
-                            insertados = 0
-                            duplicados = 0
-                            errores = 0
-                            errores_detalle = []
-                            
-                            progress_bar = st.progress(0)
-                            status_text = st.empty()
-                            
-                            total_filas = len(df)
-                            
-                            for index, row in df.iterrows():
-                                try:
-                                    progress = (index + 1) / total_filas
-                                    progress_bar.progress(progress)
-                                    status_text.text(f'Procesando fila {index + 1} de {total_filas}...')
-                                    
-                                    ruc = str(row[col_ruc]).strip()
-                                    razon_social = str(row[col_razon]).strip()
-                                    direccion = str(row[col_direccion]).strip() if col_direccion != "No mapear" and pd.notna(row[col_direccion]) else None
-                                    correo = str(row[col_correo]).strip() if col_correo != "No mapear" and pd.notna(row[col_correo]) else None
-                                    
-                                    if not ruc or not razon_social or ruc.lower() == "nan" or razon_social.lower() == "nan":
-                                        errores += 1
-                                        errores_detalle.append(f"Fila {index + 1}: RUC o Razón Social vacíos")
-                                        continue
-                                    
-                                    with engine.connect() as conn:
-                                        trans = conn.begin()
-                                        try:
-                                            query = text("""
-                                                INSERT INTO reactivos_py.proveedores (ruc, razon_social, direccion, correo_electronico)
-                                                VALUES (:ruc, :razon_social, :direccion, :correo)
-                                                ON CONFLICT (ruc) DO NOTHING
-                                                RETURNING id
-                                            """)
-                                            
-                                            result = conn.execute(query, {
-                                                'ruc': ruc,
-                                                'razon_social': razon_social,
-                                                'direccion': direccion,
-                                                'correo': correo
-                                            })
-                                            
-                                            if result.rowcount > 0:
-                                                trans.commit()
-                                                insertados += 1
-                                            else:
-                                                trans.rollback()
-                                                duplicados += 1
-                                                errores_detalle.append(f"Fila {index + 1}: RUC {ruc} ya existe")
-                                            
-                                        except Exception as e:
-                                            trans.rollback()
-                                            errores += 1
-                                            errores_detalle.append(f"Fila {index + 1}: Error - {str(e)}")
-                                
-                                except Exception as e:
-                                    errores += 1
-                                    errores_detalle.append(f"Fila {index + 1}: Error general - {str(e)}")
+                            with st.spinner(f"Importando {len(df):,} filas..."):
+                                success, message, resultado = importar_proveedores(
+                                    df, col_ruc, col_razon,
+                                    col_direccion if col_direccion != "No mapear" else None,
+                                    col_correo if col_correo != "No mapear" else None
+                                )
                             
-                            progress_bar.empty()
-                            status_text.empty()
+                            insertados = resultado['insertados']
+                            duplicados = resultado['duplicados']
+                            errores = resultado['errores']
                             
                             col1, col2, col3 = st.columns(3)
                             with col1:
@@ -2118,8 +3062,14 @@ def pagina_gestionar_proveedores():
                             with col3:
                                 st.metric("❌ Errores", errores)
                             
-                            if insertados > 0:
-                                st.success(f"✅ Importación completada: {insertados} nuevos registros")
+                            if resultado['errores_detalle']:
+                                with st.expander(f"Ver detalle de filas no importadas ({len(resultado['errores_detalle']):,})"):
+                                    st.text("\n".join(resultado['errores_detalle'][:1000]))
+                            
+                            if not success:
+                                st.error(message)
+                            elif insertados > 0:
+                                st.success(f"✅ {message}")
                                 registrar_actividad(
                                     accion="IMPORT",
                                     modulo="PROVEEDORES",
@@ -2193,6 +3143,7 @@ def eliminar_proveedor_bulk():
                                 query_delete = text("DELETE FROM reactivos_py.proveedores WHERE id = :id")
                                 conn.execute(query_delete, {'id': proveedor['id']})
                                 eliminados += 1
+                            invalidar_cache('proveedores')
                             
                             # Registrar actividad masiva
                             registrar_actividad(
@@ -2475,19 +3426,44 @@ def pagina_historial_actividades():
         with col5:
             fecha_hasta = st.date_input("Fecha hasta:", value=None)
         with col6:
-            limite = st.number_input("Máximo registros:", min_value=10, max_value=1000, value=100, step=10)
+            limite = st.number_input("Registros por página:", min_value=10, max_value=1000,
+                                     value=TAMANO_PAGINA_HISTORIAL, step=10)
     
     if st.button("🔍 Aplicar Filtros"):
         st.rerun()
     
-    actividades = obtener_historial_actividades(
-        limite=limite,
-        usuario_id=usuario_filtro,
-        modulo=modulo_filtro,
-        accion=accion_filtro,
-        fecha_desde=fecha_desde,
-        fecha_hasta=fecha_hasta
-    )
+    filtros = {
+        'usuario_id': usuario_filtro,
+        'modulo': modulo_filtro,
+        'accion': accion_filtro,
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta
+    }
+    
+    # Al cambiar los filtros o el tamaño de página se vuelve a la primera página
+    if st.session_state.get('historial_filtros') != (filtros, limite):
+        st.session_state.historial_filtros = (filtros, limite)
+        st.session_state.historial_cursores = [None]
+    
+    cursores = st.session_state.historial_cursores
+    
+    # Se pide una actividad de más para saber si hay página siguiente
+    actividades = obtener_historial_actividades(limite=limite + 1, despues_de=cursores[-1], **filtros)
+    hay_siguiente = len(actividades) > limite
+    actividades = actividades[:limite]
+    
+    col_p1, col_p2, col_p3 = st.columns([1, 2, 1])
+    with col_p1:
+        if st.button("◀ Anterior", disabled=len(cursores) == 1):
+            cursores.pop()
+            st.rerun()
+    with col_p2:
+        st.caption(f"Página {len(cursores)}")
+    with col_p3:
+        if st.button("Siguiente ▶", disabled=not hay_siguiente):
+            ultima = actividades[-1]
+            cursores.append((ultima['fecha_hora'], ultima['id']))
+            st.rerun()
     
     if actividades:
         st.subheader(f"📊 Mostrando {len(actividades)} actividades")
@@ -2533,6 +3509,8 @@ def pagina_historial_actividades():
         
         if actividad_seleccionada is not None:
             actividad = actividades[actividad_seleccionada]
+            # Los campos JSON se leen solo para la actividad seleccionada
+            actividad.update(obtener_detalle_actividad(actividad['id'], actividad['fecha_hora']))
             
             col1, col2 = st.columns(2)
             
@@ -2563,47 +3541,39 @@ def pagina_historial_actividades():
                         st.json(actividad['valores_nuevos'])
         
         st.subheader("📤 Exportar Historial")
+        st.caption("Exporta todas las actividades que cumplen los filtros (no solo esta página).")
         if st.button("Descargar Historial como CSV"):
-            csv = df_display.to_csv(index=False)
-            st.download_button(
-                label="📥 Descargar CSV",
-                data=csv.encode('utf-8'),
-                file_name=f"historial_actividades_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
+            with st.spinner("Exportando historial..."):
+                ruta, message = exportar_historial_csv_gz(**filtros)
+            if ruta:
+                st.success(message)
+                try:
+                    with open(ruta, 'rb') as archivo:
+                        st.download_button(
+                            label="📥 Descargar CSV (gzip)",
+                            data=archivo,
+                            file_name=f"historial_actividades_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv.gz",
+                            mime="application/gzip"
+                        )
+                finally:
+                    os.remove(ruta)
+            else:
+                st.error(message)
     else:
         st.info("No se encontraron actividades con los filtros aplicados.")
     
     # Estadísticas del sistema
     with st.expander("📊 Estadísticas del Sistema"):
         try:
-            with engine.connect() as conn:
-                # Actividades por usuario
-                query = text("""
-                    SELECT usuario_nombre, COUNT(*) as total
-                    FROM reactivos_py.auditoria
-                    GROUP BY usuario_nombre
-                    ORDER BY total DESC
-                    LIMIT 10
-                """)
-                result = conn.execute(query)
-                
-                st.write("**Top 10 Usuarios más Activos:**")
-                for row in result:
-                    st.write(f"• {row[0]}: {row[1]} actividades")
-                
-                # Actividades por módulo
-                query = text("""
-                    SELECT modulo, COUNT(*) as total
-                    FROM reactivos_py.auditoria
-                    GROUP BY modulo
-                    ORDER BY total DESC
-                """)
-                result = conn.execute(query)
-                
-                st.write("**Actividades por Módulo:**")
-                for row in result:
-                    st.write(f"• {row[0]}: {row[1]} actividades")
+            por_usuario, por_modulo = obtener_estadisticas_auditoria()
+            
+            st.write("**Top 10 Usuarios más Activos:**")
+            for usuario, total in por_usuario:
+                st.write(f"• {usuario}: {total} actividades")
+            
+            st.write("**Actividades por Módulo:**")
+            for modulo, total in por_modulo:
+                st.write(f"• {modulo}: {total} actividades")
                     
         except Exception as e:
             st.error(f"Error obteniendo estadísticas: {e}")
@@ -2770,73 +3740,418 @@ def obtener_datos_items(esquema, servicio=None):
         st.error(f"Error obteniendo datos de items: {e}")
         return []
 
-def obtener_servicios_beneficiarios(esquema):
-    """Obtiene la lista de servicios beneficiarios para un esquema"""
-    try:
-        with engine.connect() as conn:
-            query = text(f"""
-                SELECT DISTINCT "SERVICIO BENEFICIARIO"
-                FROM "{esquema}"."ejecucion_por_zonas"
-                WHERE "SERVICIO BENEFICIARIO" IS NOT NULL
-                ORDER BY "SERVICIO BENEFICIARIO"
-            """)
-            result = conn.execute(query)
-            
-            servicios = [row[0] for row in result]
-            return servicios
-    except Exception as e:
-        st.error(f"Error obteniendo servicios beneficiarios: {e}")
-        return []
+@st.cache_data(ttl=TTL_CACHE_CONSULTAS, show_spinner=False)
+def _consultar_servicios_beneficiarios(esquema):
+    """Consulta (cacheada por esquema) de los servicios beneficiarios"""
+    with engine.connect() as conn:
+        query = text(f"""
+            SELECT DISTINCT "SERVICIO BENEFICIARIO"
+            FROM "{esquema}"."ejecucion_por_zonas"
+            WHERE "SERVICIO BENEFICIARIO" IS NOT NULL
+            ORDER BY "SERVICIO BENEFICIARIO"
+        """)
+        result = conn.execute(query)
+        
+        return [row[0] for row in result]
+
+def obtener_servicios_beneficiarios(esquema):
+    """Obtiene la lista de servicios beneficiarios para un esquema"""
+    try:
+        return list(_consultar_servicios_beneficiarios(esquema))
+    except Exception as e:
+        st.error(f"Error obteniendo servicios beneficiarios: {e}")
+        return []
+
+@st.cache_data(ttl=TTL_CACHE_CONSULTAS, show_spinner=False)
+def _consultar_resumen_ordenes():
+    """Consulta (cacheada) del resumen de órdenes por esquema, servicio, mes y estado"""
+    with engine.connect() as conn:
+        query = text("""
+            SELECT esquema, servicio_beneficiario, anio, mes, estado, cantidad_ordenes, monto_total
+            FROM reactivos_py.resumen_ordenes
+            WHERE cantidad_ordenes <> 0
+        """)
+        return pd.read_sql(query, conn)
+
+def obtener_resumen_ordenes():
+    """Devuelve el resumen de órdenes de compra como DataFrame"""
+    try:
+        return _consultar_resumen_ordenes().copy()
+    except Exception as e:
+        st.error(f"Error obteniendo resumen de órdenes: {e}")
+        return pd.DataFrame(columns=['esquema', 'servicio_beneficiario', 'anio', 'mes', 'estado',
+                                     'cantidad_ordenes', 'monto_total'])
+
+@st.cache_data(ttl=TTL_CACHE_EJECUCION, show_spinner=False)
+def _consultar_ejecucion_licitaciones():
+    """Consulta (cacheada) de los totales de ejecución de todas las licitaciones"""
+    with engine.connect() as conn:
+        return consultar_ejecucion(conn)
+
+def obtener_ejecucion_licitaciones():
+    """Devuelve (por licitación, por servicio) con cantidades, saldo, monto y porcentaje emitido"""
+    try:
+        por_licitacion, por_servicio = _consultar_ejecucion_licitaciones()
+        return por_licitacion.copy(), por_servicio.copy()
+    except Exception as e:
+        st.error(f"Error obteniendo la ejecución de las licitaciones: {e}")
+        return pd.DataFrame(), pd.DataFrame()
+
+def acumular_resumen_ordenes(conn, esquema, servicio_beneficiario, fecha_emision, estado, ordenes, monto):
+    """Suma (o resta, con valores negativos) órdenes y monto al resumen del mes y estado indicados"""
+    conn.execute(text("""
+        INSERT INTO reactivos_py.resumen_ordenes
+        (esquema, servicio_beneficiario, anio, mes, estado, cantidad_ordenes, monto_total)
+        VALUES (:esquema, :servicio, :anio, :mes, :estado, :ordenes, :monto)
+        ON CONFLICT (esquema, servicio_beneficiario, anio, mes, estado) DO UPDATE
+        SET cantidad_ordenes = resumen_ordenes.cantidad_ordenes + EXCLUDED.cantidad_ordenes,
+            monto_total = resumen_ordenes.monto_total + EXCLUDED.monto_total
+    """), {
+        'esquema': esquema,
+        'servicio': servicio_beneficiario or '',
+        'anio': fecha_emision.year,
+        'mes': fecha_emision.month,
+        'estado': estado,
+        'ordenes': ordenes,
+        'monto': monto
+    })
+
+def formatear_numero_oc(conn, esquema, numero, year, month):
+    """Da formato NNN/YYYY-LL/MM al correlativo de una orden (LL es el número de llamado)"""
+    num_llamado = conn.execute(text("""
+        SELECT numero_llamado
+        FROM reactivos_py.catalogo_licitaciones
+        WHERE esquema = :esquema AND numero_llamado IS NOT NULL
+        LIMIT 1
+    """), {'esquema': esquema}).scalar()
+    
+    if num_llamado:
+        return f"{numero:03d}/{year}-{num_llamado}/{month:02d}"
+    # Formato alternativo si no hay datos de llamado
+    return f"{numero:03d}/{year}-{month:02d}"
+
+def obtener_proximo_numero_oc(esquema):
+    """Muestra el número que probablemente recibirá la próxima orden (no lo reserva)"""
+    try:
+        year = datetime.now().year
+        month = datetime.now().month
+        
+        with engine.connect() as conn:
+            ultimo = conn.execute(text("""
+                SELECT ultimo_numero
+                FROM reactivos_py.contadores_orden_compra
+                WHERE esquema = :esquema AND anio = :year AND mes = :month
+            """), {'esquema': esquema, 'year': year, 'month': month}).scalar()
+            
+            return formatear_numero_oc(conn, esquema, (ultimo or 0) + 1, year, month)
+            
+    except Exception as e:
+        st.error(f"Error generando número de orden de compra: {e}")
+        return f"{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+def asignar_numero_oc(conn, esquema):
+    """
+    Reserva el siguiente número de orden del mes dentro de la transacción de emisión
+    
+    El contador (esquema, año, mes) se incrementa con un único INSERT ... ON CONFLICT
+    DO UPDATE ... RETURNING; la fila queda bloqueada hasta el commit, así dos
+    emisiones simultáneas nunca reciben el mismo número.
+    """
+    year = datetime.now().year
+    month = datetime.now().month
+    
+    numero = conn.execute(text("""
+        INSERT INTO reactivos_py.contadores_orden_compra (esquema, anio, mes, ultimo_numero)
+        VALUES (:esquema, :year, :month, 1)
+        ON CONFLICT (esquema, anio, mes) DO UPDATE
+        SET ultimo_numero = reactivos_py.contadores_orden_compra.ultimo_numero + 1
+        RETURNING ultimo_numero
+    """), {'esquema': esquema, 'year': year, 'month': month}).scalar()
+    
+    return formatear_numero_oc(conn, esquema, numero, year, month)
+
+def registrar_numero_manual_oc(conn, esquema, numero_orden):
+    """
+    Adelanta el contador del mes si un número cargado a mano tiene el formato automático
+    
+    Así la numeración automática nunca vuelve a entregar un número ya usado a mano.
+    Debe llamarse dentro de la transacción de emisión.
+    """
+    coincidencia = PATRON_NUMERO_OC.match(numero_orden.strip())
+    if not coincidencia:
+        return
+    
+    numero, year, month = (int(grupo) for grupo in coincidencia.groups())
+    if not 1 <= month <= 12:
+        return
+    
+    conn.execute(text("""
+        INSERT INTO reactivos_py.contadores_orden_compra (esquema, anio, mes, ultimo_numero)
+        VALUES (:esquema, :year, :month, :numero)
+        ON CONFLICT (esquema, anio, mes) DO UPDATE
+        SET ultimo_numero = GREATEST(reactivos_py.contadores_orden_compra.ultimo_numero, EXCLUDED.ultimo_numero)
+    """), {'esquema': esquema, 'year': year, 'month': month, 'numero': numero})
+
+def construir_values(filas, columnas, tipos=None):
+    """
+    Arma una lista VALUES (...), (...) con parámetros numerados para enviar varias filas en una sola sentencia
+    
+    Args:
+        filas (list): Diccionarios con los valores de cada fila
+        columnas (list): Columnas a incluir, en orden
+        tipos (dict): Tipo SQL para castear las columnas que lo necesiten (p. ej. en UPDATE ... FROM)
+    
+    Returns:
+        tuple: (texto VALUES, diccionario de parámetros)
+    """
+    tipos = tipos or {}
+    parametros = {}
+    tuplas = []
+    for i, fila in enumerate(filas):
+        marcadores = []
+        for columna in columnas:
+            nombre = f"{columna}_{i}"
+            parametros[nombre] = fila[columna]
+            if columna in tipos:
+                marcadores.append(f"CAST(:{nombre} AS {tipos[columna]})")
+            else:
+                marcadores.append(f":{nombre}")
+        tuplas.append(f"({', '.join(marcadores)})")
+    return "VALUES " + ",\n".join(tuplas), parametros
+
+def texto_clave(valor):
+    """Representa un lote/ítem como texto (1.0 -> '1') para compararlo con columnas de cualquier tipo"""
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    if isinstance(valor, Decimal) and valor.is_finite() and valor == valor.to_integral_value():
+        return str(int(valor))
+    return str(valor)
+
+def bloquear_y_verificar_saldos(conn, esquema, servicio_beneficiario, valores, parametros, solicitados):
+    """
+    Bloquea (FOR UPDATE) las filas de saldo de los lotes/ítems a emitir y verifica que el saldo alcance
+    
+    Las filas se bloquean siempre en el mismo orden (lote, ítem) para que emisiones
+    simultáneas se esperen entre sí en lugar de bloquearse mutuamente. El bloqueo
+    dura hasta el commit de la emisión. Cada (lote, ítem) de solicitados debe tener
+    exactamente una fila de saldo para el servicio.
+    
+    Returns:
+        dict: (lote, ítem) -> cantidad emitida antes de esta orden en el servicio
+    """
+    filas = conn.execute(text(f"""
+        SELECT z."LOTE"::text, z."ITEM"::text, v.cantidad,
+               COALESCE(z."CANTIDAD EMITIDA", 0),
+               COALESCE(z."REDISTRIBUCION (CANTIDAD MAXIMA)", 0) - COALESCE(z."CANTIDAD EMITIDA", 0)
+        FROM "{esquema}"."ejecucion_por_zonas" AS z
+        JOIN ({valores}) AS v (lote, item, cantidad)
+          ON z."LOTE"::text = v.lote AND z."ITEM"::text = v.item
+        WHERE z."SERVICIO BENEFICIARIO" = :servicio
+        ORDER BY z."LOTE"::text, z."ITEM"::text
+        FOR UPDATE OF z
+    """), {**parametros, 'servicio': servicio_beneficiario}).fetchall()
+    
+    # El saldo global del lote/ítem también se modifica: bloquearlo en el mismo orden
+    conn.execute(text(f"""
+        SELECT 1
+        FROM "{esquema}"."ejecucion_general" AS g
+        JOIN ({valores}) AS v (lote, item, cantidad)
+          ON g."LOTE"::text = v.lote AND g."ITEM"::text = v.item
+        ORDER BY g."LOTE"::text, g."ITEM"::text
+        FOR UPDATE OF g
+    """), parametros)
+    
+    encontrados = [(lote, numero_item) for lote, numero_item, *_ in filas]
+    faltantes = sorted(set(solicitados) - set(encontrados))
+    if faltantes:
+        detalle = ', '.join(f"lote {lote} ítem {numero_item}" for lote, numero_item in faltantes)
+        raise Exception(f"No hay saldo registrado para el servicio '{servicio_beneficiario}' en: {detalle}")
+    if len(filas) != len(solicitados):
+        raise Exception(
+            f"ejecucion_por_zonas tiene filas repetidas para el servicio '{servicio_beneficiario}'; "
+            f"no se puede verificar el saldo"
+        )
+    
+    emitidas_anteriores = {}
+    for lote, numero_item, cantidad, emitida, saldo in filas:
+        if cantidad > saldo:
+            raise Exception(
+                f"Saldo insuficiente para lote {lote} ítem {numero_item}: "
+                f"disponible {saldo:,.2f}, solicitado {cantidad:,.2f}"
+            )
+        emitidas_anteriores[(lote, numero_item)] = emitida
+    
+    return emitidas_anteriores
+
+def registrar_movimientos_saldo(conn, esquema, servicio_beneficiario, orden_id, filas_cantidades, emitidas_anteriores):
+    """Agrega al libro de saldos un movimiento de emisión por lote/ítem de la orden"""
+    filas = [{
+        'esquema': esquema,
+        'lote': fila['lote'],
+        'item': fila['item'],
+        'servicio': servicio_beneficiario,
+        'cantidad': fila['cantidad'],
+        'emitida_anterior': emitidas_anteriores.get((fila['lote'], fila['item'])),
+        'orden_id': orden_id,
+        'usuario_id': st.session_state.user_id
+    } for fila in filas_cantidades]
+    
+    valores, parametros = construir_values(filas, [
+        'esquema', 'lote', 'item', 'servicio', 'cantidad', 'emitida_anterior', 'orden_id', 'usuario_id'
+    ])
+    conn.execute(text(f"""
+        INSERT INTO reactivos_py.movimientos_saldo
+        (esquema, lote, item, servicio_beneficiario, cantidad, emitida_anterior, orden_compra_id, usuario_id)
+        {valores}
+    """), parametros)
 
-def obtener_proximo_numero_oc(esquema):
-    """Genera un número para la próxima orden de compra"""
+def aplicar_libro_saldos(conn, esquema):
+    """
+    Reescribe cantidad emitida, saldo y porcentaje de ejecucion_por_zonas a partir del libro de saldos
+    
+    Para cada lote/ítem/servicio con movimientos, la cantidad emitida es la que tenía
+    antes del primer movimiento registrado más la suma de todos los movimientos.
+    
+    Antes de leer el libro se bloquea la tabla (modo EXCLUSIVE, que también espera a
+    las emisiones y anulaciones con filas tomadas FOR UPDATE): así la lectura ve todos
+    los movimientos confirmados y nadie modifica los saldos hasta el commit.
+    
+    Returns:
+        int: Filas actualizadas
+    """
+    conn.execute(text(f'LOCK TABLE "{esquema}"."ejecucion_por_zonas" IN EXCLUSIVE MODE'))
+    
+    result = conn.execute(text(f"""
+        WITH libro AS (
+            SELECT lote, item, servicio_beneficiario,
+                   (ARRAY_AGG(emitida_anterior ORDER BY id))[1] AS emitida_inicial,
+                   SUM(cantidad) AS movimientos
+            FROM reactivos_py.movimientos_saldo
+            WHERE esquema = :esquema
+            GROUP BY lote, item, servicio_beneficiario
+        )
+        UPDATE "{esquema}"."ejecucion_por_zonas" AS z
+        SET "CANTIDAD EMITIDA" = COALESCE(l.emitida_inicial, 0) + l.movimientos,
+            "SALDO A EMITIR" = z."REDISTRIBUCION (CANTIDAD MAXIMA)" - (COALESCE(l.emitida_inicial, 0) + l.movimientos),
+            "PORCENTAJE EMITIDO POR SERVICIO SANITARIO" =
+                ((COALESCE(l.emitida_inicial, 0) + l.movimientos) / z."REDISTRIBUCION (CANTIDAD MAXIMA)") * 100
+        FROM libro AS l
+        WHERE z."LOTE"::text = l.lote
+        AND z."ITEM"::text = l.item
+        AND z."SERVICIO BENEFICIARIO" = l.servicio_beneficiario
+    """), {'esquema': esquema})
+    return result.rowcount
+
+def recalcular_saldos(esquema):
+    """
+    Recalcula los saldos de ejecucion_por_zonas de una licitación a partir del libro de saldos
+    
+    Returns:
+        tuple: (success, message)
+    """
     try:
-        year = datetime.now().year
-        month = datetime.now().month
-        
         with engine.connect() as conn:
-            # Consultar el número más alto actual
-            query = text("""
-                SELECT MAX(CAST(SUBSTRING(numero_orden FROM '^\\d+') AS INTEGER))
-                FROM ordenes_compra 
-                WHERE esquema = :esquema 
-                AND EXTRACT(YEAR FROM fecha_emision) = :year
-                AND EXTRACT(MONTH FROM fecha_emision) = :month
-            """)
-            
-            result = conn.execute(query, {'esquema': esquema, 'year': year, 'month': month})
-            max_num = result.scalar()
-            
-            if max_num is None:
-                next_num = 1
-            else:
-                next_num = max_num + 1
-            
-            # Obtener datos del llamado para el número de OC
-            query_llamado = text(f"""
-                SELECT "NUMERO DE LLAMADO", "AÑO DEL LLAMADO"
-                FROM "{esquema}"."llamado"
-                LIMIT 1
-            """)
-            
-            result_llamado = conn.execute(query_llamado)
-            llamado_data = result_llamado.fetchone()
-            
-            if llamado_data:
-                num_llamado = llamado_data[0]
-                anho_llamado = llamado_data[1]
-                
-                # Formato: NNN/YYYY-LL/MM (donde NNN es correlativo, YYYY año actual, LL es número de llamado, MM es mes)
-                numero_oc = f"{next_num:03d}/{year}-{num_llamado}/{month:02d}"
-                return numero_oc
-            else:
-                # Formato alternativo si no hay datos de llamado
-                numero_oc = f"{next_num:03d}/{year}-{month:02d}"
-                return numero_oc
-            
+            trans = conn.begin()
+            try:
+                filas = aplicar_libro_saldos(conn, esquema)
+                trans.commit()
+                invalidar_cache('ejecucion')
+                return True, f"Saldos recalculados: {filas} filas actualizadas"
+            except Exception as e:
+                trans.rollback()
+                raise e
     except Exception as e:
-        st.error(f"Error generando número de orden de compra: {e}")
-        return f"{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        return False, f"Error al recalcular saldos: {e}"
+
+def devolver_saldos_orden(conn, esquema, orden_id):
+    """
+    Devuelve a los saldos lo emitido por una orden que se anula
+    
+    Bloquea las filas de saldo de la orden en el mismo orden (lote, ítem) que
+    bloquear_y_verificar_saldos, registra en el libro un movimiento negativo por
+    lote/ítem/servicio y descuenta esas cantidades de ejecucion_por_zonas y de
+    ejecucion_general. Los saldos se modifican con deltas sobre las filas bloqueadas,
+    nunca reescribiéndolos desde el libro, para no pisar emisiones simultáneas. Las
+    órdenes emitidas antes de que existiera el libro no tienen movimientos y no
+    devuelven saldo.
+    
+    Returns:
+        int: Lotes/ítems/servicio devueltos
+    """
+    movimientos = conn.execute(text("""
+        SELECT lote, item, servicio_beneficiario, SUM(cantidad)
+        FROM reactivos_py.movimientos_saldo
+        WHERE orden_compra_id = :orden_id
+        GROUP BY lote, item, servicio_beneficiario
+        HAVING SUM(cantidad) <> 0
+        ORDER BY lote, item
+    """), {'orden_id': orden_id}).fetchall()
+    
+    if not movimientos:
+        return 0
+    
+    valores, parametros = construir_values(
+        [{'lote': lote, 'item': numero_item, 'servicio': servicio, 'cantidad': cantidad}
+         for lote, numero_item, servicio, cantidad in movimientos],
+        ['lote', 'item', 'servicio', 'cantidad'],
+        tipos={'lote': 'TEXT', 'item': 'TEXT', 'servicio': 'TEXT', 'cantidad': 'NUMERIC'}
+    )
+    
+    # Bloquear primero las filas por zona y después las generales, en orden (lote, ítem)
+    conn.execute(text(f"""
+        SELECT 1
+        FROM "{esquema}"."ejecucion_por_zonas" AS z
+        JOIN ({valores}) AS v (lote, item, servicio, cantidad)
+          ON z."LOTE"::text = v.lote AND z."ITEM"::text = v.item
+         AND z."SERVICIO BENEFICIARIO" = v.servicio
+        ORDER BY z."LOTE"::text, z."ITEM"::text
+        FOR UPDATE OF z
+    """), parametros)
+    conn.execute(text(f"""
+        SELECT 1
+        FROM "{esquema}"."ejecucion_general" AS g
+        JOIN ({valores}) AS v (lote, item, servicio, cantidad)
+          ON g."LOTE"::text = v.lote AND g."ITEM"::text = v.item
+        ORDER BY g."LOTE"::text, g."ITEM"::text
+        FOR UPDATE OF g
+    """), parametros)
+    
+    conn.execute(text(f"""
+        INSERT INTO reactivos_py.movimientos_saldo
+        (esquema, lote, item, servicio_beneficiario, cantidad, orden_compra_id, usuario_id)
+        SELECT CAST(:esquema AS text), v.lote, v.item, v.servicio, -v.cantidad, :orden_id, :usuario_id
+        FROM ({valores}) AS v (lote, item, servicio, cantidad)
+    """), {**parametros, 'esquema': esquema, 'orden_id': orden_id, 'usuario_id': st.session_state.user_id})
+    
+    conn.execute(text(f"""
+        UPDATE "{esquema}"."ejecucion_por_zonas" AS z
+        SET "CANTIDAD EMITIDA" = z."CANTIDAD EMITIDA" - v.cantidad,
+            "SALDO A EMITIR" = z."REDISTRIBUCION (CANTIDAD MAXIMA)" - (z."CANTIDAD EMITIDA" - v.cantidad),
+            "PORCENTAJE EMITIDO POR SERVICIO SANITARIO" =
+                ((z."CANTIDAD EMITIDA" - v.cantidad) / z."REDISTRIBUCION (CANTIDAD MAXIMA)") * 100
+        FROM ({valores}) AS v (lote, item, servicio, cantidad)
+        WHERE z."LOTE"::text = v.lote
+        AND z."ITEM"::text = v.item
+        AND z."SERVICIO BENEFICIARIO" = v.servicio
+    """), parametros)
+    
+    # En la tabla general se descuenta la suma de todos los servicios del lote/ítem
+    conn.execute(text(f"""
+        UPDATE "{esquema}"."ejecucion_general" AS g
+        SET "CANTIDAD EMITIDA" = g."CANTIDAD EMITIDA" - v.cantidad,
+            "SALDO A EMITIR" = g."REDISTRIBUCION (CANTIDAD MAXIMA)" - (g."CANTIDAD EMITIDA" - v.cantidad),
+            "PORCENTAJE EMITIDO" =
+                ((g."CANTIDAD EMITIDA" - v.cantidad) / g."REDISTRIBUCION (CANTIDAD MAXIMA)") * 100
+        FROM (
+            SELECT lote, item, SUM(cantidad) AS cantidad
+            FROM ({valores}) AS v (lote, item, servicio, cantidad)
+            GROUP BY lote, item
+        ) AS v
+        WHERE g."LOTE"::text = v.lote
+        AND g."ITEM"::text = v.item
+    """), parametros)
+    
+    return len(movimientos)
 
 def crear_orden_compra(esquema, numero_orden, fecha_emision, servicio_beneficiario, simese, items):
     """
@@ -2844,7 +4159,7 @@ def crear_orden_compra(esquema, numero_orden, fecha_emision, servicio_beneficiar
     
     Args:
         esquema (str): Esquema de la licitación
-        numero_orden (str): Número de la orden de compra
+        numero_orden (str): Número de la orden de compra; si es None se asigna automáticamente
         fecha_emision (datetime): Fecha de emisión
         servicio_beneficiario (str): Servicio beneficiario
         simese (str): Número de SIMESE
@@ -2858,6 +4173,12 @@ def crear_orden_compra(esquema, numero_orden, fecha_emision, servicio_beneficiar
             # Iniciar transacción
             trans = conn.begin()
             try:
+                # Reservar el número de orden en la misma transacción
+                if not numero_orden:
+                    numero_orden = asignar_numero_oc(conn, esquema)
+                else:
+                    registrar_numero_manual_oc(conn, esquema, numero_orden)
+                
                 # Insertar cabecera de orden de compra
                 query = text("""
                     INSERT INTO ordenes_compra 
@@ -2877,115 +4198,139 @@ def crear_orden_compra(esquema, numero_orden, fecha_emision, servicio_beneficiar
                 
                 orden_id = result.scalar()
                 
-                # Insertar items de la orden
-                for item in items:
-                    monto_total = item['cantidad'] * item['precio_unitario']
-                    
-                    query_item = text("""
-                        INSERT INTO items_orden_compra
-                        (orden_compra_id, lote, item, codigo_insumo, codigo_servicio, 
-                         descripcion, cantidad, unidad_medida, precio_unitario, monto_total, observaciones)
-                        VALUES
-                        (:orden_id, :lote, :item, :codigo_insumo, :codigo_servicio,
-                         :descripcion, :cantidad, :unidad_medida, :precio_unitario, :monto_total, :observaciones)
-                    """)
-                    
-                    conn.execute(query_item, {
-                        'orden_id': orden_id,
-                        'lote': item['lote'],
-                        'item': item['item'],
-                        'codigo_insumo': item['codigo_insumo'],
-                        'codigo_servicio': item['codigo_servicio'],
-                        'descripcion': item['descripcion'],
-                        'cantidad': item['cantidad'],
-                        'unidad_medida': item['unidad_medida'],
-                        'precio_unitario': item['precio_unitario'],
-                        'monto_total': monto_total,
-                        'observaciones': item.get('observaciones', '')
-                    })
-                    
-                    # Actualizar cantidad emitida en la tabla de ejecución por zonas
-                    query_update = text(f"""
-                        UPDATE "{esquema}"."ejecucion_por_zonas"
-                        SET "CANTIDAD EMITIDA" = "CANTIDAD EMITIDA" + :cantidad,
-                            "SALDO A EMITIR" = "REDISTRIBUCION (CANTIDAD MAXIMA)" - ("CANTIDAD EMITIDA" + :cantidad),
-                            "PORCENTAJE EMITIDO POR SERVICIO SANITARIO" = 
-                                (("CANTIDAD EMITIDA" + :cantidad) / "REDISTRIBUCION (CANTIDAD MAXIMA)") * 100
-                        WHERE "LOTE" = :lote 
-                        AND "ITEM" = :item
-                        AND "SERVICIO BENEFICIARIO" = :servicio
-                    """)
-                    
-                    conn.execute(query_update, {
-                        'cantidad': item['cantidad'],
-                        'lote': item['lote'],
-                        'item': item['item'],
-                        'servicio': servicio_beneficiario
-                    })
-                    
-                    # También actualizar la tabla de ejecución general
-                    query_update_general = text(f"""
-                        UPDATE "{esquema}"."ejecucion_general"
-                        SET "CANTIDAD EMITIDA" = "CANTIDAD EMITIDA" + :cantidad,
-                            "SALDO A EMITIR" = "REDISTRIBUCION (CANTIDAD MAXIMA)" - ("CANTIDAD EMITIDA" + :cantidad),
-                            "PORCENTAJE EMITIDO" = 
-                                (("CANTIDAD EMITIDA" + :cantidad) / "REDISTRIBUCION (CANTIDAD MAXIMA)") * 100
-                        WHERE "LOTE" = :lote 
-                        AND "ITEM" = :item
-                    """)
-                    
-                    conn.execute(query_update_general, {
-                        'cantidad': item['cantidad'],
-                        'lote': item['lote'],
-                        'item': item['item']
-                    })
+                # Insertar todos los items de la orden en una sola sentencia
+                filas_items = [{
+                    'orden_id': orden_id,
+                    'lote': item['lote'],
+                    'item': item['item'],
+                    'codigo_insumo': item['codigo_insumo'],
+                    'codigo_servicio': item['codigo_servicio'],
+                    'descripcion': item['descripcion'],
+                    'cantidad': item['cantidad'],
+                    'unidad_medida': item['unidad_medida'],
+                    'precio_unitario': item['precio_unitario'],
+                    'monto_total': item['cantidad'] * item['precio_unitario'],
+                    'observaciones': item.get('observaciones', '')
+                } for item in items]
+                
+                valores, parametros = construir_values(filas_items, [
+                    'orden_id', 'lote', 'item', 'codigo_insumo', 'codigo_servicio', 'descripcion',
+                    'cantidad', 'unidad_medida', 'precio_unitario', 'monto_total', 'observaciones'
+                ])
+                query_items = text(f"""
+                    INSERT INTO items_orden_compra
+                    (orden_compra_id, lote, item, codigo_insumo, codigo_servicio, 
+                     descripcion, cantidad, unidad_medida, precio_unitario, monto_total, observaciones)
+                    {valores}
+                    RETURNING id
+                """)
+                ids_items = conn.execute(query_items, parametros).fetchall()
+                if len(ids_items) != len(items):
+                    raise Exception("No se pudieron registrar todos los items de la orden")
+                
+                # Sumar la orden al resumen del dashboard
+                acumular_resumen_ordenes(
+                    conn, esquema, servicio_beneficiario, fecha_emision, 'Emitida',
+                    1, sum(fila['monto_total'] for fila in filas_items)
+                )
                 
-                # Actualizar también la tabla orden_de_compra del esquema
+                # Cantidades emitidas por lote/ítem (un mismo lote/ítem puede venir en varias líneas)
+                cantidades = {}
                 for item in items:
-                    query_insert_oc = text(f"""
-                        INSERT INTO "{esquema}"."orden_de_compra"
-                        ("SIMESE (PEDIDO)", "N° ORDEN DE COMPRA", "FECHA DE EMISION",
-                        "CODIGO DE REACTIVOS / INSUMOS + CODIGO DE SERVICIO BENEFICIARIO",
-                        "CODIGO DE REACTIVOS / INSUMOS", "SERVICIO BENEFICIARIO",
-                        "LOTE", "ITEM", "CANTIDAD SOLICITADA", "UNIDAD DE MEDIDA",
-                        "DESCRIPCION DEL PRODUCTO // MARCA // PROCEDENCIA", "PRECIO UNITARIO",
-                        "MONTO EMITIDO", "Observaciones")
-                        VALUES
-                        (:simese, :numero_orden, :fecha_emision,
-                        :codigo_completo, :codigo_insumo, :servicio,
-                        :lote, :item, :cantidad, :unidad_medida,
-                        :descripcion, :precio_unitario,
-                        :monto_total, :observaciones)
-                    """)
-                    
-                    codigo_completo = f"{item['codigo_insumo']}{item['codigo_servicio']}" if item['codigo_servicio'] else item['codigo_insumo']
-                    
-                    conn.execute(query_insert_oc, {
-                        'simese': simese,
-                        'numero_orden': numero_orden,
-                        'fecha_emision': fecha_emision,
-                        'codigo_completo': codigo_completo,
-                        'codigo_insumo': item['codigo_insumo'],
-                        'servicio': servicio_beneficiario,
-                        'lote': item['lote'],
-                        'item': item['item'],
-                        'cantidad': item['cantidad'],
-                        'unidad_medida': item['unidad_medida'],
-                        'descripcion': item['descripcion'],
-                        'precio_unitario': item['precio_unitario'],
-                        'monto_total': item['cantidad'] * item['precio_unitario'],
-                        'observaciones': item.get('observaciones', '')
-                    })
+                    clave = (texto_clave(item['lote']), texto_clave(item['item']))
+                    cantidades[clave] = cantidades.get(clave, 0) + item['cantidad']
+                
+                filas_cantidades = [
+                    {'lote': lote, 'item': numero_item, 'cantidad': cantidad}
+                    for (lote, numero_item), cantidad in cantidades.items()
+                ]
+                valores, parametros = construir_values(
+                    filas_cantidades, ['lote', 'item', 'cantidad'],
+                    tipos={'lote': 'TEXT', 'item': 'TEXT', 'cantidad': 'NUMERIC'}
+                )
+                
+                # Bloquear las filas de saldo afectadas y verificar que alcance
+                emitidas_anteriores = bloquear_y_verificar_saldos(
+                    conn, esquema, servicio_beneficiario, valores, parametros, list(cantidades)
+                )
+                
+                # Registrar los movimientos en el libro de saldos
+                registrar_movimientos_saldo(
+                    conn, esquema, servicio_beneficiario, orden_id, filas_cantidades, emitidas_anteriores
+                )
+                
+                # Actualizar cantidad emitida en la tabla de ejecución por zonas
+                query_update = text(f"""
+                    UPDATE "{esquema}"."ejecucion_por_zonas" AS z
+                    SET "CANTIDAD EMITIDA" = z."CANTIDAD EMITIDA" + v.cantidad,
+                        "SALDO A EMITIR" = z."REDISTRIBUCION (CANTIDAD MAXIMA)" - (z."CANTIDAD EMITIDA" + v.cantidad),
+                        "PORCENTAJE EMITIDO POR SERVICIO SANITARIO" = 
+                            ((z."CANTIDAD EMITIDA" + v.cantidad) / z."REDISTRIBUCION (CANTIDAD MAXIMA)") * 100
+                    FROM ({valores}) AS v (lote, item, cantidad)
+                    WHERE z."LOTE"::text = v.lote 
+                    AND z."ITEM"::text = v.item
+                    AND z."SERVICIO BENEFICIARIO" = :servicio
+                """)
+                conn.execute(query_update, {**parametros, 'servicio': servicio_beneficiario})
+                
+                # También actualizar la tabla de ejecución general
+                query_update_general = text(f"""
+                    UPDATE "{esquema}"."ejecucion_general" AS g
+                    SET "CANTIDAD EMITIDA" = g."CANTIDAD EMITIDA" + v.cantidad,
+                        "SALDO A EMITIR" = g."REDISTRIBUCION (CANTIDAD MAXIMA)" - (g."CANTIDAD EMITIDA" + v.cantidad),
+                        "PORCENTAJE EMITIDO" = 
+                            ((g."CANTIDAD EMITIDA" + v.cantidad) / g."REDISTRIBUCION (CANTIDAD MAXIMA)") * 100
+                    FROM ({valores}) AS v (lote, item, cantidad)
+                    WHERE g."LOTE"::text = v.lote 
+                    AND g."ITEM"::text = v.item
+                """)
+                conn.execute(query_update_general, parametros)
+                
+                # Actualizar también la tabla orden_de_compra del esquema (todas las líneas juntas)
+                filas_oc = [{
+                    'simese': simese,
+                    'numero_orden': numero_orden,
+                    'fecha_emision': fecha_emision,
+                    'codigo_completo': f"{item['codigo_insumo']}{item['codigo_servicio']}" if item['codigo_servicio'] else item['codigo_insumo'],
+                    'codigo_insumo': item['codigo_insumo'],
+                    'servicio': servicio_beneficiario,
+                    'lote': item['lote'],
+                    'item': item['item'],
+                    'cantidad': item['cantidad'],
+                    'unidad_medida': item['unidad_medida'],
+                    'descripcion': item['descripcion'],
+                    'precio_unitario': item['precio_unitario'],
+                    'monto_total': item['cantidad'] * item['precio_unitario'],
+                    'observaciones': item.get('observaciones', '')
+                } for item in items]
+                
+                valores, parametros = construir_values(filas_oc, [
+                    'simese', 'numero_orden', 'fecha_emision', 'codigo_completo', 'codigo_insumo',
+                    'servicio', 'lote', 'item', 'cantidad', 'unidad_medida', 'descripcion',
+                    'precio_unitario', 'monto_total', 'observaciones'
+                ])
+                query_insert_oc = text(f"""
+                    INSERT INTO "{esquema}"."orden_de_compra"
+                    ("SIMESE (PEDIDO)", "N° ORDEN DE COMPRA", "FECHA DE EMISION",
+                    "CODIGO DE REACTIVOS / INSUMOS + CODIGO DE SERVICIO BENEFICIARIO",
+                    "CODIGO DE REACTIVOS / INSUMOS", "SERVICIO BENEFICIARIO",
+                    "LOTE", "ITEM", "CANTIDAD SOLICITADA", "UNIDAD DE MEDIDA",
+                    "DESCRIPCION DEL PRODUCTO // MARCA // PROCEDENCIA", "PRECIO UNITARIO",
+                    "MONTO EMITIDO", "Observaciones")
+                    {valores}
+                """)
+                conn.execute(query_insert_oc, parametros)
                 
                 # Confirmar transacción
                 trans.commit()
+                invalidar_cache('resumen', 'ejecucion')
                 registrar_actividad(
                     accion="CREATE",
                     modulo="ORDENES_COMPRA",
                     descripcion=f"Orden de compra {numero_orden} creada",
                     esquema_afectado=esquema
                 )
-                return True, "Orden de compra creada exitosamente", orden_id
+                return True, f"Orden de compra {numero_orden} creada exitosamente", orden_id
                 
             except Exception as e:
                 # Revertir transacción en caso de error
@@ -3273,7 +4618,7 @@ def pagina_ordenes_compra():
                         # Formatear para mejor visualización
                         df_display = df_items.copy()
                         if 'precio_unitario' in df_display.columns:
-                            df_display['precio_unitario'] = df_display['precio_unitario'].apply(lambda x: f"₲ {x:,.0f}".replace(",", "."))
+                            df_display['precio_unitario'] = formatear_guaranies(df_display['precio_unitario'])
                         
                         st.dataframe(df_display)
                         
@@ -3377,8 +4722,8 @@ def pagina_ordenes_compra():
                             
                             # Formatear para mejor visualización
                             df_display = df_seleccionados.copy()
-                            df_display['precio_unitario'] = df_display['precio_unitario'].apply(lambda x: f"₲ {x:,.0f}".replace(",", "."))
-                            df_display['monto_total'] = df_display['monto_total'].apply(lambda x: f"₲ {x:,.0f}".replace(",", "."))
+                            df_display['precio_unitario'] = formatear_guaranies(df_display['precio_unitario'])
+                            df_display['monto_total'] = formatear_guaranies(df_display['monto_total'])
                             
                             # Mostrar DataFrame
                             st.dataframe(df_display)
@@ -3541,66 +4886,65 @@ def pagina_dashboard():
                 value=len(esquemas)
             )
         
-        # En lugar de obtener órdenes de compra directamente (lo que causa error),
-        # mostrar información alternativa o un mensaje
+        # Totales de órdenes desde el resumen (unas pocas filas, sin recorrer el historial)
+        resumen = obtener_resumen_ordenes()
+        
         with col2:
-            try:
-                # Intentar obtener órdenes de compra del esquema correcto
-                with engine.connect() as conn:
-                    query = text("""
-                        SELECT COUNT(*) 
-                        FROM reactivos_py.ordenes_compra
-                    """)
-                    result = conn.execute(query)
-                    count = result.scalar() or 0
-                    st.metric(
-                        label="Órdenes de Compra", 
-                        value=count
-                    )
-            except Exception:
-                # Si hay error, solo mostrar 0
-                st.metric(
-                    label="Órdenes de Compra", 
-                    value="0"
-                )
+            st.metric(
+                label="Órdenes de Compra", 
+                value=int(resumen['cantidad_ordenes'].sum())
+            )
         
         with col3:
-            try:
-                # Intentar obtener monto total de órdenes de compra
-                with engine.connect() as conn:
-                    query = text("""
-                        SELECT SUM(monto_total) 
-                        FROM reactivos_py.items_orden_compra
-                    """)
-                    result = conn.execute(query)
-                    monto_total = result.scalar() or 0
-                    st.metric(
-                        label="Monto Total Emitido", 
-                        value=f"₲ {monto_total:,.0f}".replace(",", ".")
-                    )
-            except Exception:
-                # Si hay error, solo mostrar 0
-                st.metric(
-                    label="Monto Total Emitido", 
-                    value="₲ 0"
-                )
-        
-        # Mostrar gráficos
-        st.subheader("Esquemas Disponibles")
+            monto_total = float(resumen['monto_total'].sum())
+            st.metric(
+                label="Monto Total Emitido", 
+                value=f"₲ {monto_total:,.0f}".replace(",", ".")
+            )
         
+        # Ejecución de todas las licitaciones (una sola consulta, cacheada)
         if esquemas:
-            # Crear un gráfico simple de los esquemas
-            datos_grafico = pd.DataFrame({
-                'Esquema': esquemas,
-                'Cantidad': [1] * len(esquemas)  # Solo para visualización
-            })
+            por_licitacion, por_servicio = obtener_ejecucion_licitaciones()
             
-            st.bar_chart(datos_grafico.set_index('Esquema'))
+            if not por_licitacion.empty:
+                st.subheader("Ejecución por Licitación")
+                
+                por_licitacion = por_licitacion.sort_values('porcentaje_emitido', ascending=False)
+                st.bar_chart(por_licitacion.set_index('esquema')[['porcentaje_emitido']])
+                
+                st.dataframe(
+                    por_licitacion.rename(columns={
+                        'esquema': 'Licitación',
+                        'cantidad_maxima': 'Cantidad Máxima',
+                        'cantidad_emitida': 'Cantidad Emitida',
+                        'saldo': 'Saldo a Emitir',
+                        'monto_emitido': 'Monto Emitido',
+                        'porcentaje_emitido': '% Emitido'
+                    }),
+                    hide_index=True,
+                    use_container_width=True
+                )
             
-            # Lista de esquemas disponibles
-            st.subheader("Licitaciones Disponibles")
-            for i, esquema in enumerate(esquemas, 1):
-                st.write(f"{i}. {esquema}")
+            if not por_servicio.empty:
+                st.subheader("Ejecución por Servicio Beneficiario")
+                
+                licitacion = st.selectbox(
+                    "Licitación:",
+                    options=sorted(por_servicio['esquema'].unique()),
+                    key="dashboard_licitacion"
+                )
+                
+                servicios = por_servicio[por_servicio['esquema'] == licitacion].copy()
+                servicios['servicio'] = servicios['servicio'].fillna('(Sin servicio)')
+                servicios = servicios.sort_values('monto_emitido', ascending=False).set_index('servicio')
+                
+                col_a, col_b = st.columns(2)
+                with col_a:
+                    st.caption("% emitido")
+                    st.bar_chart(servicios[['porcentaje_emitido']])
+                with col_b:
+                    st.caption("Cantidad emitida y saldo")
+                    st.bar_chart(servicios[['cantidad_emitida', 'saldo']])
             
             # Botón para ir a órdenes de compra
             if st.button("Gestionar Archivos"):
@@ -3620,12 +4964,12 @@ def main():
         layout="wide"
     )
     
-    # Configurar tablas si no existen
-    configurar_tabla_usuarios()
-    configurar_tabla_ordenes_compra()
-    configurar_tabla_cargas()
-    configurar_tabla_proveedores()
-    configurar_tabla_auditoria()
+    # Crear o actualizar las tablas del sistema (una sola vez por proceso)
+    try:
+        aplicar_migraciones()
+        mantener_particiones_auditoria()
+    except Exception as e:
+        print(f"Error aplicando migraciones: {e}")
     
     # Inicializar el estado de sesión si es necesario
     if 'logged_in' not in st.session_state:
@@ -3647,6 +4991,16 @@ def main():
             conn.execute(text("SELECT 1"))
         st.sidebar.success(f"✅ Conectado a PostgreSQL | Usuario: {st.session_state.username}")
         
+        # Estado del pool de conexiones (solo administradores)
+        if st.session_state.user_role == 'admin':
+            with st.sidebar.expander("🔌 Pool de conexiones"):
+                for nombre_bd, datos in estadisticas_pool().items():
+                    st.caption(f"{nombre_bd}: {datos['en_uso']} en uso / {datos['libres']} libres "
+                               f"(tamaño {datos['tamano']}, overflow {datos['overflow']}/{datos['max_overflow']})")
+                datos_auditoria = obtener_escritor_auditoria().estadisticas()
+                st.caption(f"Auditoría: {datos_auditoria['pendientes']} pendientes, "
+                           f"{datos_auditoria['escritos']} escritos, {datos_auditoria['perdidos']} con error")
+        
         # Mostrar estado de actualización automática
         if 'ultima_actualizacion' in st.session_state:
             tiempo_restante = INTERVALO_ACTUALIZACION - ((datetime.now() - st.session_state.ultima_actualizacion).total_seconds() / 60)
@@ -3723,198 +5077,313 @@ def main():
         time.sleep(1)
         st.rerun()
 
-def obtener_ordenes_compra(esquema=None):
-    """Obtiene las órdenes de compra existentes, filtradas por esquema si se especifica"""
+def formatear_guaranies(serie):
+    """Da formato '₲ 1.234.567' a una serie de montos, sin recorrerla fila por fila"""
+    enteros = pd.to_numeric(serie, errors='coerce').fillna(0).round(0).astype('int64').astype(str)
+    return "₲ " + enteros.str.replace(r'\B(?=(\d{3})+(?!\d))', '.', regex=True)
+
+def obtener_ordenes_compra(esquema=None, estado=None, servicio=None, fecha_desde=None, fecha_hasta=None,
+                           despues_de=None, limite=TAMANO_PAGINA_ORDENES):
+    """
+    Obtiene una página de órdenes de compra, de la más reciente a la más antigua
+    
+    La paginación es por clave (fecha_creacion, id): para la página siguiente se pasa
+    en despues_de la clave de la última orden recibida, en lugar de usar OFFSET.
+    
+    Args:
+        esquema (str): Filtrar por licitación
+        estado (str): Filtrar por estado
+        servicio (str): Filtrar por servicio beneficiario
+        fecha_desde (date): Fecha de emisión mínima
+        fecha_hasta (date): Fecha de emisión máxima (inclusive)
+        despues_de (tuple): (fecha_creacion, id) de la última orden de la página anterior
+        limite (int): Cantidad máxima de órdenes a devolver
+    
+    Returns:
+        list: Órdenes de la página
+    """
     try:
         with engine.connect() as conn:
-            # Consulta base
-            query_base = """
-                SELECT oc.id, oc.numero_orden, oc.fecha_emision, oc.esquema, 
-                       oc.servicio_beneficiario, oc.simese, oc.estado, 
-                       u.username as usuario, oc.fecha_creacion,
-                       COUNT(ioc.id) as cantidad_items,
-                       SUM(ioc.monto_total) as monto_total
-                FROM ordenes_compra oc
-                JOIN usuarios u ON oc.usuario_id = u.id
-                LEFT JOIN items_orden_compra ioc ON oc.id = ioc.orden_compra_id
-            """
+            condiciones = []
+            params = {'limite': limite}
             
-            # Agregar filtro por esquema si es necesario
             if esquema:
-                query_base += " WHERE oc.esquema = :esquema "
-                params = {'esquema': esquema}
-            else:
-                params = {}
-            
-            # Agrupar y ordenar
-            query_base += """
-                GROUP BY oc.id, oc.numero_orden, oc.fecha_emision, oc.esquema, 
-                         oc.servicio_beneficiario, oc.simese, oc.estado, 
-                         u.username, oc.fecha_creacion
-                ORDER BY oc.fecha_creacion DESC
-            """
-            
-            query = text(query_base)
-            result = conn.execute(query, params)
+                condiciones.append("oc.esquema = :esquema")
+                params['esquema'] = esquema
+            if estado:
+                condiciones.append("oc.estado = :estado")
+                params['estado'] = estado
+            if servicio:
+                condiciones.append("oc.servicio_beneficiario = :servicio")
+                params['servicio'] = servicio
+            if fecha_desde:
+                condiciones.append("oc.fecha_emision >= :fecha_desde")
+                params['fecha_desde'] = fecha_desde
+            if fecha_hasta:
+                condiciones.append("oc.fecha_emision < :fecha_hasta")
+                params['fecha_hasta'] = fecha_hasta + timedelta(days=1)
+            if despues_de:
+                condiciones.append("(oc.fecha_creacion, oc.id) < (:cursor_fecha, :cursor_id)")
+                params['cursor_fecha'], params['cursor_id'] = despues_de
             
-            ordenes = []
-            for row in result:
-                ordenes.append({
-                    'id': row[0],
-                    'numero_orden': row[1],
-                    'fecha_emision': row[2],
-                    'esquema': row[3],
-                    'servicio_beneficiario': row[4],
-                    'simese': row[5],
-                    'estado': row[6],
-                    'usuario': row[7],
-                    'fecha_creacion': row[8],
-                    'cantidad_items': row[9],
-                    'monto_total': row[10]
-                })
+            where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
             
-            return ordenes
-    except Exception as e:
-        st.error(f"Error obteniendo órdenes de compra: {e}")
-        return []
-
-def obtener_detalles_orden_compra(orden_id):
-    """Obtiene los detalles completos de una orden de compra"""
-    try:
-        with engine.connect() as conn:
-            # Obtener cabecera
-            query_cabecera = text("""
+            # Los totales de ítems se calculan solo para las órdenes de la página
+            query = text(f"""
                 SELECT oc.id, oc.numero_orden, oc.fecha_emision, oc.esquema, 
                        oc.servicio_beneficiario, oc.simese, oc.estado, 
                        u.username as usuario, oc.fecha_creacion,
-                       u.nombre_completo as usuario_nombre
+                       i.cantidad_items, i.monto_total
                 FROM ordenes_compra oc
                 JOIN usuarios u ON oc.usuario_id = u.id
-                WHERE oc.id = :orden_id
-            """)
-            
-            result = conn.execute(query_cabecera, {'orden_id': orden_id})
-            cabecera = result.fetchone()
-            
-            if not cabecera:
-                return None
-            
-            # Obtener items
-            query_items = text("""
-                SELECT id, lote, item, codigo_insumo, codigo_servicio, 
-                       descripcion, cantidad, unidad_medida, precio_unitario, 
-                       monto_total, observaciones
-                FROM items_orden_compra
-                WHERE orden_compra_id = :orden_id
-                ORDER BY lote, item
-            """)
-            
-            result_items = conn.execute(query_items, {'orden_id': orden_id})
-            
-            items = []
-            for row in result_items:
-                items.append({
-                    'id': row[0],
-                    'lote': row[1],
-                    'item': row[2],
-                    'codigo_insumo': row[3],
-                    'codigo_servicio': row[4],
-                    'descripcion': row[5],
-                    'cantidad': row[6],
-                    'unidad_medida': row[7],
-                    'precio_unitario': row[8],
-                    'monto_total': row[9],
-                    'observaciones': row[10]
-                })
-            
-            # Obtener datos de la licitación desde el esquema
-            query_licitacion = text(f"""
-                SELECT "NUMERO DE LLAMADO", "AÑO DEL LLAMADO", "NOMBRE DEL LLAMADO", 
-                       "EMPRESA ADJUDICADA", "FECHA DE FIRMA DEL CONTRATO", 
-                       "N° de Contrato / Año", "Vigencia del Contrato"
-                FROM "{cabecera[3]}"."llamado"
-                LIMIT 1
+                LEFT JOIN LATERAL (
+                    SELECT COUNT(*) AS cantidad_items, SUM(ioc.monto_total) AS monto_total
+                    FROM items_orden_compra ioc
+                    WHERE ioc.orden_compra_id = oc.id
+                ) i ON TRUE
+                {where}
+                ORDER BY oc.fecha_creacion DESC, oc.id DESC
+                LIMIT :limite
             """)
+            result = conn.execute(query, params)
             
-            result_licitacion = conn.execute(query_licitacion)
-            licitacion = result_licitacion.fetchone()
-            
-            # Armar respuesta completa
-            orden = {
-                'id': cabecera[0],
-                'numero_orden': cabecera[1],
-                'fecha_emision': cabecera[2],
-                'esquema': cabecera[3],
-                'servicio_beneficiario': cabecera[4],
-                'simese': cabecera[5],
-                'estado': cabecera[6],
-                'usuario': cabecera[7],
-                'fecha_creacion': cabecera[8],
-                'usuario_nombre': cabecera[9],
-                'items': items,
-                'monto_total': sum(item['monto_total'] for item in items),
-                'cantidad_items': len(items)
-            }
-            
-            # Agregar datos de licitación si están disponibles
-            if licitacion:
-                orden['licitacion'] = {
-                    'numero_llamado': licitacion[0],
-                    'anio_llamado': licitacion[1],
-                    'nombre_llamado': licitacion[2],
-                    'empresa_adjudicada': licitacion[3],
-                    'fecha_contrato': licitacion[4],
-                    'numero_contrato': licitacion[5],
-                    'vigencia_contrato': licitacion[6]
-                }
+            ordenes = []
+            for row in result:
+                ordenes.append({
+                    'id': row[0],
+                    'numero_orden': row[1],
+                    'fecha_emision': row[2],
+                    'esquema': row[3],
+                    'servicio_beneficiario': row[4],
+                    'simese': row[5],
+                    'estado': row[6],
+                    'usuario': row[7],
+                    'fecha_creacion': row[8],
+                    'cantidad_items': row[9],
+                    'monto_total': row[10]
+                })
             
-            return orden
+            return ordenes
+    except Exception as e:
+        st.error(f"Error obteniendo órdenes de compra: {e}")
+        return []
+
+# Cabecera, ítems (como JSON) y datos de la licitación de una orden en una sola consulta
+# Detalle completo de órdenes (cabecera, ítems y datos de la licitación), sin filtro
+SQL_DETALLE_ORDEN_BASE = """
+    SELECT oc.id, oc.numero_orden, oc.fecha_emision, oc.esquema, 
+           oc.servicio_beneficiario, oc.simese, oc.estado, 
+           u.username as usuario, oc.fecha_creacion,
+           u.nombre_completo as usuario_nombre,
+           COALESCE(it.items, '[]'::json), COALESCE(it.monto_total, 0), COALESCE(it.cantidad_items, 0),
+           cat.esquema IS NOT NULL, cat.numero_llamado, cat.anio_llamado, cat.nombre_llamado,
+           cat.empresa_adjudicada, cat.fecha_firma_contrato, cat.numero_contrato, cat.vigencia_contrato
+    FROM ordenes_compra oc
+    JOIN usuarios u ON oc.usuario_id = u.id
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+                   'id', ioc.id, 'lote', ioc.lote, 'item', ioc.item,
+                   'codigo_insumo', ioc.codigo_insumo, 'codigo_servicio', ioc.codigo_servicio,
+                   'descripcion', ioc.descripcion, 'cantidad', ioc.cantidad,
+                   'unidad_medida', ioc.unidad_medida, 'precio_unitario', ioc.precio_unitario,
+                   'monto_total', ioc.monto_total, 'observaciones', ioc.observaciones
+               ) ORDER BY ioc.lote, ioc.item) AS items,
+               SUM(ioc.monto_total) AS monto_total,
+               COUNT(*) AS cantidad_items
+        FROM items_orden_compra ioc
+        WHERE ioc.orden_compra_id = oc.id
+    ) it ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT c.esquema, c.numero_llamado, c.anio_llamado, c.nombre_llamado, c.empresa_adjudicada,
+               c.fecha_firma_contrato, c.numero_contrato, c.vigencia_contrato
+        FROM reactivos_py.catalogo_licitaciones c
+        WHERE c.esquema = oc.esquema
+        LIMIT 1
+    ) cat ON TRUE
+"""
+
+SQL_DETALLE_ORDEN = SQL_DETALLE_ORDEN_BASE + """
+    WHERE oc.id = ANY(:ids)
+"""
+
+def armar_detalle_orden(row):
+    """Convierte una fila de SQL_DETALLE_ORDEN en el diccionario de la orden"""
+    orden = {
+        'id': row[0],
+        'numero_orden': row[1],
+        'fecha_emision': row[2],
+        'esquema': row[3],
+        'servicio_beneficiario': row[4],
+        'simese': row[5],
+        'estado': row[6],
+        'usuario': row[7],
+        'fecha_creacion': row[8],
+        'usuario_nombre': row[9],
+        'items': row[10] if isinstance(row[10], list) else json.loads(row[10]),
+        'monto_total': row[11],
+        'cantidad_items': row[12]
+    }
+    
+    # Agregar datos de licitación si están disponibles
+    if row[13]:
+        orden['licitacion'] = {
+            'numero_llamado': row[14],
+            'anio_llamado': row[15],
+            'nombre_llamado': row[16],
+            'empresa_adjudicada': row[17],
+            'fecha_contrato': row[18],
+            'numero_contrato': row[19],
+            'vigencia_contrato': row[20]
+        }
+    
+    return orden
+
+@st.cache_data(ttl=TTL_CACHE_CONSULTAS, max_entries=MAX_DETALLES_ORDEN_CACHE, show_spinner=False)
+def _consultar_detalle_orden(orden_id):
+    """Consulta (cacheada por orden) del detalle completo de una orden de compra"""
+    with engine.connect() as conn:
+        row = conn.execute(text(SQL_DETALLE_ORDEN), {'ids': [orden_id]}).fetchone()
+        return armar_detalle_orden(row) if row else None
+
+def obtener_detalles_orden_compra(orden_id):
+    """Obtiene los detalles completos de una orden de compra"""
+    try:
+        return _consultar_detalle_orden(orden_id)
     except Exception as e:
         st.error(f"Error obteniendo detalles de orden de compra: {e}")
         return None
 
 def cambiar_estado_orden_compra(orden_id, nuevo_estado):
-    """Cambia el estado de una orden de compra"""
+    """Cambia el estado de una orden de compra y mueve sus totales en el resumen"""
     try:
         with engine.connect() as conn:
-            query = text("""
-                UPDATE ordenes_compra
-                SET estado = :estado
-                WHERE id = :orden_id
-                RETURNING numero_orden
-            """)
-            
-            result = conn.execute(query, {'estado': nuevo_estado, 'orden_id': orden_id})
-            numero_orden = result.scalar()
-            
-            if numero_orden:
+            trans = conn.begin()
+            try:
+                orden = conn.execute(text("""
+                    SELECT numero_orden, esquema, servicio_beneficiario, fecha_emision, estado
+                    FROM ordenes_compra
+                    WHERE id = :orden_id
+                    FOR UPDATE
+                """), {'orden_id': orden_id}).fetchone()
+                
+                if not orden:
+                    trans.rollback()
+                    return False, "Orden de compra no encontrada"
+                
+                numero_orden, esquema, servicio, fecha_emision, estado_anterior = orden
+                
+                # Lo anulado ya devolvió su saldo: reactivarla exigiría volver a verificarlo
+                if estado_anterior == 'Anulada' and nuevo_estado != 'Anulada':
+                    trans.rollback()
+                    return False, f"La orden {numero_orden} está anulada y no puede cambiar de estado"
+                
+                if nuevo_estado == 'Anulada' and estado_anterior != 'Anulada':
+                    devolver_saldos_orden(conn, esquema, orden_id)
+                
+                if estado_anterior != nuevo_estado:
+                    conn.execute(text("""
+                        UPDATE ordenes_compra
+                        SET estado = :estado
+                        WHERE id = :orden_id
+                    """), {'estado': nuevo_estado, 'orden_id': orden_id})
+                    
+                    monto = conn.execute(text("""
+                        SELECT COALESCE(SUM(monto_total), 0)
+                        FROM items_orden_compra
+                        WHERE orden_compra_id = :orden_id
+                    """), {'orden_id': orden_id}).scalar()
+                    
+                    # Pasar la orden del estado anterior al nuevo en el resumen
+                    acumular_resumen_ordenes(conn, esquema, servicio, fecha_emision, estado_anterior, -1, -monto)
+                    acumular_resumen_ordenes(conn, esquema, servicio, fecha_emision, nuevo_estado, 1, monto)
+                
+                trans.commit()
+                invalidar_cache('resumen', 'ejecucion', 'detalle_orden')
                 return True, f"Estado de orden {numero_orden} cambiado a '{nuevo_estado}'"
-            else:
-                return False, "Orden de compra no encontrada"
+            except Exception as e:
+                trans.rollback()
+                raise e
     except Exception as e:
         return False, f"Error al cambiar estado: {e}"
 
 def generar_pdf_orden_compra(orden_id):
     """
-    Genera un PDF para la orden de compra
-    
-    Esta función es un placeholder. En la implementación real, deberías usar 
-    una biblioteca como reportlab, weasyprint o pdfkit para generar el PDF.
+    Genera el PDF de una orden de compra
     
     Returns:
-        bytes: Contenido del PDF
+        tuple: (contenido del PDF o None, mensaje)
     """
     try:
+        if not reportlab_disponible():
+            return None, "Para generar PDFs debe instalarse el paquete 'reportlab'"
+        
         orden = obtener_detalles_orden_compra(orden_id)
         if not orden:
             return None, "Orden no encontrada"
-            
-        # Placeholder: En una implementación real, aquí generarías el PDF
-        # Por ahora, solo devolvemos un mensaje indicando que esta función debe implementarse
-        return None, "La generación de PDF debe implementarse utilizando una biblioteca como reportlab o weasyprint"
+        
+        orden['monto_en_letras'] = numero_a_letras(float(orden['monto_total']))
+        return renderizar_orden_pdf(orden), f"PDF de la orden {orden['numero_orden']} generado"
     except Exception as e:
         return None, f"Error generando PDF: {e}"
 
+def generar_pdfs_ordenes(esquema=None, estado=None, servicio=None, fecha_desde=None, fecha_hasta=None):
+    """
+    Genera en un ZIP los PDFs de las órdenes que cumplen los filtros del listado
+    
+    Se generan como máximo MAX_ORDENES_PDF_LOTE órdenes; si hay más se pide acotar
+    los filtros en lugar de armar el ZIP.
+    
+    Returns:
+        tuple: (contenido del ZIP o None, mensaje, métricas)
+    """
+    try:
+        if not reportlab_disponible():
+            return None, "Para generar PDFs debe instalarse el paquete 'reportlab'", None
+        
+        condiciones = []
+        params = {'limite': MAX_ORDENES_PDF_LOTE + 1}
+        if esquema:
+            condiciones.append("oc.esquema = :esquema")
+            params['esquema'] = esquema
+        if estado:
+            condiciones.append("oc.estado = :estado")
+            params['estado'] = estado
+        if servicio:
+            condiciones.append("oc.servicio_beneficiario = :servicio")
+            params['servicio'] = servicio
+        if fecha_desde:
+            condiciones.append("oc.fecha_emision >= :fecha_desde")
+            params['fecha_desde'] = fecha_desde
+        if fecha_hasta:
+            condiciones.append("oc.fecha_emision < :fecha_hasta")
+            params['fecha_hasta'] = fecha_hasta + timedelta(days=1)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        
+        # Las órdenes del lote con sus ítems en una sola consulta (una de más para detectar el exceso)
+        with engine.connect() as conn:
+            result = conn.execute(text(f"""
+                {SQL_DETALLE_ORDEN_BASE}
+                {where}
+                ORDER BY oc.fecha_emision, oc.id
+                LIMIT :limite
+            """), params)
+            ordenes = [armar_detalle_orden(row) for row in result]
+        
+        if not ordenes:
+            return None, "No hay órdenes de compra para los filtros seleccionados", None
+        if len(ordenes) > MAX_ORDENES_PDF_LOTE:
+            return None, (f"Hay más de {MAX_ORDENES_PDF_LOTE} órdenes para los filtros seleccionados; "
+                          f"acote la licitación o el rango de fechas"), None
+        
+        for orden in ordenes:
+            orden['monto_en_letras'] = numero_a_letras(float(orden['monto_total']))
+        
+        contenido, metricas = generar_zip_ordenes(ordenes)
+        return contenido, (f"{metricas['ordenes']} PDFs generados en {metricas['segundos']} s "
+                           f"({metricas['ordenes_por_segundo']} órdenes/s)"), metricas
+    except Exception as e:
+        return None, f"Error generando PDFs: {e}", None
+
 def pagina_ordenes_compra():
     """Página principal de gestión de órdenes de compra"""
     st.header("Gestión de Órdenes de Compra")
@@ -3925,19 +5394,71 @@ def pagina_ordenes_compra():
     with tab1:
         st.subheader("Órdenes de Compra Emitidas")
         
-        # Opción para filtrar por esquema
+        # Filtros
         esquemas = obtener_esquemas_postgres()
-        esquema_seleccionado = st.selectbox(
-            "Filtrar por esquema:",
-            options=["Todos"] + esquemas,
-            index=0
+        col_f1, col_f2, col_f3, col_f4 = st.columns(4)
+        with col_f1:
+            esquema_seleccionado = st.selectbox(
+                "Filtrar por esquema:",
+                options=["Todos"] + esquemas,
+                index=0,
+                key="ordenes_filtro_esquema"
+            )
+        with col_f2:
+            estado_seleccionado = st.selectbox(
+                "Estado:",
+                options=["Todos", "Emitida", "Entregada", "Anulada"],
+                index=0,
+                key="ordenes_filtro_estado"
+            )
+        with col_f3:
+            servicios_filtro = obtener_servicios_beneficiarios(esquema_seleccionado) if esquema_seleccionado != "Todos" else []
+            servicio_seleccionado = st.selectbox(
+                "Servicio beneficiario:",
+                options=["Todos"] + servicios_filtro,
+                index=0,
+                key="ordenes_filtro_servicio"
+            )
+        with col_f4:
+            rango_fechas = st.date_input("Fecha de emisión:", value=(), key="ordenes_filtro_fechas")
+        
+        fecha_desde = rango_fechas[0] if len(rango_fechas) > 0 else None
+        fecha_hasta = rango_fechas[1] if len(rango_fechas) > 1 else fecha_desde
+        
+        filtros = {
+            'esquema': None if esquema_seleccionado == "Todos" else esquema_seleccionado,
+            'estado': None if estado_seleccionado == "Todos" else estado_seleccionado,
+            'servicio': None if servicio_seleccionado == "Todos" else servicio_seleccionado,
+            'fecha_desde': fecha_desde,
+            'fecha_hasta': fecha_hasta
+        }
+        
+        # Al cambiar los filtros se vuelve a la primera página
+        if st.session_state.get('ordenes_filtros') != filtros:
+            st.session_state.ordenes_filtros = filtros
+            st.session_state.ordenes_cursores = [None]
+        
+        cursores = st.session_state.ordenes_cursores
+        
+        # Se pide una orden de más para saber si hay página siguiente
+        ordenes = obtener_ordenes_compra(
+            despues_de=cursores[-1], limite=TAMANO_PAGINA_ORDENES + 1, **filtros
         )
+        hay_siguiente = len(ordenes) > TAMANO_PAGINA_ORDENES
+        ordenes = ordenes[:TAMANO_PAGINA_ORDENES]
         
-        # Obtener órdenes de compra
-        if esquema_seleccionado == "Todos":
-            ordenes = obtener_ordenes_compra()
-        else:
-            ordenes = obtener_ordenes_compra(esquema_seleccionado)
+        col_p1, col_p2, col_p3 = st.columns([1, 2, 1])
+        with col_p1:
+            if st.button("◀ Anterior", disabled=len(cursores) == 1):
+                cursores.pop()
+                st.rerun()
+        with col_p2:
+            st.caption(f"Página {len(cursores)}")
+        with col_p3:
+            if st.button("Siguiente ▶", disabled=not hay_siguiente):
+                ultima = ordenes[-1]
+                cursores.append((ultima['fecha_creacion'], ultima['id']))
+                st.rerun()
         
         if ordenes:
             # Convertir a DataFrame para mejor visualización
@@ -3951,7 +5472,7 @@ def pagina_ordenes_compra():
             
             # Dar formato al monto total
             if 'monto_total' in df_ordenes.columns:
-                df_ordenes['monto_total'] = df_ordenes['monto_total'].apply(lambda x: f"₲ {x:,.0f}".replace(",", "."))
+                df_ordenes['monto_total'] = formatear_guaranies(df_ordenes['monto_total'])
             
             # Mostrar órdenes
             st.dataframe(df_ordenes)
@@ -4001,8 +5522,8 @@ def pagina_ordenes_compra():
                         df_items = pd.DataFrame(orden['items'])
                         
                         # Formatear montos
-                        df_items['precio_unitario'] = df_items['precio_unitario'].apply(lambda x: f"₲ {x:,.0f}".replace(",", "."))
-                        df_items['monto_total'] = df_items['monto_total'].apply(lambda x: f"₲ {x:,.0f}".replace(",", "."))
+                        df_items['precio_unitario'] = formatear_guaranies(df_items['precio_unitario'])
+                        df_items['monto_total'] = formatear_guaranies(df_items['monto_total'])
                         
                         # Mostrar DataFrame
                         st.dataframe(df_items)
@@ -4039,22 +5560,35 @@ def pagina_ordenes_compra():
                     
                     with col3:
                         if st.button("Generar PDF"):
-                            # Placeholder para generación de PDF
-                            st.info("La generación de PDF será implementada en una versión futura.")
-                            
-                            # En una implementación real, generarías el PDF y lo ofrecerías para descarga
-                            # pdf_bytes, message = generar_pdf_orden_compra(orden_id)
-                            # if pdf_bytes:
-                            #     st.download_button(
-                            #         label="Descargar PDF",
-                            #         data=pdf_bytes,
-                            #         file_name=f"OC_{orden['numero_orden']}.pdf",
-                            #         mime="application/pdf"
-                            #     )
-                            # else:
-                            #     st.error(message)
+                            pdf_bytes, message = generar_pdf_orden_compra(orden_id)
+                            if pdf_bytes:
+                                st.download_button(
+                                    label="Descargar PDF",
+                                    data=pdf_bytes,
+                                    file_name=nombre_archivo_pdf(orden),
+                                    mime="application/pdf"
+                                )
+                            else:
+                                st.error(message)
         else:
             st.info("No hay órdenes de compra para mostrar.")
+        
+        # PDFs de todas las órdenes de la licitación y fechas filtradas
+        with st.expander("📦 Descargar PDFs en lote"):
+            st.caption(f"Usa los filtros de arriba (hasta {MAX_ORDENES_PDF_LOTE} órdenes por ZIP).")
+            if st.button("Generar ZIP de PDFs"):
+                with st.spinner("Generando PDFs..."):
+                    contenido_zip, message, metricas = generar_pdfs_ordenes(**filtros)
+                if contenido_zip:
+                    st.success(message)
+                    st.download_button(
+                        label="Descargar ZIP",
+                        data=contenido_zip,
+                        file_name=f"ordenes_compra_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+                        mime="application/zip"
+                    )
+                else:
+                    st.warning(message)
     
     with tab2:
         st.subheader("Emitir Nueva Orden de Compra")
@@ -4093,14 +5627,22 @@ def pagina_ordenes_compra():
                     options=servicios
                 )
                 
+                # Fuera del formulario para que al destildarla aparezca enseguida el campo manual
+                numero_automatico = st.checkbox("Asignar número automáticamente", value=True,
+                                                key="nueva_orden_numero_automatico")
+                
                 # Formulario para los datos de la orden de compra
                 with st.form("nueva_orden_form"):
                     col1, col2 = st.columns(2)
                     
                     with col1:
-                        # Generar número de orden sugerido
-                        numero_sugerido = obtener_proximo_numero_oc(esquema_seleccionado)
-                        numero_orden = st.text_input("Número de Orden:", value=numero_sugerido)
+                        # El número se asigna al emitir; aquí solo se muestra el próximo probable
+                        if numero_automatico:
+                            st.text_input("Número de Orden:", value=obtener_proximo_numero_oc(esquema_seleccionado),
+                                          disabled=True)
+                            numero_orden = None
+                        else:
+                            numero_orden = st.text_input("Número de Orden:")
                     
                     with col2:
                         fecha_emision = st.date_input(
@@ -4128,7 +5670,7 @@ def pagina_ordenes_compra():
                         
                         # Formatear para mejor visualización
                         df_display = df_items.copy()
-                        df_display['precio_unitario'] = df_display['precio_unitario'].apply(lambda x: f"₲ {x:,.0f}".replace(",", "."))
+                        df_display['precio_unitario'] = formatear_guaranies(df_display['precio_unitario'])
                         
                         st.dataframe(df_display)
                         
@@ -4207,8 +5749,8 @@ def pagina_ordenes_compra():
                             
                             # Formatear para mejor visualización
                             df_display = df_seleccionados.copy()
-                            df_display['precio_unitario'] = df_display['precio_unitario'].apply(lambda x: f"₲ {x:,.0f}".replace(",", "."))
-                            df_display['monto_total'] = df_display['monto_total'].apply(lambda x: f"₲ {x:,.0f}".replace(",", "."))
+                            df_display['precio_unitario'] = formatear_guaranies(df_display['precio_unitario'])
+                            df_display['monto_total'] = formatear_guaranies(df_display['monto_total'])
                             
                             # Mostrar DataFrame
                             st.dataframe(df_display)
@@ -4229,7 +5771,7 @@ def pagina_ordenes_compra():
                     
                     if submit and st.session_state.items_seleccionados:
                         # Validar datos
-                        if not numero_orden:
+                        if not numero_automatico and not numero_orden:
                             st.error("Debe ingresar un número de orden.")
                         elif not simese:
                             st.error("Debe ingresar un número de SIMESE.")
@@ -4260,127 +5802,5 @@ def pagina_ordenes_compra():
         else:
             st.info("Seleccione una licitación para emitir una orden de compra.")
 
-    with tab1:
-        st.subheader("Órdenes de Compra Emitidas")
-        
-        # Opción para filtrar por esquema
-        esquemas = obtener_esquemas_postgres()
-        esquema_seleccionado = st.selectbox(
-            "Filtrar por esquema:",
-            options=["Todos"] + esquemas,
-            index=0
-        )
-        
-        # Obtener órdenes de compra
-        if esquema_seleccionado == "Todos":
-            ordenes = obtener_ordenes_compra()
-        else:
-            ordenes = obtener_ordenes_compra(esquema_seleccionado)
-        
-        if ordenes:
-            # Convertir a DataFrame para mejor visualización
-            df_ordenes = pd.DataFrame(ordenes)
-            
-            # Dar formato a las fechas
-            if 'fecha_emision' in df_ordenes.columns:
-                df_ordenes['fecha_emision'] = pd.to_datetime(df_ordenes['fecha_emision']).dt.strftime('%Y-%m-%d')
-            if 'fecha_creacion' in df_ordenes.columns:
-                df_ordenes['fecha_creacion'] = pd.to_datetime(df_ordenes['fecha_creacion']).dt.strftime('%Y-%m-%d %H:%M')
-            
-            # Dar formato al monto total
-            if 'monto_total' in df_ordenes.columns:
-                df_ordenes['monto_total'] = df_ordenes['monto_total'].apply(lambda x: f"₲ {x:,.0f}".replace(",", "."))
-            
-            # Mostrar órdenes
-            st.dataframe(df_ordenes)
-            
-            # Selector para ver detalles de una orden
-            ordenes_ids = {f"{o['numero_orden']} - {o['servicio_beneficiario']}": o['id'] for o in ordenes}
-            selected_orden = st.selectbox(
-                "Seleccionar orden para ver detalles:",
-                options=list(ordenes_ids.keys())
-            )
-            
-            if selected_orden:
-                orden_id = ordenes_ids[selected_orden]
-                orden = obtener_detalles_orden_compra(orden_id)
-                
-                if orden:
-                    st.subheader(f"Detalles de Orden de Compra: {orden['numero_orden']}")
-                    
-                    # Mostrar datos de cabecera
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write(f"**Fecha Emisión:** {orden['fecha_emision'].strftime('%Y-%m-%d')}")
-                        st.write(f"**Servicio Beneficiario:** {orden['servicio_beneficiario']}")
-                        st.write(f"**SIMESE:** {orden['simese']}")
-                    with col2:
-                        st.write(f"**Estado:** {orden['estado']}")
-                        st.write(f"**Usuario:** {orden['usuario_nombre']} ({orden['usuario']})")
-                        st.write(f"**Fecha Creación:** {orden['fecha_creacion'].strftime('%Y-%m-%d %H:%M')}")
-                    
-                    # Mostrar datos de licitación si están disponibles
-                    if 'licitacion' in orden:
-                        with st.expander("Datos de la Licitación"):
-                            lic = orden['licitacion']
-                            st.write(f"**Llamado:** {lic['numero_llamado']}/{lic['anio_llamado']}")
-                            st.write(f"**Nombre:** {lic['nombre_llamado']}")
-                            st.write(f"**Empresa:** {lic['empresa_adjudicada']}")
-                            st.write(f"**Contrato:** {lic['numero_contrato']}")
-                            if lic['fecha_contrato']:
-                                st.write(f"**Fecha Contrato:** {lic['fecha_contrato'].strftime('%Y-%m-%d')}")
-                            st.write(f"**Vigencia:** {lic['vigencia_contrato']}")
-                    
-                    # Mostrar items
-                    st.subheader("Items de la Orden")
-                    
-                    if orden['items']:
-                        # Crear DataFrame para visualización
-                        df_items = pd.DataFrame(orden['items'])
-                        
-                        # Formatear montos
-                        df_items['precio_unitario'] = df_items['precio_unitario'].apply(lambda x: f"₲ {x:,.0f}".replace(",", "."))
-                        df_items['monto_total'] = df_items['monto_total'].apply(lambda x: f"₲ {x:,.0f}".replace(",", "."))
-                        
-                        # Mostrar DataFrame
-                        st.dataframe(df_items)
-                        
-                        # Mostrar monto total
-                        st.subheader(f"Monto Total: ₲ {orden['monto_total']:,.0f}".replace(",", "."))
-                    else:
-                        st.info("Esta orden no tiene items.")
-                    
-                    # Opciones para la orden
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        if orden['estado'] == 'Emitida':
-                            if st.button("Marcar como Entregada"):
-                                success, message = cambiar_estado_orden_compra(orden_id, "Entregada")
-                                if success:
-                                    st.success(message)
-                                    time.sleep(1)
-                                    st.rerun()
-                                else:
-                                    st.error(message)
-                                    
-                    with col2:
-                        if orden['estado'] in ['Emitida', 'Entregada']:
-                            if st.button("Marcar como Anulada"):
-                                success, message = cambiar_estado_orden_compra(orden_id, "Anulada")
-                                if success:
-                                    st.success(message)
-                                    time.sleep(1)
-                                    st.rerun()
-                                else:
-                                    st.error(message)
-                    
-                    with col3:
-                        if st.button("Generar PDF"):
-                            # Placeholder para generación de PDF
-                            st.info("La generación de PDF será implementada en una versión futura.")
-        else:
-            st.info("No hay órdenes de compra para mostrar.")
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import os
+import threading
+from sqlalchemy import create_engine
+
+# Configuración de conexión a PostgreSQL (se puede sobrescribir con variables de entorno)
+DB_HOST = os.environ.get("REACTIVOS_DB_HOST", "localhost")
+DB_PORT = os.environ.get("REACTIVOS_DB_PORT", "5432")
+DB_NAME = os.environ.get("REACTIVOS_DB_NAME", "postgres")
+DB_USER = os.environ.get("REACTIVOS_DB_USER", "postgres")
+DB_PASSWORD = os.environ.get("REACTIVOS_DB_PASSWORD", "Dggies12345")
+
+# Driver de SQLAlchemy: psycopg2 (por defecto) o psycopg (psycopg 3)
+DB_DRIVER = os.environ.get("REACTIVOS_DB_DRIVER", "psycopg2")
+
+# Parámetros del pool de conexiones
+POOL_SIZE = int(os.environ.get("REACTIVOS_DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.environ.get("REACTIVOS_DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = int(os.environ.get("REACTIVOS_DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.environ.get("REACTIVOS_DB_POOL_RECYCLE", "1800"))
+
+# Tiempo máximo de cada sentencia en milisegundos (0 = sin límite)
+STATEMENT_TIMEOUT_MS = int(os.environ.get("REACTIVOS_DB_STATEMENT_TIMEOUT_MS", "600000"))
+
+# Un engine (y su pool) por base de datos, compartido por todo el proceso
+_engines = {}
+_lock_engines = threading.Lock()
+
+
+def url_conexion(nombre_bd=None):
+    """Arma la URL de SQLAlchemy para la base indicada (o la configurada por defecto)"""
+    return (f"postgresql+{DB_DRIVER}://{DB_USER}:{DB_PASSWORD}"
+            f"@{DB_HOST}:{DB_PORT}/{nombre_bd or DB_NAME}")
+
+
+def parametros_dbapi(nombre_bd=None):
+    """Parámetros para conectarse directamente con psycopg2.connect"""
+    return {
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'user': DB_USER,
+        'password': DB_PASSWORD,
+        'database': nombre_bd or DB_NAME
+    }
+
+
+def obtener_engine(nombre_bd=None):
+    """
+    Devuelve el engine compartido para una base de datos, creándolo la primera vez
+
+    El pool verifica cada conexión antes de usarla (pool_pre_ping), la recicla
+    pasado POOL_RECYCLE segundos y aplica statement_timeout en el servidor. Con
+    psycopg2 los executemany se envían en lotes (values_plus_batch).
+    """
+    nombre_bd = nombre_bd or DB_NAME
+    with _lock_engines:
+        if nombre_bd not in _engines:
+            opciones = {}
+            if DB_DRIVER == "psycopg2":
+                opciones['executemany_mode'] = 'values_plus_batch'
+
+            connect_args = {'application_name': 'reactivos'}
+            if STATEMENT_TIMEOUT_MS:
+                connect_args['options'] = f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"
+
+            _engines[nombre_bd] = create_engine(
+                url_conexion(nombre_bd),
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+                pool_timeout=POOL_TIMEOUT,
+                pool_recycle=POOL_RECYCLE,
+                pool_pre_ping=True,
+                connect_args=connect_args,
+                **opciones
+            )
+        return _engines[nombre_bd]
+
+
+def estadisticas_pool():
+    """Estado de los pools de conexiones abiertos, por base de datos"""
+    estadisticas = {}
+    with _lock_engines:
+        for nombre_bd, engine in _engines.items():
+            pool = engine.pool
+            estadisticas[nombre_bd] = {
+                'tamano': pool.size(),
+                'en_uso': pool.checkedout(),
+                'libres': pool.checkedin(),
+                'overflow': pool.overflow(),
+                'max_overflow': MAX_OVERFLOW
+            }
+    return estadisticas
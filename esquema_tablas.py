@@ -0,0 +1,217 @@
+import re
+import pandas as pd
+
+# Cantidad máxima de celdas rechazadas que se reportan por hoja
+MAX_RECHAZOS_REPORTADOS = 1000
+
+
+def parsear_texto(serie, tipo):
+    """Convierte una columna a texto; los vacíos pasan a nulo y se valida el largo de VARCHAR"""
+    if pd.api.types.is_float_dtype(serie):
+        # Excel entrega los códigos numéricos como float (1.0); si son enteros se guardan sin decimales
+        enteros = serie.dropna()
+        if (enteros == enteros.round()).all():
+            serie = serie.astype('Int64')
+    texto = serie.astype('string').str.strip()
+    texto = texto.mask(texto == '')
+
+    rechazos = pd.Series(False, index=serie.index)
+    largo = re.match(r'VARCHAR\((\d+)\)', tipo)
+    if largo:
+        rechazos = (texto.str.len() > int(largo.group(1))).fillna(False)
+    return texto.mask(rechazos), rechazos
+
+
+def parsear_decimal(serie, tipo):
+    """
+    Convierte una columna a número aceptando coma decimal, separador de miles y %
+
+    En los textos la convención se decide antes de convertir: si hay coma, los puntos son
+    de miles y la coma es decimal ("1.234,56"); sin coma, un punto seguido de grupos de
+    exactamente 3 dígitos también es de miles ("1.234" = 1234); si no, el punto es decimal.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return _validar_decimal(serie, pd.to_numeric(serie, errors='coerce').astype('float64'), tipo)
+
+    # Los números que ya vienen tipados (por ejemplo desde Excel) se convierten tal cual
+    es_texto = serie.map(lambda valor: isinstance(valor, str))
+    valores = pd.to_numeric(serie.mask(es_texto), errors='coerce').astype('float64')
+
+    if es_texto.any():
+        texto = serie[es_texto].astype('string').str.strip().str.replace(r'[\s%]|Gs\.?', '', regex=True)
+        con_coma = texto.str.contains(',', regex=False).fillna(False)
+        con_miles = texto.str.fullmatch(r'[-+]?\d{1,3}(\.\d{3})+').fillna(False)
+        sin_puntos = texto.str.replace('.', '', regex=False)
+        texto = texto.mask(con_coma, sin_puntos.str.replace(',', '.', regex=False))
+        texto = texto.mask(con_miles & ~con_coma, sin_puntos)
+        valores.loc[es_texto] = pd.to_numeric(texto.mask(texto == ''), errors='coerce').astype('float64')
+    return _validar_decimal(serie, valores, tipo)
+
+
+def _validar_decimal(serie, valores, tipo):
+    """Marca como rechazados los valores no convertibles o fuera de la precisión de DECIMAL(p,s)"""
+    vacios = serie.isna() | (serie.astype('string').str.strip() == '').fillna(False)
+    rechazos = valores.isna() & ~vacios
+
+    precision = re.match(r'DECIMAL\((\d+),(\d+)\)', tipo)
+    if precision:
+        digitos, decimales = int(precision.group(1)), int(precision.group(2))
+        valores = valores.round(decimales)
+        fuera_de_rango = (valores.abs() >= 10 ** (digitos - decimales)).fillna(False)
+        rechazos = rechazos | fuera_de_rango
+    return valores.mask(rechazos), rechazos
+
+
+def parsear_fecha(serie, tipo):
+    """Convierte una columna a fecha (día primero) aceptando fechas de Excel, textos y números de serie"""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.strftime('%Y-%m-%d'), pd.Series(False, index=serie.index)
+
+    numeros = pd.to_numeric(serie, errors='coerce').astype('float64')
+    fechas = pd.to_datetime(numeros, unit='D', origin='1899-12-30', errors='coerce')
+
+    # Primero las fechas que ya vienen tipadas (o en formato ISO) y después los textos día/mes/año
+    for formato in ({'format': 'ISO8601'}, {'format': 'mixed', 'dayfirst': True}):
+        pendientes = fechas.isna() & serie.notna()
+        if not pendientes.any():
+            break
+        texto = serie[pendientes].astype('string').str.strip()
+        fechas.loc[pendientes] = pd.to_datetime(texto.mask(texto == ''), errors='coerce', **formato)
+
+    vacios = serie.isna() | (serie.astype('string').str.strip() == '').fillna(False)
+    rechazos = fechas.isna() & ~vacios
+    return fechas.dt.strftime('%Y-%m-%d'), rechazos
+
+
+# Estructura de las tablas de cada hoja: (columna, tipo SQL, parser)
+COLUMNAS_TABLAS = {
+    'llamado': [
+        ("I_D", "VARCHAR(50)", parsear_texto),
+        ("NUMERO_DE_LLAMADO", "VARCHAR(50)", parsear_texto),
+        ("AÑO_DEL_LLAMADO", "VARCHAR(10)", parsear_texto),
+        ("NOMBRE_DEL_LLAMADO", "TEXT", parsear_texto),
+        ("EMPRESA_ADJUDICADA", "TEXT", parsear_texto),
+        ("RUC", "VARCHAR(50)", parsear_texto),
+        ("FECHA_FIRMA_CONTRATO", "DATE", parsear_fecha),
+        ("NUMERO_CONTRATO", "VARCHAR(100)", parsear_texto),
+        ("VIGENCIA_CONTRATO", "TEXT", parsear_texto),
+        ("Fecha_de_Inicio_de_Poliza", "DATE", parsear_fecha),
+        ("Fecha_de_Finalizacion_de_Poliza", "DATE", parsear_fecha),
+    ],
+    'ejecucion_general': [
+        ("COMODATO_SIN_COMODATO", "VARCHAR(50)", parsear_texto),
+        ("ESTADO_DEL_LOTE_ITEM", "TEXT", parsear_texto),
+        ("LOTE", "VARCHAR(50)", parsear_texto),
+        ("ITEM", "VARCHAR(50)", parsear_texto),
+        ("DESCRIPCION_DEL_PRODUCTO", "TEXT", parsear_texto),
+        ("PRESENTACION", "TEXT", parsear_texto),
+        ("MARCA", "TEXT", parsear_texto),
+        ("PROCEDENCIA", "TEXT", parsear_texto),
+        ("DESCRIPCION_DEL_PRODUCTO_MARCA_PROCEDENCIA", "TEXT", parsear_texto),
+        ("UNIDAD_DE_MEDIDA", "VARCHAR(50)", parsear_texto),
+        ("PRECIO_UNITARIO", "DECIMAL(15,2)", parsear_decimal),
+        ("CANTIDAD_MINIMA", "DECIMAL(15,2)", parsear_decimal),
+        ("CANTIDAD_MAXIMA", "DECIMAL(15,2)", parsear_decimal),
+        ("REDISTRIBUCION_CANTIDAD_MINIMA", "DECIMAL(15,2)", parsear_decimal),
+        ("REDISTRIBUCION_CANTIDAD_MAXIMA", "DECIMAL(15,2)", parsear_decimal),
+        ("ENTRADAS_20_ADENDAS_DE_AMPLIACION", "DECIMAL(15,2)", parsear_decimal),
+        ("SALIDAS_ADENDAS_DE_DISMINUCION", "DECIMAL(15,2)", parsear_decimal),
+        ("TOTAL_ADJUDICADO", "DECIMAL(15,2)", parsear_decimal),
+        ("CANTIDAD_EMITIDA", "DECIMAL(15,2)", parsear_decimal),
+        ("SALDO_A_EMITIR", "DECIMAL(15,2)", parsear_decimal),
+        ("PORCENTAJE_EMITIDO", "DECIMAL(5,2)", parsear_decimal),
+    ],
+    'orden_de_compra': [
+        ("SIMESE_PEDIDO", "VARCHAR(100)", parsear_texto),
+        ("N_ORDEN_DE_COMPRA", "VARCHAR(100)", parsear_texto),
+        ("FECHA_DE_EMISION", "DATE", parsear_fecha),
+        ("CODIGO_DE_REACTIVOS_INSUMOS_CODIGO_DE_SERVICIO_BENEFICIARIO", "TEXT", parsear_texto),
+        ("CODIGO_DE_REACTIVOS_INSUMOS", "VARCHAR(100)", parsear_texto),
+        ("ESTADO_SEGUN_DISTRIBUCION_INTERNA", "TEXT", parsear_texto),
+        ("ESTADO_DEL_LOTE_ITEM", "TEXT", parsear_texto),
+        ("SERVICIO_BENEFICIARIO", "TEXT", parsear_texto),
+        ("SUBSERVICIO_BENEFICIARIO", "TEXT", parsear_texto),
+        ("COMODATO_SIN_COMODATO", "VARCHAR(50)", parsear_texto),
+        ("LOTE", "VARCHAR(50)", parsear_texto),
+        ("ITEM", "VARCHAR(50)", parsear_texto),
+        ("CANTIDAD_SOLICITADA", "DECIMAL(15,2)", parsear_decimal),
+        ("CANTIDAD_COMPLEMENTARIA_SOLICITADA", "DECIMAL(15,2)", parsear_decimal),
+        ("UNIDAD_DE_MEDIDA", "VARCHAR(50)", parsear_texto),
+        ("DESCRIPCION_DEL_PRODUCTO_MARCA_PROCEDENCIA", "TEXT", parsear_texto),
+        ("PRECIO_UNITARIO", "DECIMAL(15,2)", parsear_decimal),
+        ("PORCENTAJE_EMITIDO_SERVICIO_BENEFICIARIO", "DECIMAL(5,2)", parsear_decimal),
+        ("PORCENTAJE_DEL_LOTE_ITEM_GLOBAL", "DECIMAL(5,2)", parsear_decimal),
+        ("SALDO_A_EMITIR_DEL_SERVICIO_SANITARIO", "DECIMAL(15,2)", parsear_decimal),
+        ("MONTO_EMITIDO", "DECIMAL(15,2)", parsear_decimal),
+        ("Porcentaje_para_emision_de_complementarios_USO_INTERNO", "DECIMAL(5,2)", parsear_decimal),
+        ("Observaciones", "TEXT", parsear_texto),
+    ],
+    'ejecucion_por_zonas': [
+        ("CODIGO_DE_REACTIVOS_INSUMOS_CODIGO_DE_SERVICIO_BENEFICIARIO", "TEXT", parsear_texto),
+        ("CODIGO_PARA_SERVICIO_BENEFICIARIO", "VARCHAR(100)", parsear_texto),
+        ("CODIGO_DE_REACTIVOS_INSUMOS", "VARCHAR(100)", parsear_texto),
+        ("ESTADO_SEGUN_DISTRIBUCION_INTERNA", "TEXT", parsear_texto),
+        ("SERVICIO_BENEFICIARIO", "TEXT", parsear_texto),
+        ("Porcentaje_para_emision_de_complementarios_USO_INTERNO", "DECIMAL(5,2)", parsear_decimal),
+        ("COMODATO_SIN_COMODATO", "VARCHAR(50)", parsear_texto),
+        ("ESTADO_DEL_LOTE_ITEM", "TEXT", parsear_texto),
+        ("LOTE", "VARCHAR(50)", parsear_texto),
+        ("ITEM", "VARCHAR(50)", parsear_texto),
+        ("DESCRIPCION_DEL_PRODUCTO_MARCA_PROCEDENCIA", "TEXT", parsear_texto),
+        ("UNIDAD_DE_MEDIDA", "VARCHAR(50)", parsear_texto),
+        ("PRECIO_UNITARIO", "DECIMAL(15,2)", parsear_decimal),
+        ("CANTIDAD_MINIMA", "DECIMAL(15,2)", parsear_decimal),
+        ("CANTIDAD_MAXIMA", "DECIMAL(15,2)", parsear_decimal),
+        ("REDISTRIBUCION_CANTIDAD_MINIMA", "DECIMAL(15,2)", parsear_decimal),
+        ("REDISTRIBUCION_CANTIDAD_MAXIMA", "DECIMAL(15,2)", parsear_decimal),
+        ("ENTRADAS_20_ADENDAS_DE_AMPLIACION", "DECIMAL(15,2)", parsear_decimal),
+        ("SALIDAS_ADENDAS_DE_DISMINUCION", "DECIMAL(15,2)", parsear_decimal),
+        ("TOTAL_ADJUDICADO", "DECIMAL(15,2)", parsear_decimal),
+        ("CANTIDAD_EMITIDA", "DECIMAL(15,2)", parsear_decimal),
+        ("SALDO_A_EMITIR", "DECIMAL(15,2)", parsear_decimal),
+        ("PORCENTAJE_EMITIDO_POR_SERVICIO_SANITARIO", "DECIMAL(5,2)", parsear_decimal),
+        ("PORCENTAJE_DEL_LOTE_ITEM_GLOBAL", "DECIMAL(5,2)", parsear_decimal),
+        ("OBSERVACION", "TEXT", parsear_texto),
+    ],
+}
+
+
+# Clave natural de cada hoja, usada para actualizar filas existentes en lugar de duplicarlas
+CLAVES_NATURALES = {
+    'llamado': ["I_D"],
+    'ejecucion_general': ["LOTE", "ITEM"],
+    'ejecucion_por_zonas': ["LOTE", "ITEM", "SERVICIO_BENEFICIARIO"],
+    'orden_de_compra': ["N_ORDEN_DE_COMPRA", "LOTE", "ITEM"],
+}
+
+def sql_crear_tabla(hoja, esquema, tabla=None):
+    """Genera el CREATE TABLE IF NOT EXISTS de una hoja a partir de COLUMNAS_TABLAS"""
+    columnas = ',\n        '.join(f'"{nombre}" {tipo}' for nombre, tipo, _ in COLUMNAS_TABLAS[hoja])
+    return f'''
+    CREATE TABLE IF NOT EXISTS "{esquema}"."{tabla or hoja}" (
+        {columnas}
+    )
+    '''
+
+
+def coercionar_dataframe(df, hoja):
+    """
+    Convierte de una vez cada columna de un lote al tipo de su tabla
+
+    Las columnas que no figuran en la estructura de la hoja se dejan como están.
+    Los valores que no se pueden convertir (o que no entran en el tipo) quedan en
+    nulo y se informan como celdas rechazadas.
+
+    Returns:
+        tuple: (df convertido, lista de rechazos con hoja, fila, columna y valor)
+    """
+    df = df.copy()
+    rechazos = []
+    for nombre, tipo, parser in COLUMNAS_TABLAS.get(hoja, []):
+        if nombre not in df.columns:
+            continue
+        original = df[nombre]
+        df[nombre], rechazadas = parser(original, tipo)
+        for fila, valor in original[rechazadas].items():
+            rechazos.append({'hoja': hoja, 'fila': fila, 'columna': nombre, 'valor': str(valor)})
+    return df, rechazos
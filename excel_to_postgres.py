@@ -6,7 +6,8 @@ import csv
 import datetime
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import text, inspect
+from conexion_db import obtener_engine
 
 class ExcelToPostgresThinker:
     """
@@ -25,11 +26,8 @@ class ExcelToPostgresThinker:
             "Orden_de_Compra"
         ]
         self.log_file = "excel_to_postgres_log.csv"
+        # Credenciales y pool de conexiones en conexion_db.py (variables REACTIVOS_DB_*)
         self.connection_params = {
-            "user": "postgres",
-            "password": "tu_contraseña",
-            "host": "localhost",
-            "port": "5432",
             "database": "postgres"  # Usar 'postgres' como base de datos por defecto
         }
     
@@ -198,15 +196,8 @@ class ExcelToPostgresThinker:
     def _transferir_datos(self, sheet_names):
         """Ejecuta la transferencia de datos de Excel a PostgreSQL"""
         try:
-            # Crear la cadena de conexión
-            conn_str = f"postgresql://{self.connection_params['user']}:" \
-                      f"{self.connection_params['password']}@" \
-                      f"{self.connection_params['host']}:" \
-                      f"{self.connection_params['port']}/" \
-                      f"{self.connection_params['database']}"
-            
-            # Crear conexión a la base de datos
-            engine = create_engine(conn_str, client_encoding='utf8')
+            # Obtener el engine compartido (con pool) para la base de datos
+            engine = obtener_engine(self.connection_params['database'])
             
             # Verificar si el esquema existe y crearlo con una consulta segura
             with engine.connect() as conn:
@@ -301,11 +292,6 @@ class ExcelToPostgresThinker:
             print(error_msg)
             messagebox.showerror("Error", error_msg)
             return False
-        
-        finally:
-            # Cerrar la conexión
-            if 'engine' in locals():
-                engine.dispose()
     
     def _registrar_log(self):
         """Registra la operación en un archivo CSV de log"""
@@ -0,0 +1,156 @@
+import codecs
+import csv
+from collections import Counter
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (solo se usa a través de pandas)
+except ImportError:  # pyarrow es opcional; sin él se usa el parser C de pandas
+    pyarrow = None
+
+# Bytes del inicio del archivo que se inspeccionan para detectar el formato
+TAMANO_MUESTRA = 256 * 1024
+
+# Líneas de la muestra que se usan para comparar delimitadores
+LINEAS_MUESTRA = 100
+
+DELIMITADORES = [',', ';', '\t', '|']
+
+# Encoding de reintento si el archivo no es UTF-8 más allá de la muestra
+ENCODING_ALTERNATIVO = 'cp1252'
+
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def detectar_encoding(muestra):
+    """
+    Detecta el encoding de una muestra de bytes
+
+    Primero se busca un BOM; si no hay, se valida como UTF-8 y si falla se usa
+    cp1252 (o latin-1 si la muestra tiene bytes que cp1252 no define).
+    """
+    for bom, encoding in BOMS:
+        if muestra.startswith(bom):
+            return encoding
+
+    try:
+        muestra.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # La muestra puede cortar un carácter multibyte justo al final
+        if e.start >= len(muestra) - 3 and e.reason == 'unexpected end of data':
+            return 'utf-8'
+
+    try:
+        muestra.decode('cp1252')
+        return 'cp1252'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def _consistencia(lineas, delimitador):
+    """(proporción de líneas con la cantidad de campos más común, esa cantidad de campos)"""
+    cantidades = [len(fila) for fila in csv.reader(lineas, delimiter=delimitador) if fila]
+    if not cantidades:
+        return 0, 0
+    campos, veces = Counter(cantidades).most_common(1)[0]
+    return veces / len(cantidades), campos
+
+
+def detectar_delimitador(texto):
+    """
+    Detecta el delimitador de una muestra de texto CSV
+
+    Se prueba csv.Sniffer y se verifica que el delimitador elegido genere la misma
+    cantidad de campos (al menos 2) en las líneas de la muestra; si no, se usa el
+    delimitador más consistente.
+    """
+    lineas = texto.splitlines()
+    if len(lineas) > 1:
+        # La última línea puede estar cortada por el tamaño de la muestra
+        lineas = lineas[:-1]
+    lineas = lineas[:LINEAS_MUESTRA]
+
+    puntajes = {}
+    for delimitador in DELIMITADORES:
+        proporcion, campos = _consistencia(lineas, delimitador)
+        if campos >= 2:
+            puntajes[delimitador] = (proporcion, campos)
+
+    try:
+        sugerido = csv.Sniffer().sniff('\n'.join(lineas), delimiters=''.join(DELIMITADORES)).delimiter
+    except csv.Error:
+        sugerido = None
+
+    if not puntajes:
+        return sugerido or ','
+
+    mejor = max(puntajes, key=lambda d: puntajes[d])
+    if sugerido in puntajes and puntajes[sugerido][0] >= puntajes[mejor][0]:
+        return sugerido
+    return mejor
+
+
+def detectar_formato(muestra):
+    """Devuelve (encoding, delimitador) de una muestra de bytes del inicio de un CSV"""
+    encoding = detectar_encoding(muestra)
+    texto = muestra.decode(encoding, errors='ignore')
+    return encoding, detectar_delimitador(texto)
+
+
+def detectar_formato_archivo(ruta):
+    """Devuelve (encoding, delimitador) de un archivo CSV leyendo solo su inicio"""
+    with open(ruta, 'rb') as archivo:
+        return detectar_formato(archivo.read(TAMANO_MUESTRA))
+
+
+def leer_csv(origen, **opciones):
+    """
+    Lee un CSV completo en una sola pasada, detectando antes encoding y delimitador
+
+    El encoding se decide con la muestra del inicio; si más adelante aparece un byte
+    inválido para ese encoding se vuelve a leer una vez con ENCODING_ALTERNATIVO,
+    reemplazando los bytes que tampoco sean válidos en él.
+
+    Args:
+        origen: Ruta o archivo binario (por ejemplo el de st.file_uploader)
+        opciones: Argumentos adicionales para pd.read_csv
+
+    Returns:
+        tuple: (DataFrame, encoding, delimitador)
+    """
+    es_ruta = isinstance(origen, (str, bytes)) or hasattr(origen, '__fspath__')
+    if es_ruta:
+        encoding, delimitador = detectar_formato_archivo(origen)
+    else:
+        origen.seek(0)
+        encoding, delimitador = detectar_formato(origen.read(TAMANO_MUESTRA))
+        origen.seek(0)
+
+    parametros = {
+        'sep': delimitador,
+        'encoding': encoding,
+        'on_bad_lines': 'skip',
+    }
+
+    # pyarrow es el más rápido, pero solo se usa sin opciones extra y con UTF-8
+    if pyarrow is not None and not opciones and encoding in ('utf-8', 'utf-8-sig'):
+        try:
+            return pd.read_csv(origen, engine='pyarrow', **parametros), encoding, delimitador
+        except Exception:
+            if not es_ruta:
+                origen.seek(0)
+
+    try:
+        df = pd.read_csv(origen, engine='c', low_memory=False, **{**parametros, **opciones})
+    except UnicodeDecodeError:
+        if not es_ruta:
+            origen.seek(0)
+        encoding = ENCODING_ALTERNATIVO
+        parametros.update(encoding=encoding, encoding_errors='replace')
+        df = pd.read_csv(origen, engine='c', low_memory=False, **{**parametros, **opciones})
+    return df, encoding, delimitador
@@ -0,0 +1,104 @@
+import hashlib
+import io
+import tempfile
+import time
+import openpyxl
+import pandas as pd
+from carga_masiva import normalizar_nombre_columna
+from esquema_tablas import MAX_RECHAZOS_REPORTADOS, coercionar_dataframe
+
+# Cantidad de filas que se entregan en cada lote al leer una hoja
+TAMANO_LOTE = 5000
+
+
+def abrir_libro_excel(archivo):
+    """Abre un libro Excel en modo solo lectura (las filas se leen bajo demanda)"""
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+    return openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+
+
+def iterar_lotes_hoja(libro, hoja, tamano_lote=TAMANO_LOTE):
+    """
+    Recorre una hoja fila por fila y entrega DataFrames de hasta tamano_lote filas
+
+    La primera fila se toma como encabezado. Las columnas sin encabezado y las
+    filas completamente vacías se descartan. Los valores conservan el tipo que
+    entrega openpyxl (números, fechas, textos), por lo que cada lote ya llega tipado.
+    El índice de cada lote es el número de fila en Excel.
+    """
+    filas = libro[hoja].iter_rows(values_only=True)
+    encabezado = next(filas, None)
+    if encabezado is None:
+        return
+
+    indices = [i for i, nombre in enumerate(encabezado) if nombre is not None]
+    columnas = [encabezado[i] for i in indices]
+
+    lote = []
+    numeros_fila = []
+    for numero_fila, fila in enumerate(filas, start=2):
+        valores = [fila[i] if i < len(fila) else None for i in indices]
+        if all(valor is None for valor in valores):
+            continue
+        lote.append(valores)
+        numeros_fila.append(numero_fila)
+
+        if len(lote) >= tamano_lote:
+            yield pd.DataFrame(lote, columns=columnas, index=numeros_fila)
+            lote = []
+            numeros_fila = []
+
+    if lote:
+        yield pd.DataFrame(lote, columns=columnas, index=numeros_fila)
+
+
+def parsear_hoja_a_csv(contenido, hoja, tamano_lote=TAMANO_LOTE):
+    """
+    Lee una hoja del libro y la deja en un archivo CSV temporal listo para COPY
+
+    Está pensada para ejecutarse en un proceso aparte (ProcessPoolExecutor), por
+    eso recibe el contenido del archivo en bytes y devuelve solo datos simples.
+    Cada lote se convierte a los tipos de la tabla antes de escribirse; las celdas
+    vacías quedan como nulos en el CSV. Además se calcula la huella de la hoja
+    (SHA-256 de los hashes de cada fila) para detectar hojas que no cambiaron.
+
+    Returns:
+        dict: hoja, ruta del CSV, columnas (ya normalizadas), filas, segundos de lectura,
+        huella, celdas rechazadas y el detalle de las primeras MAX_RECHAZOS_REPORTADOS
+    """
+    inicio = time.perf_counter()
+    libro = abrir_libro_excel(io.BytesIO(contenido))
+    archivo = tempfile.NamedTemporaryFile('w', suffix=f'_{hoja}.csv', delete=False,
+                                          encoding='utf-8', newline='')
+    columnas = []
+    filas = 0
+    rechazos = []
+    celdas_rechazadas = 0
+    huella = hashlib.sha256()
+    try:
+        for lote in iterar_lotes_hoja(libro, hoja, tamano_lote):
+            lote = lote.rename(columns=normalizar_nombre_columna)
+            lote, rechazos_lote = coercionar_dataframe(lote, hoja)
+            celdas_rechazadas += len(rechazos_lote)
+            rechazos.extend(rechazos_lote[:MAX_RECHAZOS_REPORTADOS - len(rechazos)])
+            if not columnas:
+                columnas = list(lote.columns)
+                huella.update('|'.join(columnas).encode('utf-8'))
+            huella.update(pd.util.hash_pandas_object(lote, index=False).values.tobytes())
+            lote.to_csv(archivo, index=False, header=False)
+            filas += len(lote)
+    finally:
+        archivo.close()
+        libro.close()
+
+    return {
+        'hoja': hoja,
+        'ruta': archivo.name,
+        'columnas': columnas,
+        'filas': filas,
+        'segundos_lectura': round(time.perf_counter() - inicio, 3),
+        'huella': huella.hexdigest(),
+        'celdas_rechazadas': celdas_rechazadas,
+        'rechazos': rechazos
+    }
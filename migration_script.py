@@ -1,17 +1,14 @@
 import pandas as pd
 import psycopg2
 import numpy as np
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 import re
 import os
+from conexion_db import DB_HOST, DB_PORT, DB_USER, obtener_engine, parametros_dbapi, url_conexion
 
-# Configuración de la conexión a PostgreSQL
-DB_HOST = "localhost"
+# Configuración de la conexión a PostgreSQL (credenciales y pool en conexion_db.py)
 DB_NAME = "reactivos_db"
-DB_USER = "postgres"
-DB_PASSWORD = "Dggies12345"  # Cambia esto por tu contraseña
-DB_PORT = "5432"
 
 def clean_column_name(name):
     """Limpia los nombres de columnas para que sean válidos en PostgreSQL"""
@@ -37,13 +34,7 @@ def clean_column_name(name):
 def create_database(conn_string):
     """Crea la base de datos si no existe"""
     # Conectarse a la base de datos por defecto para poder crear una nueva
-    conn = psycopg2.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        port=DB_PORT,
-        database="postgres"  # Nos conectamos a la BD por defecto
-    )
+    conn = psycopg2.connect(**parametros_dbapi("postgres"))  # Nos conectamos a la BD por defecto
     conn.autocommit = True
     cursor = conn.cursor()
     
@@ -61,18 +52,8 @@ def create_database(conn_string):
     cursor.close()
     conn.close()
 
-from sqlalchemy import create_engine, text
-
-# Datos de conexión
-DB_HOST = "localhost"
-DB_NAME = "reactivos_db"
-DB_USER = "postgres"
-DB_PASSWORD = "Dggies12345"
-DB_PORT = "5432"
-
-# Crear el engine para SQLAlchemy
-connection_string = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(connection_string)
+# Engine compartido (con pool) para la base de la migración
+engine = obtener_engine(DB_NAME)
 
 def create_tables(engine):
     print("🔄 Creando tablas en la base de datos...")
@@ -683,8 +664,8 @@ def main():
 try:
     # Intentar crear el engine
     print("🔄 Intentando conectar con la base de datos...")
-    conn_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    engine = create_engine(conn_string)
+    conn_string = url_conexion(DB_NAME)
+    engine = obtener_engine(DB_NAME)
     with engine.connect() as connection:
         print("✅ Conexión exitosa a PostgreSQL")
 except Exception as e:
@@ -710,8 +691,8 @@ if engine is not None:
     
     # Conectar a la base de datos
     try:
-        # Crear un engine de SQLAlchemy para PostgreSQL
-        engine = create_engine(conn_string)
+        # Engine compartido de SQLAlchemy para PostgreSQL
+        engine = obtener_engine(DB_NAME)
         print("Conexión exitosa a PostgreSQL")
         
         # Crear las tablas
@@ -0,0 +1,209 @@
+import io
+import os
+import time
+import zipfile
+from xml.sax.saxutils import escape
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+except ImportError:  # reportlab es opcional; sin él no se generan PDFs
+    pdfmetrics = None
+
+# Fuente TrueType opcional (por ejemplo DejaVuSans.ttf); si no se indica se usa Helvetica
+RUTA_FUENTE = os.environ.get("REACTIVOS_PDF_FUENTE")
+
+# Con menos órdenes que esto el lote se genera en el proceso actual
+MIN_ORDENES_PROCESOS = 20
+
+
+def reportlab_disponible():
+    """Indica si está instalado reportlab"""
+    return pdfmetrics is not None
+
+
+@lru_cache(maxsize=None)
+def _fuentes():
+    """Registra (una sola vez por proceso) la fuente de los PDFs y devuelve (normal, negrita)"""
+    if RUTA_FUENTE and os.path.exists(RUTA_FUENTE):
+        pdfmetrics.registerFont(TTFont("FuenteOC", RUTA_FUENTE))
+        return "FuenteOC", "FuenteOC"
+    return "Helvetica", "Helvetica-Bold"
+
+
+@lru_cache(maxsize=None)
+def _estilos():
+    """Estilos de párrafo de la orden de compra, creados una sola vez por proceso"""
+    normal, negrita = _fuentes()
+    base = getSampleStyleSheet()
+    return {
+        'titulo': ParagraphStyle('titulo', parent=base['Title'], fontName=negrita, fontSize=14, alignment=TA_CENTER),
+        'subtitulo': ParagraphStyle('subtitulo', parent=base['Normal'], fontName=negrita, fontSize=11, alignment=TA_CENTER),
+        'normal': ParagraphStyle('normal', parent=base['Normal'], fontName=normal, fontSize=9),
+        'celda': ParagraphStyle('celda', parent=base['Normal'], fontName=normal, fontSize=7, leading=8),
+        'firma': ParagraphStyle('firma', parent=base['Normal'], fontName=normal, fontSize=9, alignment=TA_CENTER),
+    }
+
+
+@lru_cache(maxsize=None)
+def _estilo_tabla():
+    """Estilo de la tabla de ítems (lo comparten todas las órdenes)"""
+    normal, negrita = _fuentes()
+    return TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), normal),
+        ('FONTNAME', (0, 0), (-1, 0), negrita),
+        ('FONTNAME', (0, -1), (-1, -1), negrita),
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f2f2f2')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#999999')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
+        ('ALIGN', (5, 1), (6, -1), 'RIGHT'),
+        ('SPAN', (0, -1), (5, -1)),
+        ('ALIGN', (0, -1), (5, -1), 'RIGHT'),
+    ])
+
+
+def _guaranies(valor):
+    """Formato 'Gs. 1.234.567' (las fuentes estándar no tienen el símbolo ₲)"""
+    return f"Gs. {float(valor or 0):,.0f}".replace(",", ".")
+
+
+def _texto(valor):
+    """Texto de la base escapado para usarlo dentro de un Paragraph"""
+    return escape(str(valor or ''))
+
+
+def _fecha(valor):
+    """Fecha en formato dd/mm/aaaa, o vacío"""
+    return valor.strftime('%d/%m/%Y') if hasattr(valor, 'strftime') else (valor or '')
+
+
+def nombre_archivo_pdf(orden):
+    """Nombre del PDF de una orden (los '/' del número no son válidos en nombres de archivo)"""
+    return f"OC_{str(orden['numero_orden']).replace('/', '-')}.pdf"
+
+
+def renderizar_orden_pdf(orden):
+    """
+    Genera el PDF de una orden de compra
+
+    Args:
+        orden (dict): Detalle de la orden (como lo devuelve obtener_detalles_orden_compra)
+            con el monto total en letras en 'monto_en_letras'
+
+    Returns:
+        bytes: Contenido del PDF
+    """
+    estilos = _estilos()
+    lic = orden.get('licitacion') or {}
+
+    elementos = [
+        Paragraph("GOBIERNO NACIONAL", estilos['subtitulo']),
+        Paragraph("Ministerio de Salud Pública y Bienestar Social", estilos['subtitulo']),
+        Spacer(1, 3 * mm),
+        Paragraph(f"ORDEN DE COMPRA N° {_texto(orden['numero_orden'])}", estilos['titulo']),
+        Spacer(1, 3 * mm),
+    ]
+
+    datos_cabecera = [
+        [Paragraph(f"<b>Señores:</b> {_texto(lic.get('empresa_adjudicada'))}", estilos['normal']),
+         Paragraph(f"<b>Fecha de Emisión:</b> {_fecha(orden['fecha_emision'])}", estilos['normal'])],
+        [Paragraph(f"<b>Licitación:</b> {_texto(lic.get('numero_llamado'))}/{_texto(lic.get('anio_llamado'))} - "
+                   f"{_texto(lic.get('nombre_llamado') or orden['esquema'])}", estilos['normal']),
+         Paragraph(f"<b>SIMESE:</b> {_texto(orden.get('simese'))}", estilos['normal'])],
+        [Paragraph(f"<b>Contrato:</b> {_texto(lic.get('numero_contrato'))}", estilos['normal']),
+         Paragraph(f"<b>Estado:</b> {orden['estado']}", estilos['normal'])],
+        [Paragraph(f"<b>Servicio Beneficiario:</b> {_texto(orden.get('servicio_beneficiario'))}", estilos['normal']),
+         ''],
+    ]
+    elementos.append(Table(datos_cabecera, colWidths=[170 * mm, 100 * mm]))
+    elementos.append(Spacer(1, 4 * mm))
+
+    filas = [["Lote", "Item", "Cantidad", "Unidad", "Descripción", "Precio Unit.", "Subtotal"]]
+    for item in orden['items']:
+        filas.append([
+            item.get('lote') or '-',
+            item.get('item') or '',
+            f"{float(item.get('cantidad') or 0):,.2f}",
+            item.get('unidad_medida') or '',
+            Paragraph(_texto(item.get('descripcion')), estilos['celda']),
+            _guaranies(item.get('precio_unitario')),
+            _guaranies(item.get('monto_total')),
+        ])
+    filas.append(["TOTAL", '', '', '', '', '', _guaranies(orden['monto_total'])])
+
+    tabla = Table(filas, colWidths=[15 * mm, 15 * mm, 22 * mm, 22 * mm, 130 * mm, 33 * mm, 33 * mm],
+                  repeatRows=1)
+    tabla.setStyle(_estilo_tabla())
+    elementos.append(tabla)
+    elementos.append(Spacer(1, 4 * mm))
+    elementos.append(Paragraph(f"<b>Son Guaraníes:</b> {orden.get('monto_en_letras', '')}", estilos['normal']))
+    elementos.append(Spacer(1, 25 * mm))
+
+    firmas = Table(
+        [[Paragraph("Director Administrativo", estilos['firma']), '',
+          Paragraph("Director General", estilos['firma'])]],
+        colWidths=[80 * mm, 100 * mm, 80 * mm]
+    )
+    firmas.setStyle(TableStyle([
+        ('LINEABOVE', (0, 0), (0, 0), 0.8, colors.black),
+        ('LINEABOVE', (2, 0), (2, 0), 0.8, colors.black),
+    ]))
+    elementos.append(firmas)
+
+    buffer = io.BytesIO()
+    documento = SimpleDocTemplate(
+        buffer, pagesize=landscape(A4),
+        leftMargin=12 * mm, rightMargin=12 * mm, topMargin=12 * mm, bottomMargin=12 * mm,
+        title=f"Orden de Compra {orden['numero_orden']}"
+    )
+    documento.build(elementos)
+    return buffer.getvalue()
+
+
+def _renderizar_con_nombre(orden):
+    """Worker del lote: devuelve (nombre de archivo, PDF)"""
+    return nombre_archivo_pdf(orden), renderizar_orden_pdf(orden)
+
+
+def generar_zip_ordenes(ordenes, procesos=None):
+    """
+    Genera los PDFs de varias órdenes y los empaqueta en un ZIP
+
+    Los lotes grandes se reparten entre procesos (un PDF por tarea); los chicos se
+    generan en el proceso actual para no pagar el arranque de los procesos.
+
+    Returns:
+        tuple: (contenido del ZIP, métricas con ordenes, segundos y ordenes_por_segundo)
+    """
+    inicio = time.perf_counter()
+    buffer = io.BytesIO()
+
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archivo_zip:
+        if len(ordenes) < MIN_ORDENES_PROCESOS:
+            for nombre, pdf in map(_renderizar_con_nombre, ordenes):
+                archivo_zip.writestr(nombre, pdf)
+        else:
+            procesos = procesos or min(os.cpu_count() or 1, 8)
+            tamano_bloque = max(1, len(ordenes) // (procesos * 4))
+            with ProcessPoolExecutor(max_workers=procesos) as executor:
+                for nombre, pdf in executor.map(_renderizar_con_nombre, ordenes, chunksize=tamano_bloque):
+                    archivo_zip.writestr(nombre, pdf)
+
+    segundos = time.perf_counter() - inicio
+    metricas = {
+        'ordenes': len(ordenes),
+        'segundos': round(segundos, 3),
+        'ordenes_por_segundo': round(len(ordenes) / segundos, 1) if segundos > 0 else len(ordenes)
+    }
+    return buffer.getvalue(), metricas
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Los módulos de la aplicación están en la raíz del repositorio. Se agrega al final del
+# path para que code.py no tape al módulo estándar 'code' (lo importa pdb)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
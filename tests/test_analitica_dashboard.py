@@ -0,0 +1,62 @@
+import re
+
+from sqlalchemy import text
+
+from analitica_dashboard import (
+    PATRON_COMA_DECIMAL, PATRON_MILES, PATRON_PUNTO_DECIMAL, sql_ejecucion
+)
+
+
+def _columnas(tipo_texto):
+    return {
+        ('lic_antigua', 'ejecucion_general'): {
+            "REDISTRIBUCION (CANTIDAD MAXIMA)": tipo_texto,
+            "CANTIDAD EMITIDA": tipo_texto,
+            "SALDO A EMITIR": 'numeric',
+            "PRECIO UNITARIO": 'double precision',
+        },
+    }
+
+
+def test_sql_ejecucion_castea_texto_con_guarda():
+    sql, parametros = sql_ejecucion(_columnas('text'))
+
+    assert parametros == {'e0': 'lic_antigua'}
+    # Las columnas de texto no se castean directamente
+    assert '"CANTIDAD EMITIDA"::numeric' not in sql
+    assert '"REDISTRIBUCION (CANTIDAD MAXIMA)"::numeric' not in sql
+    assert 'CASE' in sql and PATRON_MILES in sql
+    # Las numéricas sí
+    assert '"SALDO A EMITIR"::numeric' in sql
+    assert '"PRECIO UNITARIO"::numeric' in sql
+    # El único parámetro es el esquema (las expresiones regulares no se toman como parámetros)
+    assert set(text(sql).compile().params) == {'e0'}
+
+
+def test_sql_ejecucion_columnas_numericas_sin_guarda():
+    sql, _ = sql_ejecucion(_columnas('integer'))
+
+    assert 'CASE' not in sql
+    assert '"CANTIDAD EMITIDA"::numeric' in sql
+
+
+def _convertir(valor):
+    """Reproduce en Python la conversión que arma _numero para columnas de texto"""
+    limpio = re.sub(r'\s|%|Gs\.?', '', valor)
+    if re.match(PATRON_COMA_DECIMAL, limpio):
+        return float(limpio.replace('.', '').replace(',', '.'))
+    if re.match(PATRON_MILES, limpio):
+        return float(limpio.replace('.', ''))
+    if re.match(PATRON_PUNTO_DECIMAL, limpio):
+        return float(limpio)
+    return None
+
+
+def test_formatos_de_numero_en_texto():
+    assert _convertir('1.234') == 1234
+    assert _convertir('1.234,56') == 1234.56
+    assert _convertir('1234.5') == 1234.5
+    assert _convertir('Gs. 15.000') == 15000
+    assert _convertir('-') is None
+    assert _convertir('') is None
+    assert _convertir('N/A') is None
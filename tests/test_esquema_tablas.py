@@ -0,0 +1,28 @@
+import pandas as pd
+
+from esquema_tablas import parsear_decimal
+
+
+def test_parsear_decimal_separador_de_miles_y_coma_decimal():
+    serie = pd.Series(["1.234", "1.234,56", "1234.5", "1.234.567", "12,5 %", "Gs. 15.000", ""], dtype=object)
+    valores, rechazos = parsear_decimal(serie, "DECIMAL(18,2)")
+
+    assert valores.tolist()[:6] == [1234.0, 1234.56, 1234.5, 1234567.0, 12.5, 15000.0]
+    assert pd.isna(valores.iloc[6])
+    assert not rechazos.any()
+
+
+def test_parsear_decimal_numeros_tipados_no_se_reinterpretan():
+    serie = pd.Series([1.234, "1.234", None], dtype=object)
+    valores, rechazos = parsear_decimal(serie, "DECIMAL(18,3)")
+
+    assert valores.tolist()[:2] == [1.234, 1234.0]
+    assert not rechazos.any()
+
+
+def test_parsear_decimal_rechaza_texto_y_fuera_de_rango():
+    serie = pd.Series(["abc", "1.000.000"], dtype=object)
+    valores, rechazos = parsear_decimal(serie, "DECIMAL(5,2)")
+
+    assert rechazos.tolist() == [True, True]
+    assert valores.isna().all()
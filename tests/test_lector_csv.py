@@ -0,0 +1,23 @@
+import io
+
+from lector_csv import TAMANO_MUESTRA, leer_csv
+
+
+def test_leer_csv_reintenta_si_el_encoding_cambia_despues_de_la_muestra():
+    inicio = b"RUC;Razon;Dir\n" + b"800-1;ACME SA;Calle 1\n" * (TAMANO_MUESTRA // 20)
+    datos = inicio + "801-2;Peña SRL;Av 2\n".encode('cp1252')
+
+    df, encoding, delimitador = leer_csv(io.BytesIO(datos))
+
+    assert (encoding, delimitador) == ('cp1252', ';')
+    assert df.iloc[-1].tolist() == ['801-2', 'Peña SRL', 'Av 2']
+
+
+def test_leer_csv_detecta_bom_y_delimitador():
+    datos = "RUC,Razón Social\n800-1,\"ACME; S.A.\"\n".encode('utf-8-sig')
+
+    df, encoding, delimitador = leer_csv(io.BytesIO(datos))
+
+    assert (encoding, delimitador) == ('utf-8-sig', ',')
+    assert df.columns.tolist() == ['RUC', 'Razón Social']
+    assert df.iloc[0].tolist() == ['800-1', 'ACME; S.A.']